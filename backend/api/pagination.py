@@ -0,0 +1,66 @@
+import base64
+from datetime import datetime
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+import orjson
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """
+    Opaque cursor pointing just after a row in (created_at DESC, id DESC) order.
+    """
+    return base64.urlsafe_b64encode(orjson.dumps([created_at.isoformat(), row_id])).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, row_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+def keyset_page(query: Any, model: Any, cursor: Optional[str], limit: int) -> Any:
+    """
+    Orders a query newest first and continues after `cursor`.
+
+    Seeks on (created_at, id) instead of skipping rows, so every page costs the
+    same no matter how deep into the history it is. Fetches one extra row to
+    know whether there is a next page (see `next_cursor`).
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+def next_cursor(rows: Sequence[Any], limit: int) -> Tuple[Sequence[Any], Optional[str]]:
+    """
+    Trims the extra row fetched by `keyset_page` and returns the cursor for the next page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+def parse_list(value: Optional[str], name: str, allowed: Optional[Iterable[str]] = None) -> Optional[List[str]]:
+    """
+    Splits a comma-separated query parameter, e.g. `?fields=scan_id,status`.
+    """
+    if not value:
+        return None
+    items = [item.strip() for item in value.split(",") if item.strip()]
+    if allowed is not None:
+        unknown = sorted(set(items) - set(allowed))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown {name}: {', '.join(unknown)}. Allowed: {', '.join(sorted(allowed))}.")
+    return items
+
+def projected_response(content: Any, cursor: Optional[str] = None) -> JSONResponse:
+    """
+    Returns projected data as it is; it doesn't match the full response model.
+    """
+    headers = {NEXT_CURSOR_HEADER: cursor} if cursor else None
+    return JSONResponse(content=jsonable_encoder(content), headers=headers)
@@ -0,0 +1,86 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Any, Optional
+from datetime import datetime
+
+from database.db_connect import get_session
+from schemas import Finding, FindingRead, FindingHostSummary
+
+router = APIRouter()
+
+def finding_filters(
+    kind: Optional[str] = Query(None, description="e.g. open_port, weak_protocol, missing_header, sql_injection"),
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    detail: Optional[str] = Query(None, description="Exact match on the protocol, header, path, parameter..."),
+    severity: Optional[str] = None,
+    tool_name: Optional[str] = None,
+    service: Optional[str] = None,
+    product: Optional[str] = None,
+    version: Optional[str] = None,
+    scan_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[Any]:
+    """
+    Turns the shared query parameters into WHERE conditions on Finding.
+    """
+    conditions = []
+    for column, value in (
+        (Finding.kind, kind), (Finding.host, host.lower() if host else None), (Finding.port, port),
+        (Finding.detail, detail), (Finding.severity, severity), (Finding.tool_name, tool_name),
+        (Finding.service, service), (Finding.product, product), (Finding.version, version),
+        (Finding.scan_id, scan_id),
+    ):
+        if value is not None:
+            conditions.append(column == value)
+    if since is not None:
+        conditions.append(Finding.created_at >= since)
+    if until is not None:
+        conditions.append(Finding.created_at < until)
+    return conditions
+
+@router.get("/", response_model=List[FindingRead])
+async def get_findings(
+    conditions: List[Any] = Depends(finding_filters),
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Query individual findings across all scans, newest first.
+    """
+    result = await session.execute(
+        select(Finding)
+        .where(*conditions)
+        .order_by(Finding.created_at.desc(), Finding.id.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+@router.get("/hosts", response_model=List[FindingHostSummary])
+async def get_finding_hosts(
+    conditions: List[Any] = Depends(finding_filters),
+    limit: int = Query(100, ge=1, le=1000),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Hosts with matching findings, e.g. `?kind=open_port&port=445` or `?kind=weak_protocol&detail=TLSv1.0`.
+    """
+    result = await session.execute(
+        select(
+            Finding.host,
+            func.count(Finding.id).label("findings"),
+            func.count(func.distinct(Finding.scan_id)).label("scans"),
+            func.min(Finding.created_at).label("first_seen"),
+            func.max(Finding.created_at).label("last_seen"),
+        )
+        .where(*conditions)
+        .group_by(Finding.host)
+        .order_by(func.max(Finding.created_at).desc())
+        .limit(limit)
+    )
+    return [dict(row._mapping) for row in result.all()]
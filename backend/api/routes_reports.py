@@ -1,21 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import Response, JSONResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import FileResponse, Response, JSONResponse, StreamingResponse
+from sqlalchemy.orm import defer
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
-from typing import List
+from typing import List, Optional, Tuple
+from datetime import datetime
+import re
 
+from api.pagination import NEXT_CURSOR_HEADER, keyset_page, next_cursor
 from database.db_connect import get_session
+from reports.artifact_store import get_artifact_store
+from reports.json_exporter import EXPORT_MEDIA_TYPES
+from reports.pdf_renderer import PDFRenderBusy, get_pdf_renderer
 from schemas import Report, ReportRead
+from security.rate_limiter import rate_limit
+from config import settings
+from utils.compression import decompress_chunks
 
 router = APIRouter()
 
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
 @router.get("/", response_model=List[ReportRead])
-async def get_all_reports(session: AsyncSession = Depends(get_session), skip: int = 0, limit: int = 100):
+async def get_all_reports(
+    response: Response,
+    session: AsyncSession = Depends(get_session),
+    cursor: Optional[str] = Query(None, description=f"Continue after the last page; taken from the {NEXT_CURSOR_HEADER} response header."),
+    limit: int = Query(100, ge=1, le=1000),
+    skip: int = Query(0, ge=0, description="Deprecated, use cursor."),
+    report_type: Optional[str] = None,
+    severity: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
     """
-    Retrieve a list of all available reports.
+    Retrieve available reports, newest first, one page at a time (see get_all_scans).
     """
-    result = await session.execute(select(Report).offset(skip).limit(limit).order_by(Report.created_at.desc()))
-    reports = result.scalars().all()
+    # Metadata only; legacy inline report bytes are never loaded for listings
+    query = select(Report).options(defer(Report.content_blob))
+    if report_type:
+        query = query.where(Report.report_type == report_type)
+    if severity:
+        query = query.where(Report.severity == severity.capitalize())
+    if since is not None:
+        query = query.where(Report.created_at >= since)
+    if until is not None:
+        query = query.where(Report.created_at < until)
+    query = keyset_page(query, Report, cursor, limit)
+    if skip:
+        query = query.offset(skip)
+    result = await session.execute(query)
+    reports, cursor_out = next_cursor(result.scalars().all(), limit)
+    if cursor_out:
+        response.headers[NEXT_CURSOR_HEADER] = cursor_out
     return reports
 
 @router.get("/scan/{scan_id}", response_model=List[ReportRead])
@@ -23,34 +60,173 @@ async def get_reports_for_scan(scan_id: str, session: AsyncSession = Depends(get
     """
     Retrieve all reports associated with a specific scan ID.
     """
-    result = await session.execute(select(Report).where(Report.scan_id == scan_id))
+    result = await session.execute(select(Report).options(defer(Report.content_blob)).where(Report.scan_id == scan_id))
     reports = result.scalars().all()
     if not reports:
         raise HTTPException(status_code=404, detail=f"No reports found for scan ID: {scan_id}")
     return reports
 
-@router.get("/{report_id}/download")
-async def download_report(report_id: int, session: AsyncSession = Depends(get_session)):
+@router.get(
+    "/{report_id}/download",
+    dependencies=[Depends(rate_limit("report_download", settings.RATE_LIMIT_DOWNLOAD_CAPACITY, settings.RATE_LIMIT_DOWNLOAD_REFILL))],
+)
+async def download_report(
+    report_id: int,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_session),
+):
     """
     Download a specific report by its database ID.
+    Served from the artifact store with sendfile; single byte ranges are supported.
+    Compressed reports are sent as stored with a matching Content-Encoding, or
+    decompressed on the fly for clients that don't accept that encoding.
     """
-    report = await session.get(Report, report_id)
+    report = await session.get(Report, report_id, options=[defer(Report.content_blob)])
     if not report:
         raise HTTPException(status_code=404, detail="Report not found.")
 
     if report.report_type == 'pdf':
         media_type = 'application/pdf'
         filename = f"CyberSentinel_Report_{report.scan_id}.pdf"
-    elif report.report_type == 'json':
-        media_type = 'application/json'
-        filename = f"CyberSentinel_Report_{report.scan_id}.json"
+    elif report.report_type in EXPORT_MEDIA_TYPES:
+        media_type = EXPORT_MEDIA_TYPES[report.report_type]
+        filename = f"CyberSentinel_Report_{report.scan_id}.{report.report_type}"
     else:
         # Should not happen, but as a fallback
         media_type = 'application/octet-stream'
         filename = f"CyberSentinel_Report_{report.scan_id}.dat"
-        
-    return Response(
-        content=report.content_blob,
-        media_type=media_type,
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+
+    if report.content_path is None:
+        await session.refresh(report, ["content_blob"])
+        if report.content_blob is not None:
+            # Saved before the artifact store existed
+            return Response(
+                content=report.content_blob,
+                media_type=media_type,
+                headers={"Content-Disposition": f"attachment; filename={filename}"}
+            )
+        if report.report_type != 'pdf':
+            raise HTTPException(status_code=404, detail="Report content is missing.")
+        # First download of this PDF: render it now
+        report = await _ensure_rendered(report.id)
+
+    encoding = report.content_encoding
+    decode = encoding is not None and not _accepts_encoding(accept_encoding, encoding)
+    # Content-addressed, so the digest is a strong validator (of the stored representation)
+    etag = f'"{report.content_digest}-identity"' if decode else f'"{report.content_digest}"'
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "ETag": etag,
+    }
+    if encoding is not None:
+        headers["Vary"] = "Accept-Encoding"
+    if if_none_match and etag in if_none_match:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    store = get_artifact_store()
+    if not await store.exists(report.content_path):
+        raise HTTPException(status_code=404, detail="Report content is missing.")
+
+    if decode:
+        # The decoded length isn't known up front, so no ranges here
+        return StreamingResponse(
+            decompress_chunks(store.iter_bytes(report.content_path), encoding),
+            media_type=media_type,
+            headers=headers,
+        )
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+
+    size = report.content_size
+    headers["Accept-Ranges"] = "bytes"
+    byte_range = _parse_range(range_header, size) if range_header else None
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            store.iter_bytes(report.content_path, start, end),
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type=media_type,
+            headers=headers,
+        )
+
+    local_path = store.local_path(report.content_path)
+    if local_path is not None:
+        return FileResponse(local_path, media_type=media_type, headers=headers)
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(store.iter_bytes(report.content_path), media_type=media_type, headers=headers)
+
+@router.post("/{report_id}/render", response_model=ReportRead)
+async def render_report(report_id: int, session: AsyncSession = Depends(get_session)):
+    """
+    Render a PDF report ahead of its first download. Returns once it is stored.
+    """
+    report = await session.get(Report, report_id, options=[defer(Report.content_blob)])
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found.")
+    if report.report_type != 'pdf' or report.content_path is not None:
+        return report
+    return await _ensure_rendered(report.id)
+
+async def _ensure_rendered(report_id: int) -> Report:
+    try:
+        return await get_pdf_renderer().ensure_rendered(report_id)
+    except PDFRenderBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many reports are being rendered. Please retry shortly.",
+            headers={"Retry-After": "5"},
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def _accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding header allows the given content coding.
+    """
+    if not accept_encoding:
+        return False
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        if name.strip().lower() not in (encoding, "*"):
+            continue
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single `bytes=` range into inclusive (start, end) offsets.
+    Returns None for headers we don't serve partially (multiple ranges, other units),
+    in which case the whole file is sent.
+    """
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        start, end = max(0, size - length), size - 1
+        if length == 0:
+            start = size
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable.",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
@@ -1,24 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body, Header
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Header, Query, Response
 from fastapi.websockets import WebSocket, WebSocketDisconnect
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy.orm import selectinload
-from typing import List, Dict, Any, Optional
+from sqlalchemy import cast
+from sqlalchemy.dialects.postgresql import JSONPATH
+from sqlalchemy.exc import DBAPIError
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime
 
-from database.db_connect import get_session
-from schemas import Scan, ScanCreate, ScanRead, ScanReadWithResults
+from api.pagination import NEXT_CURSOR_HEADER, keyset_page, next_cursor, parse_list, projected_response
+from database.db_connect import get_session, AsyncSessionLocal
+from schemas import Scan, ScanResult, ScanCreate, ScanRead, ScanReadWithResults, ScanOutputPage
 from core.target_parser import Target, parse_target
 from core.decision_engine import get_scan_pipeline
 from core.queue_manager import get_queue
+from core.scan_stats import record_scan_created
+from core.worker_registry import get_worker_registry
 from security.legal_guard import LEGAL_DISCLAIMER
-from tools.live_output import get_live_output_subscriber
+from security.rate_limiter import rate_limit
+from tools.live_output import LiveOutputClient, get_live_output_hub, get_output_log_reader
+from utils.live_feed import SCAN_FINISHED_EVENT, is_entry_id, is_scan_finished, parse_entry_id
+from config import settings
 from utils.logger import logger
+import asyncio
 import uuid
 import json
 
 router = APIRouter()
 
-@router.post("/", response_model=ScanRead, status_code=status.HTTP_202_ACCEPTED)
+@router.post(
+    "/",
+    response_model=ScanRead,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limit("scan_submit", settings.RATE_LIMIT_SCAN_SUBMIT_CAPACITY, settings.RATE_LIMIT_SCAN_SUBMIT_REFILL))],
+)
 async def start_new_scan(
     scan_in: ScanCreate = Body(...),
     x_legal_accepted: Optional[str] = Header(None),
@@ -66,6 +81,7 @@ async def start_new_scan(
         status="queued"
     )
     session.add(new_scan)
+    await record_scan_created(session, new_scan)
     await session.commit()
     await session.refresh(new_scan)
 
@@ -74,55 +90,229 @@ async def start_new_scan(
         "scan_id": scan_id,
         "target": scan_in.target,
         "pipeline": pipeline,
+        "prerender_pdf": settings.REPORT_PDF_PRERENDER if scan_in.prerender_pdf is None else scan_in.prerender_pdf,
     }
 
     queue = get_queue()
-    await queue.enqueue_task(task)
+    # Only workers that have the pipeline's tools pick it up
+    route = await get_worker_registry().route_for(pipeline)
+    await queue.enqueue_task(task, route)
 
     logger.info(f"Scan {scan_id} for target '{scan_in.target}' has been queued.", extra={"scan_id": scan_id})
     return new_scan
 
 
+SCAN_FIELDS = set(ScanRead.model_fields)
+
 @router.get("/", response_model=List[ScanRead])
-async def get_all_scans(session: AsyncSession = Depends(get_session), skip: int = 0, limit: int = 100):
+async def get_all_scans(
+    response: Response,
+    session: AsyncSession = Depends(get_session),
+    cursor: Optional[str] = Query(None, description=f"Continue after the last page; taken from the {NEXT_CURSOR_HEADER} response header."),
+    limit: int = Query(100, ge=1, le=1000),
+    skip: int = Query(0, ge=0, description="Deprecated, use cursor. Offsets get slower the deeper they go."),
+    status_: Optional[str] = Query(None, alias="status"),
+    target: Optional[str] = None,
+    severity: Optional[str] = Query(None, description="Overall severity of the scan: Low, Medium, High or Critical."),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated ScanRead fields to return, e.g. scan_id,status."),
+    tool: Optional[str] = Query(None, description="Only consider results of this tool for the findings filters."),
+    contains: Optional[str] = Query(None, description='JSON the findings must contain, e.g. {"open_ports": [445]}.'),
+    jsonpath: Optional[str] = Query(None, description='JSON path that must match the findings, e.g. $.open_ports[*] ? (@ == 445).'),
+):
     """
-    Retrieve a list of all scans.
+    Retrieve scans, newest first, one page at a time.
+    Pages are seeked on (created_at, id); pass the X-Next-Cursor header of a
+    response as `cursor` to get the next page. The findings filters are served
+    by the GIN index on scanresult.findings.
     """
-    result = await session.execute(select(Scan).offset(skip).limit(limit).order_by(Scan.created_at.desc()))
-    scans = result.scalars().all()
+    projection = parse_list(fields, "fields", SCAN_FIELDS)
+    if projection:
+        # The pagination columns are always loaded for the cursor
+        columns = dict.fromkeys(projection + ["created_at", "id"])
+        query = select(*[getattr(Scan, name) for name in columns])
+    else:
+        query = select(Scan)
+
+    if status_:
+        query = query.where(Scan.status == status_)
+    if target:
+        query = query.where(Scan.target == target)
+    if severity:
+        query = query.where(Scan.severity == severity.capitalize())
+    if since is not None:
+        query = query.where(Scan.created_at >= since)
+    if until is not None:
+        query = query.where(Scan.created_at < until)
+    if tool or contains or jsonpath:
+        matching = select(ScanResult.scan_id)
+        if tool:
+            matching = matching.where(ScanResult.tool_name == tool)
+        if contains:
+            try:
+                document = json.loads(contains)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="'contains' must be a JSON document.")
+            matching = matching.where(ScanResult.findings.contains(document))
+        if jsonpath:
+            matching = matching.where(ScanResult.findings.path_exists(cast(jsonpath, JSONPATH)))
+        query = query.where(Scan.scan_id.in_(matching))
+
+    query = keyset_page(query, Scan, cursor, limit)
+    if skip:
+        query = query.offset(skip)
+    try:
+        result = await session.execute(query)
+    except DBAPIError as e:
+        # Postgres rejects malformed JSON path expressions
+        raise HTTPException(status_code=400, detail=f"Invalid findings filter: {e.orig}")
+
+    if projection:
+        rows, cursor_out = next_cursor(result.all(), limit)
+        return projected_response([{name: getattr(row, name) for name in projection} for row in rows], cursor_out)
+    scans, cursor_out = next_cursor(result.scalars().all(), limit)
+    if cursor_out:
+        response.headers[NEXT_CURSOR_HEADER] = cursor_out
     return scans
 
 
 @router.get("/{scan_id}", response_model=ScanReadWithResults)
-async def get_scan_details(scan_id: str, session: AsyncSession = Depends(get_session)):
+async def get_scan_details(
+    scan_id: str,
+    fields: Optional[str] = Query(None, description="Comma-separated ScanRead fields and/or 'results', e.g. status,finished_at."),
+    tools: Optional[str] = Query(None, description="Comma-separated tool names; only their results are returned."),
+    session: AsyncSession = Depends(get_session),
+):
     """
     Retrieve the details and results of a specific scan.
+    With `fields`, only those fields are returned (results are only loaded if
+    'results' is one of them); with `tools`, only those tools' results.
     """
-    result = await session.execute(
-        select(Scan)
-        .where(Scan.scan_id == scan_id)
-        .options(selectinload(Scan.results))
-    )
+    projection = parse_list(fields, "fields", SCAN_FIELDS | {"results"})
+    tool_names = parse_list(tools, "tools")
+
+    result = await session.execute(select(Scan).where(Scan.scan_id == scan_id))
     scan = result.scalar_one_or_none()
     if scan is None:
         raise HTTPException(status_code=404, detail="Scan not found.")
-    return scan
+
+    details: Dict[str, Any] = ScanRead.model_validate(scan).model_dump()
+    if projection is None or "results" in projection:
+        results_query = select(ScanResult).where(ScanResult.scan_id == scan_id).order_by(ScanResult.id)
+        if tool_names:
+            results_query = results_query.where(ScanResult.tool_name.in_(tool_names))
+        details["results"] = (await session.execute(results_query)).scalars().all()
+
+    if projection is None:
+        return details
+    return projected_response({name: details[name] for name in projection})
+
+FINISHED_STATUSES = {"completed", "failed"}
+
+@router.get("/{scan_id}/output", response_model=ScanOutputPage)
+async def get_scan_output(
+    scan_id: str,
+    from_: Optional[str] = Query(None, alias="from", description="Entry ID to continue after (exclusive)."),
+    limit: int = Query(500, ge=1, le=5000),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Page through the archived live output of a scan. The cursor is returned
+    even on a short page, so a client tailing a running scan keeps its place.
+    """
+    if from_ is not None and not is_entry_id(from_):
+        raise HTTPException(status_code=400, detail="'from' must be an entry ID (<ms>-<seq>) returned as next_cursor.")
+    messages, next_cursor = await get_output_log_reader().read(scan_id, after=from_, limit=limit)
+    if not messages:
+        # Only an empty page needs the database to tell an unknown scan from a quiet one
+        result = await session.execute(select(Scan.id).where(Scan.scan_id == scan_id))
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Scan not found.")
+    return ScanOutputPage(
+        entries=[json.loads(message) for message in messages],
+        next_cursor=next_cursor,
+    )
 
 @router.websocket("/ws/{scan_id}")
-async def websocket_scan_output(websocket: WebSocket, scan_id: str):
+async def websocket_scan_output(websocket: WebSocket, scan_id: str, cursor: Optional[str] = None):
     """
     WebSocket endpoint to stream live output for a given scan ID.
+
+    The archived output after `cursor` (or from the beginning) is replayed first,
+    then the socket switches to live messages.
     """
     await websocket.accept()
-    subscriber = await get_live_output_subscriber()
-    channel = f"scan_live_feed:{scan_id}" # Changed channel name
-    
+    if cursor is not None and not is_entry_id(cursor):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid cursor")
+        return
+    hub = get_live_output_hub()
+    # Register before replaying so nothing published in the meantime is missed
+    client = hub.register(scan_id)
+    disconnect_watcher = asyncio.create_task(_close_on_disconnect(websocket, client))
+
     try:
-        async for message in subscriber.subscribe(channel):
+        last_id, finished = await _replay_output(websocket, scan_id, cursor)
+        if finished:
+            client.close()
+        else:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(select(Scan.status).where(Scan.scan_id == scan_id))
+                scan_status = result.scalar_one_or_none()
+            if scan_status in FINISHED_STATUSES:
+                client.push(json.dumps({"level": "INFO", "message": f"--- Scan already {scan_status} ---", "event": SCAN_FINISHED_EVENT}))
+                client.close()
+
+        caught_up = last_id is None
+        async for message in client.messages():
+            if not caught_up:
+                # Skip live messages that were already sent during the replay
+                message_id = json.loads(message).get("id")
+                if message_id and parse_entry_id(message_id) <= parse_entry_id(last_id):
+                    continue
+                caught_up = True
             await websocket.send_text(message)
+
+        if client.dropped:
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Client too slow")
+        else:
+            await websocket.close()
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for scan ID: {scan_id}", extra={"scan_id": scan_id}) # Added extra
     except Exception as e:
         logger.error(f"WebSocket error for scan ID {scan_id}: {e}", extra={"scan_id": scan_id}) # Added extra
         await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+    finally:
+        disconnect_watcher.cancel()
+        hub.unregister(client)
 
+
+async def _replay_output(websocket: WebSocket, scan_id: str, cursor: Optional[str]) -> Tuple[Optional[str], bool]:
+    """
+    Sends the archived output page by page. Returns the last entry ID sent and
+    whether the archive already ends with the scan-finished sentinel.
+    """
+    reader = get_output_log_reader()
+    page_size = settings.LIVE_OUTPUT_REPLAY_PAGE_SIZE
+    last_id, finished = cursor, False
+    while True:
+        messages, last_id = await reader.read(scan_id, after=last_id, limit=page_size)
+        for message in messages:
+            await websocket.send_text(message)
+            finished = finished or is_scan_finished(message)
+        if len(messages) < page_size:
+            return last_id, finished
+
+
+async def _close_on_disconnect(websocket: WebSocket, client: LiveOutputClient):
+    """
+    Closes the viewer's queue as soon as the browser goes away, even if no output is flowing.
+    """
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    except Exception:
+        pass
+    client.close()
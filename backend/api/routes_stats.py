@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends, Query
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.scan_stats import get_dashboard_stats
+from database.db_connect import get_session
+from schemas import DashboardStats
+
+router = APIRouter()
+
+@router.get("/", response_model=DashboardStats)
+async def get_stats(
+    days: int = Query(30, ge=1, le=366, description="Number of days in scans_per_day, ending today (UTC)."),
+    top: int = Query(10, ge=1, le=100, description="Number of riskiest targets to return."),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Dashboard aggregates: scans by status, severity distribution, scans per day
+    and the riskiest targets. Read from rollups maintained as scans change state,
+    so the cost doesn't grow with the scan history.
+    """
+    return await get_dashboard_stats(session, days=days, top=top)
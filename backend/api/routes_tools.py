@@ -1,9 +1,16 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Dict, Any, Optional
+
+from database.db_connect import get_session
+from schemas import Scan, ScanResult, ToolUsageSummary
 
 from security.legal_guard import get_legal_disclaimer_text
 from monitoring.resource_monitor import get_resource_metrics
-from tools.tool_controller import ToolController
+from core.worker_registry import get_worker_registry
+from tools.tool_controller import TOOL_NAMES
 
 router = APIRouter()
 
@@ -45,10 +52,60 @@ TOOL_DESCRIPTIONS = {
 @router.get("/", response_model=List[str])
 async def get_all_tools():
     """
-    Get a list of all available tool names.
+    Get the names of the tools at least one live worker can run
+    (all tools if no worker has registered yet).
+    """
+    fleet = await get_worker_registry().fleet_tools()
+    available = [tool_name for tool_name, status in fleet.items() if status["available"]]
+    return available or list(TOOL_NAMES)
+
+@router.get("/fleet", response_model=Dict[str, Any])
+async def get_fleet():
     """
-    # We can get the tool names directly from our dummy controller's map
-    return list(ToolController(scan_id="dummy").tool_functions.keys())
+    Fleet-wide tool availability and the capabilities each live worker registered.
+    """
+    workers = await get_worker_registry().live_workers()
+    return {"tools": await get_worker_registry().fleet_tools(workers), "workers": workers}
+
+@router.get("/usage/summary", response_model=List[ToolUsageSummary])
+async def get_tool_usage_summary(
+    group_by: str = Query("tool", pattern="^(tool|target)$"),
+    tool_name: Optional[str] = None,
+    target: Optional[str] = None,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Aggregate resource usage of tool runs, grouped by tool or by tool and target.
+    """
+    group_columns = [ScanResult.tool_name]
+    if group_by == "target":
+        group_columns.append(Scan.target)
+
+    query = (
+        select(
+            *group_columns,
+            func.count(ScanResult.id).label("runs"),
+            func.count(ScanResult.coalesced_from).label("coalesced_runs"),
+            func.coalesce(func.sum(ScanResult.wall_time), 0).label("total_wall_time"),
+            func.coalesce(func.avg(ScanResult.wall_time), 0).label("avg_wall_time"),
+            func.coalesce(func.sum(ScanResult.wait_time), 0).label("total_wait_time"),
+            func.coalesce(func.sum(ScanResult.cpu_user_time), 0).label("total_cpu_user_time"),
+            func.coalesce(func.sum(ScanResult.cpu_system_time), 0).label("total_cpu_system_time"),
+            func.max(ScanResult.peak_rss_bytes).label("max_peak_rss_bytes"),
+            func.coalesce(func.sum(ScanResult.output_bytes), 0).label("total_output_bytes"),
+            func.coalesce(func.sum(ScanResult.http_requests), 0).label("total_http_requests"),
+        )
+        .join(Scan, Scan.scan_id == ScanResult.scan_id)
+        .group_by(*group_columns)
+        .order_by(func.sum(ScanResult.wall_time).desc().nulls_last())
+    )
+    if tool_name:
+        query = query.where(ScanResult.tool_name == tool_name)
+    if target:
+        query = query.where(Scan.target == target)
+
+    result = await session.execute(query)
+    return [dict(row._mapping) for row in result.all()]
 
 @router.get("/{tool_name}", response_model=Dict[str, Any])
 async def get_tool_details(tool_name: str):
@@ -0,0 +1,5 @@
+"""
+Micro-benchmarks for the parsers, risk engine, report generation and the hot
+runtime paths, with time and peak memory compared against stored baselines.
+Run with `python -m benchmarks` from the backend directory.
+"""
@@ -0,0 +1,72 @@
+"""
+Runs the micro-benchmarks and compares them with the recorded baselines.
+
+    python -m benchmarks                    # run everything, compare with baselines.json
+    python -m benchmarks --only parsers.    # benchmarks whose name starts with "parsers."
+    python -m benchmarks --save-baseline    # record the results as the new baselines
+
+Exits with status 1 if a benchmark regressed past the tolerances or went over its
+budget, or has no baseline to compare with (unless --allow-missing-baseline).
+"""
+import fnmatch
+import sys
+from typing import List, Optional
+
+import typer
+
+from benchmarks import bench_parsers, bench_reports, bench_runtime  # noqa: F401 (registers the benchmarks)
+from benchmarks.harness import (
+    BASELINES_PATH, BENCHMARKS, SkipBenchmark, compare, format_result, load_baselines, run_benchmark, save_baselines,
+)
+
+cli = typer.Typer()
+
+@cli.command()
+def run(
+    only: Optional[List[str]] = typer.Option(None, help="Name prefixes or glob patterns of the benchmarks to run."),
+    save_baseline: bool = typer.Option(False, help="Record the results as the baselines."),
+    baselines: str = typer.Option(BASELINES_PATH, help="Baseline file."),
+    time_tolerance: float = typer.Option(1.3, help="Slowdown factor reported as a regression."),
+    memory_tolerance: float = typer.Option(1.2, help="Peak memory growth factor reported as a regression."),
+    allow_missing_baseline: bool = typer.Option(False, help="Don't fail for benchmarks without a baseline, e.g. new ones."),
+    list_only: bool = typer.Option(False, "--list", help="List the benchmarks and exit."),
+):
+    names = [
+        name for name in BENCHMARKS
+        if not only or any(name.startswith(pattern) or fnmatch.fnmatch(name, pattern) for pattern in only)
+    ]
+    if list_only:
+        print("\n".join(names))
+        return
+
+    recorded = load_baselines(baselines)
+    if not recorded and not save_baseline:
+        print(f"No baselines in {baselines}; only the budgets are checked. Record them with --save-baseline.\n")
+    results, regressions, missing = [], [], []
+    for name in names:
+        try:
+            result = run_benchmark(BENCHMARKS[name])
+        except SkipBenchmark as e:
+            print(f"{name:<40} skipped: {e}")
+            continue
+        results.append(result)
+        if name not in recorded:
+            missing.append(name)
+        print(format_result(result, recorded.get(name)))
+        for problem in compare(result, recorded.get(name), time_tolerance, memory_tolerance):
+            regressions.append(f"{name}: {problem}")
+
+    if save_baseline:
+        save_baselines(results, baselines)
+        print(f"Recorded {len(results)} baselines in {baselines}.")
+        return
+    if missing:
+        print("\nNo baseline (not compared):\n  " + "\n  ".join(missing))
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+    if regressions or (missing and not allow_missing_baseline):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
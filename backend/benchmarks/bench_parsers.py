@@ -0,0 +1,66 @@
+from benchmarks import corpora
+from benchmarks.harness import SkipBenchmark, benchmark
+
+
+@benchmark("parsers.sslscan_200_hosts")
+def sslscan_parse():
+    from scanners.ssl_scanner import SSLScanner
+
+    output = corpora.sslscan_output()
+    scanner = SSLScanner("bench.local")
+    return lambda: {"ciphers": len(scanner._parse_results(output)["supported_ciphers"])}
+
+@benchmark("parsers.dirsearch_100k_lines")
+def dirsearch_parse():
+    from offensive.dir_discovery import DirectoryDiscovery
+
+    output = corpora.dirsearch_report()
+    discovery = DirectoryDiscovery("bench.local")
+
+    def parse():
+        return {"paths": len(discovery._parse_dirsearch_results(output)["discovered_paths"])}
+    return parse
+
+@benchmark("parsers.nmap_xml_slash16", rounds=3)
+def nmap_parse():
+    try:
+        import nmap
+    except ImportError:
+        raise SkipBenchmark("python-nmap is not installed")
+    from scanners.nmap_scanner import NmapScanner
+
+    xml = corpora.nmap_xml()
+    # No nmap binary needed: python-nmap parses recorded XML the same way it parses a live scan's
+    scanner = NmapScanner.__new__(NmapScanner)
+    scanner.target, scanner.scan_id = "10.20.0.0/16", None
+    scanner.port_scanner = nmap.PortScanner.__new__(nmap.PortScanner)
+
+    def parse():
+        scanner.port_scanner.analyse_nmap_xml_scan(xml)
+        results = scanner._parse_results()
+        return {"hosts": len(scanner.port_scanner.all_hosts()), "open_ports": len(results["open_ports"])}
+    return parse
+
+@benchmark("parsers.sqlmap_log_50k")
+def sqlmap_parse():
+    from offensive.sqlmap_scanner import SQLMapScanner
+
+    log = corpora.sqlmap_log()
+    scanner = SQLMapScanner.__new__(SQLMapScanner)
+    return lambda: {"vulnerabilities": len(scanner._parse_json_output(log))}
+
+@benchmark("parsers.html_500_forms", rounds=3)
+def form_extraction():
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        raise SkipBenchmark("beautifulsoup4 is not installed")
+
+    html = corpora.html_forms()
+
+    def extract():
+        # What the SQL and XSS testers do with a page before sending any payload
+        forms = BeautifulSoup(html, "html.parser").find_all("form")
+        fields = sum(len([i for i in form.find_all(["input", "textarea"]) if i.get("name")]) for form in forms)
+        return {"forms": len(forms), "fields": fields}
+    return extract
@@ -0,0 +1,82 @@
+from benchmarks import corpora
+from benchmarks.harness import SkipBenchmark, benchmark
+
+# Findings per synthetic scan
+SCAN_SIZES = (10, 1_000, 100_000)
+
+RISK_ASSESSMENT = {"total_risk_score": 72, "severity": "High", "breakdown": {"dir_discovery": 25, "ssl_scan": 20}}
+
+
+def _require_numpy():
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        raise SkipBenchmark("numpy is not installed")
+
+@benchmark("risk.engine_one_scan_100k")
+def risk_engine():
+    _require_numpy()
+    from core.risk_engine import RiskEngine
+
+    results = corpora.scan_results(100_000)
+    return lambda: RiskEngine(results).calculate_risk()
+
+@benchmark("risk.rescore_batch_100k_results", rounds=3)
+def risk_rescore_batch():
+    _require_numpy()
+    from core.risk_rules import get_risk_rules
+
+    # A re-score batch: 20k scans of 5 results each
+    rows = [(f"scan-{index}", result["tool_name"], result["findings"])
+            for index in range(20_000) for result in corpora.scan_results(10 + index % 7)]
+    scan_ids = [f"scan-{index}" for index in range(20_000)]
+    rules = get_risk_rules()
+
+    def score():
+        rules.score_scans(scan_ids, rows)
+        return {"results": len(rows)}
+    return score
+
+
+def _export(findings: int, report_format: str, encoding=None):
+    from reports.json_exporter import generate_json_report
+    from utils.compression import compress_chunks
+
+    results = corpora.scan_results(findings)
+
+    def export():
+        size = 0
+        for chunk in compress_chunks(generate_json_report("bench", "bench.local", results, RISK_ASSESSMENT, report_format), encoding):
+            size += len(chunk)
+        return {"bytes": size}
+    return export
+
+for _size in SCAN_SIZES:
+    benchmark(f"export.json_{_size}")(lambda size=_size: _export(size, "json"))
+    benchmark(f"export.ndjson_{_size}")(lambda size=_size: _export(size, "ndjson"))
+benchmark("export.ndjson_gzip_100000")(lambda: _export(100_000, "ndjson", "gzip"))
+
+
+def _render_html(findings: int):
+    try:
+        import jinja2  # noqa: F401
+    except ImportError:
+        raise SkipBenchmark("jinja2 is not installed")
+    from reports.pdf_generator import PDFGenerator
+
+    generator = PDFGenerator("bench", "bench.local", corpora.scan_results(findings), RISK_ASSESSMENT, timestamp="2024-01-01 00:00:00")
+    return lambda: {"html_bytes": len(generator.render_html())}
+
+def _render_pdf(findings: int):
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        raise SkipBenchmark("weasyprint (or its system libraries) is not installed")
+    from reports.pdf_generator import PDFGenerator
+
+    generator = PDFGenerator("bench", "bench.local", corpora.scan_results(findings), RISK_ASSESSMENT, timestamp="2024-01-01 00:00:00")
+    return lambda: {"pdf_bytes": len(generator.generate())}
+
+for _size in SCAN_SIZES:
+    benchmark(f"pdf.render_html_{_size}")(lambda size=_size: _render_html(size))
+    benchmark(f"pdf.generate_{_size}", rounds=3)(lambda size=_size: _render_pdf(size))
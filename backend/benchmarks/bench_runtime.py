@@ -0,0 +1,212 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks import corpora
+from benchmarks.harness import SkipBenchmark, benchmark
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds from interpreter start until the process could serve (imports done), median of the rounds
+STARTUP_BUDGETS = {
+    "api": float(os.getenv("BENCHMARK_STARTUP_BUDGET_API", 1.5)),
+    "worker": float(os.getenv("BENCHMARK_STARTUP_BUDGET_WORKER", 1.5)),
+}
+STARTUP_IMPORTS = {
+    # What `python main.py run-api` and `python main.py worker` import before starting
+    "api": "import main, uvicorn",
+    "worker": "import main, worker",
+}
+
+
+def _startup(process: str):
+    def start():
+        subprocess.run([sys.executable, "-c", STARTUP_IMPORTS[process]], cwd=BACKEND_DIR, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return start
+
+for _process, _budget in STARTUP_BUDGETS.items():
+    benchmark(f"startup.{_process}", rounds=5, budget_seconds=_budget, track_memory=False)(lambda process=_process: _startup(process))
+
+
+@benchmark("logging.call_10k")
+def log_calls():
+    import logging
+    import queue
+    from utils.logger import _ScanQueueHandler
+
+    # The application's caller-side handler, on a queue nobody drains, so the
+    # listener thread's output doesn't mix into the numbers
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    bench_logger = logging.getLogger("benchmark.logging")
+    bench_logger.handlers = [_ScanQueueHandler(records)]
+    bench_logger.setLevel(logging.INFO)
+    bench_logger.propagate = False
+
+    def log():
+        started = time.perf_counter()
+        for index in range(10_000):
+            bench_logger.info("Nmap scan finished for %s. Found %d open ports.", "bench.local", index, extra={"scan_id": "bench"})
+        elapsed = time.perf_counter() - started
+        while not records.empty():
+            records.get_nowait()
+        return {"us_per_call": elapsed / 10_000 * 1e6}
+    return log
+
+@benchmark("logging.listener_format_10k")
+def log_formatting():
+    import logging
+    from utils.logger import EXCLUDED_PATTERN, USER_RELEVANT_PATTERN, JsonFormatter
+
+    formatter = JsonFormatter()
+    records = [
+        logging.LogRecord("CyberSentinel", logging.INFO, __file__, 1, f"Tool step {index}: Open Ports Found on bench.local", None, None)
+        for index in range(10_000)
+    ]
+    for record in records:
+        record.scan_id = "bench"
+
+    def format_all():
+        # Per record on the listener thread: the live feed filter, then the JSON file line
+        relevant = 0
+        for record in records:
+            message = record.getMessage()
+            relevant += bool(USER_RELEVANT_PATTERN.search(message)) and not EXCLUDED_PATTERN.search(message)
+            formatter.format(record)
+        return {"relevant": relevant}
+    return format_all
+
+
+class _CountingPublisher:
+    """ Stands in for LiveOutputPublisher and counts the Redis calls it would make. """
+    def __init__(self, viewers: int):
+        self.viewers = viewers
+        self.calls = 0
+
+    async def publish(self, channel: str, message: str, live: bool = True):
+        self.calls += 1
+
+    async def count_subscribers(self, channel: str) -> int:
+        self.calls += 1
+        return self.viewers
+
+def _live_output(viewers: int, capped: bool = True):
+    from config import settings
+    from tools.live_output import LiveOutputStream
+
+    lines = corpora.nikto_output()
+
+    async def stream():
+        publisher = _CountingPublisher(viewers)
+        cap = settings.LIVE_OUTPUT_MAX_LINES_PER_SECOND
+        if not capped:
+            # Every line is kept, so only the framing reduces the calls
+            settings.LIVE_OUTPUT_MAX_LINES_PER_SECOND = len(lines) * 10
+        try:
+            output = LiveOutputStream(publisher, "live_feed:bench")
+            for line in lines:
+                output.feed(line)
+            await output.close()
+        finally:
+            settings.LIVE_OUTPUT_MAX_LINES_PER_SECOND = cap
+        # Publishing each line on its own took one Redis call per line
+        return {"redis_ops": publisher.calls, "per_line_ops": len(lines), "dropped": output.lines_dropped}
+    return stream
+
+benchmark("live_output.nikto_50k_watched", rounds=3)(lambda: _live_output(1))
+benchmark("live_output.nikto_50k_unwatched", rounds=3)(lambda: _live_output(0))
+benchmark("live_output.nikto_50k_uncapped", rounds=3)(lambda: _live_output(1, capped=False))
+
+
+@benchmark("rate_limit.local_buckets_100k")
+def local_rate_limit():
+    from security.rate_limiter import LocalTokenBuckets
+
+    buckets = LocalTokenBuckets(capacity=10, refill_rate=1.0, max_keys=10_000)
+    # A few hot clients flooding among many quiet ones
+    identifiers = [f"10.0.{index % 7}.1" if index % 2 else f"10.1.{index % 20_000 // 256}.{index % 256}" for index in range(100_000)]
+
+    def take():
+        started = time.perf_counter()
+        refused = sum(buckets.take(identifier) is not None for identifier in identifiers)
+        return {"checks_per_s": len(identifiers) / (time.perf_counter() - started), "refused": refused}
+    return take
+
+@benchmark("rate_limit.redis_contended_10k", rounds=3, track_memory=False)
+def redis_rate_limit():
+    try:
+        import redis.asyncio as redis
+    except ImportError:
+        raise SkipBenchmark("redis is not installed")
+    from config import settings
+    from security.rate_limiter import LocalTokenBuckets, RateLimiter
+
+    client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    concurrency, checks = 200, 50
+
+    async def contend():
+        try:
+            await client.ping()
+        except redis.RedisError as e:
+            raise SkipBenchmark(f"Redis is not reachable at {settings.REDIS_URL}: {e}")
+        results = {}
+        for label, local in (("redis_only", None), ("with_prefilter", LocalTokenBuckets(10, 1.0, 10_000))):
+            limiter = RateLimiter(f"benchmark_{label}", capacity=10, refill_rate=1.0, client=client, local=local)
+
+            async def client_task(task: int):
+                # Half the tasks share one identifier: the contended bucket
+                identifier = "hot" if task % 2 else f"client-{task}"
+                for _ in range(checks):
+                    await limiter.check(identifier)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(client_task(task) for task in range(concurrency)))
+            results[f"{label}_checks_per_s"] = concurrency * checks / (time.perf_counter() - started)
+        return results
+    return contend
+
+
+@benchmark("database.bulk_insert_5k_results", rounds=3, track_memory=False)
+def bulk_insert_rows():
+    try:
+        from sqlalchemy.exc import SQLAlchemyError
+        from database.bulk import bulk_insert
+        from database.db_connect import AsyncSessionLocal, create_db_and_tables
+        from database.models import Scan, ScanResult
+    except ImportError as e:
+        raise SkipBenchmark(f"database dependencies are not installed: {e}")
+
+    findings = corpora.scan_results(50)
+    rows = 5_000
+
+    def new_rows(scan_id: str):
+        picks = [findings[index % len(findings)] for index in range(rows)]
+        return [ScanResult(scan_id=scan_id, tool_name=result["tool_name"], findings=result["findings"], wall_time=1.0) for result in picks]
+
+    async def insert():
+        try:
+            await create_db_and_tables()
+        except (OSError, SQLAlchemyError) as e:
+            raise SkipBenchmark(f"the database is not reachable: {e}")
+        timings = {}
+        for label in ("bulk", "orm"):
+            # Inside a transaction that is rolled back, so the database is left as it was
+            async with AsyncSessionLocal() as session:
+                scan = Scan(scan_id=f"benchmark-{label}-{time.time_ns()}", target="bench.local", scan_mode="benchmark", scan_depth="none")
+                session.add(scan)
+                await session.flush()
+                batch = new_rows(scan.scan_id)
+                started = time.perf_counter()
+                if label == "bulk":
+                    await bulk_insert(session, ScanResult, batch)
+                else:
+                    # The previous path: one unit-of-work add per result
+                    for row in batch:
+                        session.add(row)
+                    await session.flush()
+                timings[f"{label}_rows_per_s"] = rows / (time.perf_counter() - started)
+                await session.rollback()
+        return timings
+    return insert
@@ -0,0 +1,173 @@
+"""
+Fixture corpora of large tool outputs for the benchmarks.
+
+Each corpus is generated once from a fixed seed and recorded under
+CORPORA_DIR, so every run (and every machine) benchmarks the same bytes.
+The digests of the corpora a benchmark used are stored with its baseline;
+a changed corpus invalidates the comparison instead of passing as a regression.
+"""
+import hashlib
+import json
+import os
+import random
+from typing import Any, Callable, Dict, List, Set
+
+CORPORA_DIR = os.getenv("BENCHMARK_CORPORA_DIR", os.path.join(os.path.dirname(__file__), ".corpora"))
+
+# "<name>:<digest>" of the corpora loaded by the running benchmark
+used_digests: Set[str] = set()
+
+CIPHERS = [
+    "ECDHE-RSA-AES256-GCM-SHA384", "ECDHE-RSA-AES128-GCM-SHA256", "ECDHE-RSA-CHACHA20-POLY1305",
+    "AES256-SHA", "AES128-SHA", "DES-CBC3-SHA", "ECDHE-RSA-AES256-SHA384", "TLS_AES_256_GCM_SHA384",
+]
+SERVICES = [
+    ("ssh", "OpenSSH", "8.9p1", "cpe:/a:openbsd:openssh:8.9p1"),
+    ("http", "Apache httpd", "2.4.49", "cpe:/a:apache:http_server:2.4.49"),
+    ("http", "nginx", "1.20.1", "cpe:/a:igor_sysoev:nginx:1.20.1"),
+    ("mysql", "MySQL", "5.7.33", "cpe:/a:mysql:mysql:5.7.33"),
+    ("ftp", "vsftpd", "3.0.3", "cpe:/a:vsftpd:vsftpd:3.0.3"),
+    ("smtp", "Postfix smtpd", "", "cpe:/a:postfix:postfix"),
+]
+PORTS = [21, 22, 25, 80, 110, 139, 443, 445, 3306, 8080]
+
+
+def _corpus(name: str, generate: Callable[[random.Random], str]) -> str:
+    path = os.path.join(CORPORA_DIR, name)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+    else:
+        content = generate(random.Random(name))
+        os.makedirs(CORPORA_DIR, exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+    used_digests.add(f"{name}:{hashlib.sha256(content.encode('utf-8')).hexdigest()[:12]}")
+    return content
+
+
+def sslscan_output(hosts: int = 200) -> str:
+    """ sslscan --no-colour output for many hosts, one after another. """
+    def generate(rng: random.Random) -> str:
+        lines = []
+        for host in range(hosts):
+            lines += [
+                f"Testing SSL server 10.0.{host // 256}.{host % 256} on port 443 using SNI name", "",
+                "  SSL/TLS Protocols:",
+                f"SSLv2     {rng.choice(['disabled', 'enabled'])}",
+                f"SSLv3     {rng.choice(['disabled', 'disabled', 'enabled'])}",
+                f"TLSv1.0   {rng.choice(['disabled', 'enabled'])}",
+                "TLSv1.1   enabled", "TLSv1.2   enabled", "TLSv1.3   enabled", "",
+                "  Heartbleed:",
+                f"TLSv1.2 {rng.choice(['not vulnerable', 'not vulnerable', 'vulnerable'])} to heartbleed", "",
+                "  Supported Server Cipher(s):",
+            ]
+            for cipher in rng.sample(CIPHERS, 6):
+                lines.append(f"Accepted  TLSv1.2  {rng.choice([128, 256])} bits  {cipher}   Curve P-256 DHE 256")
+            lines += ["", "  SSL Certificate:", "Signature Algorithm: sha256WithRSAEncryption", "RSA Key Strength:    2048", ""]
+        return "\n".join(lines)
+    return _corpus(f"sslscan_{hosts}.txt", generate)
+
+def dirsearch_report(lines: int = 100_000) -> str:
+    """ dirsearch plain-text report, mostly 404s with some hits and comments. """
+    def generate(rng: random.Random) -> str:
+        out = ["# Dirsearch started Mon Jan  1 00:00:00 2024 as: dirsearch -u https://bench.local"]
+        words = ["admin", "login", "api", "static", "images", "backup", "old", "v1", "v2", "test", "config", ".git", ".env"]
+        for index in range(lines - 1):
+            status = rng.choices([200, 301, 302, 403, 404, 500], weights=[10, 5, 3, 4, 75, 3])[0]
+            path = "/".join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+            out.append(f"{status}   {rng.randint(0, 999)}{rng.choice('BK')}  - https://bench.local/{path}{index}")
+        return "\n".join(out)
+    return _corpus(f"dirsearch_{lines}.txt", generate)
+
+def nmap_xml(prefix: str = "10.20", up_ratio: float = 0.1) -> str:
+    """ nmap -sV XML for a /16, with `up_ratio` of the hosts up and a few services each. """
+    def generate(rng: random.Random) -> str:
+        out = ['<?xml version="1.0" encoding="UTF-8"?>',
+               f'<nmaprun scanner="nmap" args="nmap -oX - -sV {prefix}.0.0/16" start="1700000000" version="7.94" xmloutputversion="1.05">',
+               '<scaninfo type="syn" protocol="tcp" numservices="1000" services="1-1000"/>']
+        up = 0
+        for third in range(256):
+            for fourth in range(256):
+                if rng.random() >= up_ratio:
+                    continue
+                up += 1
+                out.append(f'<host starttime="1700000000" endtime="1700000100"><status state="up" reason="syn-ack" reason_ttl="0"/>'
+                           f'<address addr="{prefix}.{third}.{fourth}" addrtype="ipv4"/><hostnames><hostname name="h{third}-{fourth}.bench.local" type="PTR"/></hostnames><ports>')
+                for port in sorted(rng.sample(PORTS, rng.randint(1, 5))):
+                    name, product, version, cpe = rng.choice(SERVICES)
+                    out.append(f'<port protocol="tcp" portid="{port}"><state state="open" reason="syn-ack" reason_ttl="64"/>'
+                               f'<service name="{name}" product="{product}" version="{version}" method="probed" conf="10"><cpe>{cpe}</cpe></service></port>')
+                out.append('</ports></host>')
+        out.append(f'<runstats><finished time="1700000100" timestr="" elapsed="100.00" summary="" exit="success"/>'
+                   f'<hosts up="{up}" down="{65536 - up}" total="65536"/></runstats></nmaprun>')
+        return "\n".join(out)
+    return _corpus(f"nmap_{prefix.replace('.', '_')}_16.xml", generate)
+
+def sqlmap_log(entries: int = 50_000) -> List[Dict[str, Any]]:
+    """ sqlmap --dump-format=JSON log entries, a few of them vulnerable parameters. """
+    def generate(rng: random.Random) -> str:
+        log = []
+        for index in range(entries):
+            if rng.random() < 0.05:
+                log.append({"type": "vulnerable", "data": {
+                    "parameter": f"param{index % 50}", "dbms": rng.choice(["MySQL", "PostgreSQL", "Microsoft SQL Server"]),
+                    "title": "boolean-based blind - WHERE or HAVING clause",
+                    "data": {str(n): {"payload": f"id={index} AND {n}={n}", "title": "AND boolean-based blind"} for n in range(1, 4)},
+                }})
+            else:
+                log.append({"type": rng.choice(["info", "debug", "warning"]), "data": f"testing connection to the target URL ({index})"})
+        return json.dumps(log)
+    return json.loads(_corpus(f"sqlmap_{entries}.json", generate))
+
+def html_forms(forms: int = 500) -> str:
+    """ An HTML page with hundreds of forms of several inputs each. """
+    def generate(rng: random.Random) -> str:
+        out = ["<!DOCTYPE html><html><head><title>Forms</title></head><body>"]
+        for index in range(forms):
+            method = rng.choice(["get", "post"])
+            out.append(f'<div class="card"><h2>Form {index}</h2><form action="/submit/{index}" method="{method}">')
+            for field_index in range(rng.randint(2, 8)):
+                input_type = rng.choice(["text", "email", "password", "hidden", "checkbox", "search"])
+                out.append(f'<label>Field {field_index}<input type="{input_type}" name="f{index}_{field_index}" value="v{field_index}"></label>')
+            if rng.random() < 0.3:
+                out.append(f'<textarea name="comment{index}">Lorem ipsum dolor sit amet</textarea>')
+            out.append('<button type="submit">Send</button></form>' + "<p>" + "lorem ipsum " * rng.randint(5, 40) + "</p></div>")
+        out.append("</body></html>")
+        return "\n".join(out)
+    return _corpus(f"forms_{forms}.html", generate)
+
+def nikto_output(lines: int = 50_000) -> List[str]:
+    """ Noisy nikto output, as streamed to the live feed. """
+    def generate(rng: random.Random) -> str:
+        return "\n".join(
+            f"+ /{'/'.join(rng.choice(['cgi-bin', 'admin', 'docs', 'icons', 'test']) for _ in range(2))}{index}: "
+            f"{rng.choice(['Directory indexing found.', 'Retrieved x-powered-by header: PHP/7.4.3', 'Server may leak inodes via ETags.'])}"
+            for index in range(lines)
+        )
+    return _corpus(f"nikto_{lines}.txt", generate).splitlines()
+
+
+def scan_results(findings: int) -> List[Dict[str, Any]]:
+    """
+    Results of a synthetic scan with about `findings` findings in total, most
+    of them discovered paths, as the tool pipeline returns them.
+    """
+    rng = random.Random(f"scan_results_{findings}")
+    ports = sorted(rng.sample(range(1, 65536), min(200, max(1, findings // 50))))
+    nmap = {"host": "bench.local", "protocols": ["tcp"], "open_ports": ports}
+    for port in ports:
+        name, product, version, cpe = rng.choice(SERVICES)
+        nmap[f"port_{port}"] = {"state": "open", "name": name, "product": product, "version": version, "extrainfo": "", "cpe": cpe}
+    paths = [{"path": f"https://bench.local/{rng.choice(['admin', 'api', 'static', 'login'])}/{index}", "status": rng.choice([200, 301, 403])}
+             for index in range(max(0, findings - len(ports)))]
+    return [
+        {"tool_name": "nmap_scan", "findings": nmap},
+        {"tool_name": "ssl_scan", "findings": {"target": "bench.local", "sslv3_enabled": True, "supported_ciphers": CIPHERS,
+                                               "vulnerabilities": ["SSLv3 is enabled, which is insecure."]}},
+        {"tool_name": "header_analysis", "findings": {"url": "https://bench.local", "present_headers": {"Server": "nginx"},
+                                                      "missing_headers": ["Content-Security-Policy", "X-Frame-Options"], "recommendations": []}},
+        {"tool_name": "dir_discovery", "findings": {"discovered_paths": paths}},
+        {"tool_name": "xss_test", "findings": {"vulnerable": findings % 2 == 0, "vulnerable_points": []}},
+    ]
@@ -0,0 +1,154 @@
+import asyncio
+import gc
+import inspect
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+
+class SkipBenchmark(Exception):
+    """ Raised by a benchmark's setup when it can't run here (missing tool, no database...). """
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[], Callable[[], Any]]
+    rounds: int
+    # Optional absolute limit on the median time, checked even without a baseline
+    budget_seconds: Optional[float] = None
+    track_memory: bool = True
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    median_seconds: float
+    min_seconds: float
+    rounds: int
+    peak_bytes: Optional[int] = None
+    # Metrics the benchmark reports itself, e.g. rows per second or Redis ops
+    metrics: Dict[str, float] = field(default_factory=dict)
+    corpus: Optional[str] = None
+    budget_seconds: Optional[float] = None
+
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+def benchmark(name: str, rounds: int = 5, budget_seconds: Optional[float] = None, track_memory: bool = True):
+    """
+    Registers a benchmark. The decorated function does the setup (loading
+    corpora, building objects) and returns the callable to time; it may be a
+    coroutine function. If the callable returns a dict, its numbers are
+    reported as extra metrics.
+    """
+    def register(setup: Callable[[], Callable[[], Any]]):
+        BENCHMARKS[name] = Benchmark(name, setup, rounds, budget_seconds, track_memory)
+        return setup
+    return register
+
+
+def _runner(target: Callable[[], Any]) -> Callable[[], Any]:
+    if inspect.iscoroutinefunction(target):
+        loop = asyncio.new_event_loop()
+        runner = lambda: loop.run_until_complete(target())
+        runner.loop = loop
+        return runner
+    return target
+
+def run_benchmark(bench: Benchmark) -> BenchmarkResult:
+    """
+    Times `rounds` calls (after one warm-up call), then measures peak Python
+    heap usage of one more call with tracemalloc, untimed since tracing slows it down.
+    """
+    from benchmarks import corpora
+
+    corpora.used_digests.clear()
+    target = _runner(bench.setup())
+    try:
+        output = target()  # warm-up
+        timings = []
+        for _ in range(bench.rounds):
+            gc.collect()
+            started = time.perf_counter()
+            output = target()
+            timings.append(time.perf_counter() - started)
+
+        peak = None
+        if bench.track_memory:
+            gc.collect()
+            tracemalloc.start()
+            try:
+                before = tracemalloc.get_traced_memory()[0]
+                target()
+                peak = tracemalloc.get_traced_memory()[1] - before
+            finally:
+                tracemalloc.stop()
+    finally:
+        loop = getattr(target, "loop", None)
+        if loop is not None:
+            loop.close()
+
+    return BenchmarkResult(
+        name=bench.name,
+        median_seconds=statistics.median(timings),
+        min_seconds=min(timings),
+        rounds=bench.rounds,
+        peak_bytes=peak,
+        metrics={key: float(value) for key, value in output.items() if isinstance(value, (int, float))} if isinstance(output, dict) else {},
+        corpus=",".join(sorted(corpora.used_digests)) or None,
+        budget_seconds=bench.budget_seconds,
+    )
+
+
+def load_baselines(path: str = BASELINES_PATH) -> Dict[str, Dict[str, Any]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("results", {})
+
+def save_baselines(results: List[BenchmarkResult], path: str = BASELINES_PATH):
+    """
+    Merges the results into the baseline file, keeping baselines of benchmarks that weren't run.
+    """
+    baselines = load_baselines(path)
+    baselines.update({result.name: asdict(result) for result in results})
+    with open(path, "w") as f:
+        json.dump({"machine": platform.node(), "python": platform.python_version(), "results": baselines}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(result: BenchmarkResult, baseline: Optional[Dict[str, Any]], time_tolerance: float, memory_tolerance: float) -> List[str]:
+    """
+    Regressions of a result against its baseline and budget, as messages.
+    """
+    problems = []
+    if result.budget_seconds is not None and result.median_seconds > result.budget_seconds:
+        problems.append(f"{result.median_seconds:.3f}s is over the {result.budget_seconds:.3f}s budget")
+    if baseline is None:
+        return problems
+    if baseline.get("corpus") != result.corpus:
+        # Generated from different corpora; the numbers aren't comparable
+        return problems + ["corpus changed since the baseline was recorded; re-record it"]
+    if result.median_seconds > baseline["median_seconds"] * time_tolerance:
+        problems.append(f"time {result.median_seconds:.4f}s vs baseline {baseline['median_seconds']:.4f}s")
+    if result.peak_bytes and baseline.get("peak_bytes") and result.peak_bytes > baseline["peak_bytes"] * memory_tolerance:
+        problems.append(f"peak memory {result.peak_bytes / 1e6:.1f} MB vs baseline {baseline['peak_bytes'] / 1e6:.1f} MB")
+    return problems
+
+def format_result(result: BenchmarkResult, baseline: Optional[Dict[str, Any]]) -> str:
+    line = f"{result.name:<40} {result.median_seconds * 1000:>10.2f} ms (min {result.min_seconds * 1000:.2f})"
+    if baseline is not None:
+        line += f" {result.median_seconds / baseline['median_seconds']:>6.2f}x"
+    if result.peak_bytes is not None:
+        line += f"  peak {result.peak_bytes / 1e6:.1f} MB"
+    for key, value in result.metrics.items():
+        line += f"  {key}={value:,.0f}" if value >= 100 else f"  {key}={value:.3g}"
+    return line
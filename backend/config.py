@@ -22,6 +22,8 @@ class Settings:
         f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@"
         f"{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
     )
+    # Bulk inserts of at least this many rows use COPY instead of multi-row INSERTs (0 disables COPY)
+    DB_BULK_COPY_THRESHOLD: int = int(os.getenv("DB_BULK_COPY_THRESHOLD", 1000))
 
     # Redis Configuration
     REDIS_HOST: str = os.getenv("REDIS_HOST", "redis")
@@ -29,6 +31,53 @@ class Settings:
     REDIS_DB: int = int(os.getenv("REDIS_DB", 0))
     REDIS_URL: str = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
 
+    # Rate limits (token buckets per client IP, shared through Redis)
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    # Reverse proxies (comma-separated IPs) whose X-Forwarded-For gives the client IP; "*" trusts any peer
+    FORWARDED_ALLOW_IPS: str = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+    # Refuse clients that are certainly over a limit without asking Redis
+    RATE_LIMIT_LOCAL_PREFILTER: bool = os.getenv("RATE_LIMIT_LOCAL_PREFILTER", "true").lower() == "true"
+    RATE_LIMIT_LOCAL_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_LOCAL_MAX_KEYS", 10000))
+    RATE_LIMIT_SCAN_SUBMIT_CAPACITY: int = int(os.getenv("RATE_LIMIT_SCAN_SUBMIT_CAPACITY", 10))
+    RATE_LIMIT_SCAN_SUBMIT_REFILL: float = float(os.getenv("RATE_LIMIT_SCAN_SUBMIT_REFILL", 0.2))  # tokens per second
+    RATE_LIMIT_DOWNLOAD_CAPACITY: int = int(os.getenv("RATE_LIMIT_DOWNLOAD_CAPACITY", 60))
+    RATE_LIMIT_DOWNLOAD_REFILL: float = float(os.getenv("RATE_LIMIT_DOWNLOAD_REFILL", 1.0))
+
+    # Worker registry: each worker's capabilities expire unless refreshed by its heartbeat
+    WORKER_HEARTBEAT_INTERVAL: float = float(os.getenv("WORKER_HEARTBEAT_INTERVAL", 10.0))
+    WORKER_HEARTBEAT_TTL: int = int(os.getenv("WORKER_HEARTBEAT_TTL", 30))
+
+    # Prometheus metrics of each worker: on its own port (0: off) and/or as <dir>/cybersentinel_worker_<id>.prom
+    WORKER_METRICS_PORT: int = int(os.getenv("WORKER_METRICS_PORT", 9101))
+    WORKER_METRICS_TEXTFILE_DIR: str = os.getenv("WORKER_METRICS_TEXTFILE_DIR", "")
+    WORKER_METRICS_TEXTFILE_INTERVAL: float = float(os.getenv("WORKER_METRICS_TEXTFILE_INTERVAL", 15.0))
+
+    # Per-target governor: adapts concurrent requests and requests/s per target host (AIMD)
+    GOVERNOR_ENABLED: bool = os.getenv("GOVERNOR_ENABLED", "true").lower() == "true"
+    GOVERNOR_INITIAL_CONCURRENCY: int = int(os.getenv("GOVERNOR_INITIAL_CONCURRENCY", 4))
+    GOVERNOR_MIN_CONCURRENCY: int = int(os.getenv("GOVERNOR_MIN_CONCURRENCY", 1))
+    GOVERNOR_MAX_CONCURRENCY: int = int(os.getenv("GOVERNOR_MAX_CONCURRENCY", 16))
+    GOVERNOR_INITIAL_RATE: float = float(os.getenv("GOVERNOR_INITIAL_RATE", 10.0))  # requests per second
+    GOVERNOR_MIN_RATE: float = float(os.getenv("GOVERNOR_MIN_RATE", 0.5))
+    GOVERNOR_MAX_RATE: float = float(os.getenv("GOVERNOR_MAX_RATE", 50.0))
+    GOVERNOR_RATE_STEP: float = float(os.getenv("GOVERNOR_RATE_STEP", 1.0))
+    GOVERNOR_DECREASE_FACTOR: float = float(os.getenv("GOVERNOR_DECREASE_FACTOR", 0.5))
+    GOVERNOR_DECREASE_INTERVAL: float = float(os.getenv("GOVERNOR_DECREASE_INTERVAL", 1.0))  # seconds
+    GOVERNOR_LATENCY_TARGET: float = float(os.getenv("GOVERNOR_LATENCY_TARGET", 2.0))  # slower responses count as congestion
+    GOVERNOR_REQUEST_LEASE_TTL: float = float(os.getenv("GOVERNOR_REQUEST_LEASE_TTL", 60.0))
+    GOVERNOR_LEASE_TTL: float = float(os.getenv("GOVERNOR_LEASE_TTL", 60.0))  # renewed while a tool runs
+    GOVERNOR_ACQUIRE_TIMEOUT: float = float(os.getenv("GOVERNOR_ACQUIRE_TIMEOUT", 300.0))
+    GOVERNOR_POLL_INTERVAL: float = float(os.getenv("GOVERNOR_POLL_INTERVAL", 0.5))
+    GOVERNOR_STATE_TTL: int = int(os.getenv("GOVERNOR_STATE_TTL", 3600))
+    GOVERNOR_RESOLVE_TTL: float = float(os.getenv("GOVERNOR_RESOLVE_TTL", 300.0))  # hosts are keyed by their resolved address
+
+    # Tool run coalescing (share identical nmap/sslscan runs between scans)
+    TOOL_COALESCE_ENABLED: bool = os.getenv("TOOL_COALESCE_ENABLED", "true").lower() == "true"
+    # Seconds a finished run is also reused by scans that arrive after it (0: only scans that waited on it)
+    TOOL_COALESCE_RESULT_TTL: int = int(os.getenv("TOOL_COALESCE_RESULT_TTL", 0))
+    TOOL_COALESCE_LOCK_TTL: int = int(os.getenv("TOOL_COALESCE_LOCK_TTL", 3600))
+    TOOL_COALESCE_POLL_INTERVAL: float = float(os.getenv("TOOL_COALESCE_POLL_INTERVAL", 2.0))
+
     # API Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "a_very_secret_key")
     ALGORITHM: str = "HS256"
@@ -39,6 +88,10 @@ class Settings:
 
     # Logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text").lower() # Console output: "text" or "json"
+    LOG_LIVE_FEED_BATCH_SIZE: int = int(os.getenv("LOG_LIVE_FEED_BATCH_SIZE", 100))
+    LOG_LIVE_FEED_FLUSH_INTERVAL: float = float(os.getenv("LOG_LIVE_FEED_FLUSH_INTERVAL", 0.2))
+    LOG_LIVE_FEED_RETRY_INTERVAL: float = float(os.getenv("LOG_LIVE_FEED_RETRY_INTERVAL", 5.0))
 
     # Tool paths (assuming they are in the system's PATH)
     NMAP_PATH: str = os.getenv("NMAP_PATH", "nmap")
@@ -51,6 +104,54 @@ class Settings:
     SQLMAP_PATH: str = os.getenv("SQLMAP_PATH", "sqlmap")
     XSSER_PATH: str = os.getenv("XSSER_PATH", "xsser")
     
+    # Streaming command runner limits
+    COMMAND_MAX_OUTPUT_BYTES: int = int(os.getenv("COMMAND_MAX_OUTPUT_BYTES", 256 * 1024 * 1024))
+    COMMAND_TAIL_LINES: int = int(os.getenv("COMMAND_TAIL_LINES", 200))
+    COMMAND_READ_CHUNK_BYTES: int = int(os.getenv("COMMAND_READ_CHUNK_BYTES", 64 * 1024))
+    SSLSCAN_TIMEOUT: int = int(os.getenv("SSLSCAN_TIMEOUT", 600))
+    DIRSEARCH_TIMEOUT: int = int(os.getenv("DIRSEARCH_TIMEOUT", 1800))
+    NIKTO_TIMEOUT: int = int(os.getenv("NIKTO_TIMEOUT", 1800))
+
+    # Live output frames published by noisy CLI tools
+    LIVE_OUTPUT_FLUSH_INTERVAL: float = float(os.getenv("LIVE_OUTPUT_FLUSH_INTERVAL", 0.25))
+    LIVE_OUTPUT_MAX_FRAME_LINES: int = int(os.getenv("LIVE_OUTPUT_MAX_FRAME_LINES", 200))
+    LIVE_OUTPUT_MAX_FRAME_BYTES: int = int(os.getenv("LIVE_OUTPUT_MAX_FRAME_BYTES", 64 * 1024))
+    LIVE_OUTPUT_MAX_LINES_PER_SECOND: int = int(os.getenv("LIVE_OUTPUT_MAX_LINES_PER_SECOND", 500))
+    LIVE_OUTPUT_SUBSCRIBER_CHECK_INTERVAL: float = float(os.getenv("LIVE_OUTPUT_SUBSCRIBER_CHECK_INTERVAL", 2.0))
+    LIVE_OUTPUT_CLIENT_QUEUE_SIZE: int = int(os.getenv("LIVE_OUTPUT_CLIENT_QUEUE_SIZE", 1000))
+    LIVE_OUTPUT_VIEWER_TTL: int = int(os.getenv("LIVE_OUTPUT_VIEWER_TTL", 30))
+    # Durable per-scan output log (Redis Stream), replayed to late viewers
+    LIVE_OUTPUT_LOG_MAXLEN: int = int(os.getenv("LIVE_OUTPUT_LOG_MAXLEN", 20000))
+    LIVE_OUTPUT_LOG_RETENTION: int = int(os.getenv("LIVE_OUTPUT_LOG_RETENTION", 7 * 24 * 3600))
+    LIVE_OUTPUT_REPLAY_PAGE_SIZE: int = int(os.getenv("LIVE_OUTPUT_REPLAY_PAGE_SIZE", 500))
+    NIKTO_MAX_ITEMS: int = int(os.getenv("NIKTO_MAX_ITEMS", 1000))
+
+    # Per-tool resource accounting
+    TOOL_USAGE_SAMPLE_INTERVAL: float = float(os.getenv("TOOL_USAGE_SAMPLE_INTERVAL", 0.5))
+
+    # Local storage for scan artifacts (raw tool output, etc.)
+    DATA_DIR: str = os.getenv("DATA_DIR", "/var/lib/cybersentinel")
+    SCAN_ARTIFACT_DIR: str = os.getenv("SCAN_ARTIFACT_DIR", os.path.join(DATA_DIR, "scan_output"))
+    # Offline CVE index (SQLite), built with `python main.py ingest-cve-feed` and shared read-only by workers
+    CVE_INDEX_PATH: str = os.getenv("CVE_INDEX_PATH", os.path.join(DATA_DIR, "cve_index.sqlite3"))
+
+    # Content-addressed report storage
+    REPORT_STORE_BACKEND: str = os.getenv("REPORT_STORE_BACKEND", "local")
+    REPORT_STORE_DIR: str = os.getenv("REPORT_STORE_DIR", os.path.join(DATA_DIR, "reports"))
+    # Data reports written for every scan in addition to "json" (e.g. "ndjson"), and their compression ("gzip", "zstd" or "none")
+    REPORT_EXPORT_FORMATS: list[str] = [f.strip() for f in os.getenv("REPORT_EXPORT_FORMATS", "json").split(",") if f.strip()]
+    REPORT_COMPRESSION: str = os.getenv("REPORT_COMPRESSION", "gzip").lower()
+
+    # PDF reports are rendered on first download in a dedicated process pool
+    REPORT_PDF_PRERENDER: bool = os.getenv("REPORT_PDF_PRERENDER", "false").lower() == "true"
+    PDF_RENDER_WORKERS: int = int(os.getenv("PDF_RENDER_WORKERS", 2))
+    PDF_RENDER_MAX_PENDING: int = int(os.getenv("PDF_RENDER_MAX_PENDING", 16))
+    PDF_RENDER_MAX_TASKS_PER_CHILD: int = int(os.getenv("PDF_RENDER_MAX_TASKS_PER_CHILD", 50))
+    # Caps that keep PDFs of very large scans renderable
+    PDF_SECTION_MAX_ITEMS: int = int(os.getenv("PDF_SECTION_MAX_ITEMS", 200))
+    PDF_APPENDIX_MAX_ITEMS: int = int(os.getenv("PDF_APPENDIX_MAX_ITEMS", 10000))
+    PDF_MAX_VALUE_CHARS: int = int(os.getenv("PDF_MAX_VALUE_CHARS", 2000))
+
     # Wordlists
     DIRSEARCH_DEFAULT_WORDLIST: str = os.getenv("DIRSEARCH_DEFAULT_WORDLIST", "/usr/share/wordlists/dirb/common.txt")
 
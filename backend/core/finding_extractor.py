@@ -0,0 +1,161 @@
+import hashlib
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from schemas import Finding
+
+# Longest `detail` stored; keeps entries well inside the btree index row limit
+MAX_DETAIL_LENGTH = 512
+
+VULN_ANALYSIS_PATTERN = re.compile(r"Port (\d+) \((.*) (\S+)\): (.*)")
+
+WEAK_PROTOCOL_SEVERITY = {
+    "sslv2_enabled": ("SSLv2", "high"),
+    "sslv3_enabled": ("SSLv3", "high"),
+    "tlsv1_0_enabled": ("TLSv1.0", "medium"),
+    "tlsv1_1_enabled": ("TLSv1.1", "medium"),
+}
+
+
+def _host_and_port(target: str) -> Tuple[str, Optional[int]]:
+    """
+    Splits a URL, host:port or bare host into a lowercase host and an optional port.
+    """
+    parsed = urlparse(target if "://" in target else f"//{target}")
+    try:
+        port = parsed.port
+    except ValueError:
+        port = None
+    if port is None and parsed.scheme in ("http", "https"):
+        port = 443 if parsed.scheme == "https" else 80
+    return (parsed.hostname or target).lower(), port
+
+
+class FindingExtractor:
+    """
+    Turns a tool's raw findings into typed Finding rows.
+
+    The raw JSON stays on the ScanResult; the rows are a queryable projection of
+    it, one per open port, weak protocol, missing header, injectable parameter
+    and so on. Tools without an extractor produce no rows.
+    """
+    def __init__(self, scan_id: str, target: str):
+        self.scan_id = scan_id
+        self.target = target
+        self.extractors: Dict[str, Callable[[Dict[str, Any]], None]] = {
+            "nmap_scan": self._extract_nmap,
+            "ssl_scan": self._extract_ssl,
+            "header_analysis": self._extract_headers,
+            "vulnerability_analysis": self._extract_vuln_analysis,
+            "sql_injection_test": self._extract_sql_test,
+            "xss_test": self._extract_xss_test,
+            "dir_discovery": self._extract_dir_discovery,
+            "nikto_scan": self._extract_nikto,
+            "sqlmap_scan": self._extract_sqlmap,
+            "xsser_scan": self._extract_xsser,
+        }
+        self._tool_name = ""
+        self._rows: List[Finding] = []
+
+    def extract(self, tool_name: str, findings: Dict[str, Any]) -> List[Finding]:
+        extractor = self.extractors.get(tool_name)
+        if extractor is None or not isinstance(findings, dict):
+            return []
+        self._tool_name = tool_name
+        self._rows = []
+        extractor(findings)
+        return self._rows
+
+    def _add(self, kind: str, severity: str, host: str, port: Optional[int] = None, detail: Optional[str] = None,
+             service: Optional[str] = None, product: Optional[str] = None, version: Optional[str] = None):
+        if detail is not None:
+            detail = str(detail)[:MAX_DETAIL_LENGTH]
+        evidence = json.dumps([kind, host, port, detail, service, product, version], separators=(",", ":"))
+        self._rows.append(Finding(
+            scan_id=self.scan_id,
+            tool_name=self._tool_name,
+            kind=kind,
+            host=host,
+            port=port,
+            service=service or None,
+            product=product or None,
+            version=version or None,
+            severity=severity,
+            detail=detail,
+            evidence_hash=hashlib.sha256(evidence.encode("utf-8")).hexdigest(),
+        ))
+
+    def _extract_nmap(self, findings: Dict[str, Any]):
+        host, _ = _host_and_port(findings.get("host") or self.target)
+        for port in findings.get("open_ports", []):
+            service = findings.get(f"port_{port}", {})
+            self._add(
+                "open_port", "info", host, port=int(port), detail=service.get("cpe") or None,
+                service=service.get("name"), product=service.get("product"), version=service.get("version"),
+            )
+
+    def _extract_ssl(self, findings: Dict[str, Any]):
+        host, port = _host_and_port(findings.get("target") or self.target)
+        port = port or 443
+        for flag, (protocol, severity) in WEAK_PROTOCOL_SEVERITY.items():
+            if findings.get(flag):
+                self._add("weak_protocol", severity, host, port=port, detail=protocol)
+        if findings.get("heartbleed_vulnerable"):
+            self._add("heartbleed", "critical", host, port=port)
+
+    def _extract_headers(self, findings: Dict[str, Any]):
+        host, port = _host_and_port(findings.get("url") or self.target)
+        for header in findings.get("missing_headers", []):
+            self._add("missing_header", "low", host, port=port, detail=header)
+
+    def _extract_vuln_analysis(self, findings: Dict[str, Any]):
+        host, _ = _host_and_port(self.target)
+        for entry in findings.get("vulnerabilities_found", []):
+            match = VULN_ANALYSIS_PATTERN.match(entry)
+            if match:
+                self._add("vulnerable_service", "high", host, port=int(match.group(1)), detail=match.group(4),
+                          product=match.group(2), version=match.group(3))
+            else:
+                self._add("vulnerable_service", "high", host, detail=entry)
+
+    def _extract_sql_test(self, findings: Dict[str, Any]):
+        host, port = _host_and_port(self.target)
+        for form in findings.get("vulnerable_forms", []):
+            self._add("sql_injection", "high", host, port=port, detail=form.get("action"))
+
+    def _extract_xss_test(self, findings: Dict[str, Any]):
+        host, port = _host_and_port(self.target)
+        for point in findings.get("vulnerable_points", []):
+            self._add("xss", "medium", host, port=port, detail=point.get("action") or point.get("location"))
+
+    def _extract_dir_discovery(self, findings: Dict[str, Any]):
+        host, port = _host_and_port(self.target)
+        for entry in findings.get("discovered_paths", []):
+            path = entry.get("path") if isinstance(entry, dict) else entry
+            self._add("discovered_path", "info", host, port=port, detail=path)
+
+    def _extract_nikto(self, findings: Dict[str, Any]):
+        host, port = _host_and_port(self.target)
+        for item in findings.get("items", []):
+            self._add("nikto_item", "info", host, port=port, detail=item)
+
+    def _extract_sqlmap(self, findings: Dict[str, Any]):
+        host, port = _host_and_port(self.target)
+        for vulnerability in findings.get("vulnerabilities", []):
+            self._add("sql_injection", "high", host, port=port, detail=vulnerability.get("parameter"),
+                      service=vulnerability.get("dbms"))
+
+    def _extract_xsser(self, findings: Dict[str, Any]):
+        host, port = _host_and_port(self.target)
+        for vulnerability in findings.get("vulnerabilities", []):
+            self._add("xss", "medium", host, port=port,
+                      detail=vulnerability.get("payload") or vulnerability.get("details"))
+
+
+def extract_findings(scan_id: str, target: str, tool_name: str, findings: Dict[str, Any]) -> List[Finding]:
+    """
+    High-level function to extract typed Finding rows from one tool's findings.
+    """
+    return FindingExtractor(scan_id, target).extract(tool_name, findings)
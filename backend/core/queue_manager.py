@@ -1,5 +1,6 @@
 import json
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, Iterable, List, Optional, Set
 import redis.asyncio as redis
 from utils.helpers import to_json
 from utils.logger import logger
@@ -12,6 +13,8 @@ class TaskQueue:
         self.db = db
         self.redis_client = None
         self.queue_name = "scan_queue"
+        # Route keys (sorted, comma-separated tool names) that have their own queue
+        self.routes_key = "scan_queue:routes"
 
     async def connect(self):
         """
@@ -25,31 +28,55 @@ class TaskQueue:
             logger.error(f"Failed to connect to Redis: {type(e).__name__}: {e}")
             self.redis_client = None # Ensure it's None on failure
 
-    async def enqueue_task(self, task: Dict[str, Any]):
+    def route_queue(self, route: str) -> str:
+        return f"{self.queue_name}:{route}" if route else self.queue_name
+
+    async def enqueue_task(self, task: Dict[str, Any], route: Iterable[str] = ()):
         """
-        Adds a task to the queue.
+        Adds a task to the queue. A task with a route (the tools it needs, see
+        core.worker_registry) goes to a queue only workers with those tools consume.
         """
         if not self.redis_client:
             logger.error("Attempted to enqueue task but Redis client is not connected.")
             return
         try:
-            await self.redis_client.lpush(self.queue_name, to_json(task))
-            logger.info(f"Enqueued task: {task['scan_id']}")
+            route_key = ",".join(sorted(route))
+            # For the queue wait metric of the worker that takes it
+            task = {**task, "enqueued_at": time.time()}
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                if route_key:
+                    pipe.sadd(self.routes_key, route_key)
+                pipe.lpush(self.route_queue(route_key), to_json(task))
+                await pipe.execute()
+            logger.info(f"Enqueued task: {task['scan_id']}" + (f" (needs {route_key})" if route_key else ""))
         except Exception as e:
             logger.error(f"Failed to enqueue task: {type(e).__name__}: {e}")
 
-    async def dequeue_task(self) -> Optional[Dict[str, Any]]:
+    async def _runnable_queues(self, tools: Optional[Set[str]]) -> List[str]:
+        """
+        Queues a worker with these tools can consume, the most demanding routes
+        first so tasks only this worker can run aren't left behind.
         """
-        Removes and returns a task from the queue.
-        Returns None if the queue is empty.
+        if tools is None:
+            return [self.queue_name]
+        routes = [route.split(",") for route in await self.redis_client.smembers(self.routes_key)]
+        runnable = sorted((route for route in routes if set(route) <= tools), key=lambda route: (-len(route), route))
+        return [self.route_queue(",".join(route)) for route in runnable] + [self.queue_name]
+
+    async def dequeue_task(self, tools: Optional[Set[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Removes and returns a task from the queue, only from routes whose tools
+        are all in `tools` if given. Returns None if there is nothing to run.
         """
         if not self.redis_client:
             logger.error("Attempted to dequeue task but Redis client is not connected.")
             return None
         try:
-            task_json = await self.redis_client.rpop(self.queue_name)
-            if task_json:
-                task = json.loads(task_json)
+            queues = await self._runnable_queues(tools)
+            # LMPOP takes from the first non-empty queue, in order, atomically
+            popped = await self.redis_client.lmpop(len(queues), *queues, direction="RIGHT")
+            if popped:
+                task = json.loads(popped[1][0])
                 logger.info(f"Dequeued task: {task['scan_id']}")
                 return task
             return None
@@ -57,18 +84,29 @@ class TaskQueue:
             logger.error(f"Failed to dequeue task: {type(e).__name__}: {e}")
             return None
 
-    async def get_queue_size(self) -> int:
+    async def get_queue_sizes(self) -> Dict[str, int]:
         """
-        Gets the current size of the queue.
+        Gets the current size of each queue: the default one and one per route.
         """
         if not self.redis_client:
             logger.error("Attempted to get queue size but Redis client is not connected.")
-            return 0
+            return {}
         try:
-            return await self.redis_client.llen(self.queue_name)
+            routes = await self.redis_client.smembers(self.routes_key)
+            queues = [self.queue_name] + [self.route_queue(route) for route in sorted(routes)]
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for queue in queues:
+                    pipe.llen(queue)
+                return dict(zip(queues, await pipe.execute()))
         except Exception as e:
             logger.error(f"Failed to get queue size: {type(e).__name__}: {e}")
-            return 0
+            return {}
+
+    async def get_queue_size(self) -> int:
+        """
+        Gets the current size of the queue, across all routes.
+        """
+        return sum((await self.get_queue_sizes()).values())
 
 # Global queue instance
 task_queue: Optional[TaskQueue] = None
@@ -0,0 +1,150 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Risk rules as data, by version. A scan's score is the sum of `weight * feature`
+# over the rules for its tools, clamped to 0-100; the severity is the highest
+# threshold it reaches (Low below all of them). Changing a weight means adding a
+# new version, so every stored score can name the rules that produced it and the
+# history can be re-scored (see worker.rescore_scans).
+#
+# Features:
+#   count: number of entries in the list `field`
+#   flag: 1 if `field` is truthy
+#   any_of: 1 if the list `field` contains any of `values`
+#   present_without: 1 if the list `field` contains `present` but not `absent`
+#   any_contains: 1 if an entry of the list `field` (or its `key`, for dict entries)
+#       contains any of the substrings `values`
+_ORIGINAL_RULES: List[Dict[str, Any]] = [
+    {"tool": "nmap_scan", "feature": "any_of", "field": "open_ports", "values": [21, 22, 23, 25, 110, 139, 445], "weight": 15},
+    {"tool": "nmap_scan", "feature": "present_without", "field": "open_ports", "present": 80, "absent": 443, "weight": 10},  # HTTP without HTTPS
+    {"tool": "nmap_scan", "feature": "count", "field": "open_ports", "weight": 1},
+    {"tool": "ssl_scan", "feature": "count", "field": "vulnerabilities", "weight": 20},
+    {"tool": "header_analysis", "feature": "count", "field": "missing_headers", "weight": 5},
+    {"tool": "sql_injection_test", "feature": "flag", "field": "vulnerable", "weight": 80},
+    {"tool": "xss_test", "feature": "flag", "field": "vulnerable", "weight": 60},
+]
+
+RISK_RULES: Dict[int, Dict[str, Any]] = {
+    # The original hard-coded engine. Its dir_discovery check compared the
+    # discovered path dicts as strings and never matched, so it has no rule here.
+    1: {
+        "severity_thresholds": {"Medium": 31, "High": 61, "Critical": 81},
+        "rules": _ORIGINAL_RULES,
+    },
+    2: {
+        "severity_thresholds": {"Medium": 31, "High": 61, "Critical": 81},
+        "rules": [
+            *_ORIGINAL_RULES,
+            {"tool": "dir_discovery", "feature": "any_contains", "field": "discovered_paths", "key": "path",
+             "values": ["/admin", "/login", "/.git", "/.env"], "weight": 25},
+        ],
+    },
+}
+
+CURRENT_RISK_RULES_VERSION = max(RISK_RULES)
+
+
+def _entries(findings: Dict[str, Any], field: str) -> list:
+    value = findings.get(field)
+    return value if isinstance(value, list) else []
+
+def _compile_feature(rule: Dict[str, Any]) -> Callable[[Dict[str, Any]], int]:
+    field = rule["field"]
+    feature = rule["feature"]
+    if feature == "count":
+        return lambda findings: len(_entries(findings, field))
+    if feature == "flag":
+        return lambda findings: int(bool(findings.get(field)))
+    if feature == "any_of":
+        values = frozenset(rule["values"])
+        return lambda findings: int(not values.isdisjoint(_entries(findings, field)))
+    if feature == "present_without":
+        present, absent = rule["present"], rule["absent"]
+        return lambda findings: int(present in _entries(findings, field) and absent not in _entries(findings, field))
+    if feature == "any_contains":
+        values, key = tuple(rule["values"]), rule.get("key")
+
+        def any_contains(findings: Dict[str, Any]) -> int:
+            for entry in _entries(findings, field):
+                text = entry.get(key, "") if isinstance(entry, dict) else entry
+                if isinstance(text, str) and any(value in text for value in values):
+                    return 1
+            return 0
+        return any_contains
+    raise ValueError(f"Unknown risk rule feature '{feature}'.")
+
+
+class CompiledRiskRules:
+    """
+    One version of the risk rules, compiled for scoring batches of results.
+
+    Each result becomes a row of feature values (one column per rule); scores
+    are then computed for the whole batch at once as a matrix-vector product,
+    summed per scan with a bincount and mapped to severities with a sorted
+    search over the thresholds.
+    """
+    def __init__(self, version: int):
+        if version not in RISK_RULES:
+            raise ValueError(f"Unknown risk rules version {version}. Known: {', '.join(map(str, sorted(RISK_RULES)))}.")
+        definition = RISK_RULES[version]
+        self.version = version
+        self.weights = np.array([rule["weight"] for rule in definition["rules"]], dtype=np.int64)
+        # tool name -> [(column, feature)]
+        self.features: Dict[str, List[Tuple[int, Callable[[Dict[str, Any]], int]]]] = {}
+        for column, rule in enumerate(definition["rules"]):
+            self.features.setdefault(rule["tool"], []).append((column, _compile_feature(rule)))
+        thresholds = sorted(definition["severity_thresholds"].items(), key=lambda item: item[1])
+        self.severity_bounds = np.array([bound for _, bound in thresholds], dtype=np.int64)
+        self.severity_names = np.array(["Low", *[name for name, _ in thresholds]])
+
+    def feature_matrix(self, results: Sequence[Tuple[str, Any]]) -> np.ndarray:
+        """
+        Feature values of (tool name, findings) pairs, one row per result.
+        """
+        matrix = np.zeros((len(results), len(self.weights)), dtype=np.int64)
+        for row, (tool_name, findings) in enumerate(results):
+            if not isinstance(findings, dict):
+                continue
+            for column, feature in self.features.get(tool_name, ()):
+                matrix[row, column] = feature(findings)
+        return matrix
+
+    def score_results(self, results: Sequence[Tuple[str, Any]]) -> np.ndarray:
+        """
+        The risk contributed by each (tool name, findings) pair.
+        """
+        if not results:
+            return np.zeros(0, dtype=np.int64)
+        return self.feature_matrix(results) @ self.weights
+
+    def severities(self, totals: np.ndarray) -> np.ndarray:
+        return self.severity_names[np.searchsorted(self.severity_bounds, totals, side="right")]
+
+    def score_scans(self, scan_ids: Sequence[str], results: Iterable[Tuple[str, str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores many scans at once from their (scan ID, tool name, findings) rows.
+        Returns the clamped scores and the severities, in the order of `scan_ids`.
+        """
+        positions = {scan_id: position for position, scan_id in enumerate(scan_ids)}
+        scan_index, pairs = [], []
+        for scan_id, tool_name, findings in results:
+            scan_index.append(positions[scan_id])
+            pairs.append((tool_name, findings))
+        totals = np.bincount(
+            np.array(scan_index, dtype=np.int64), weights=self.score_results(pairs), minlength=len(scan_ids),
+        ).astype(np.int64)
+        totals = np.clip(totals, 0, 100)
+        return totals, self.severities(totals)
+
+
+_compiled_rules: Dict[int, CompiledRiskRules] = {}
+
+def get_risk_rules(version: Optional[int] = None) -> CompiledRiskRules:
+    """
+    Returns the compiled rules of a version, the current one by default.
+    """
+    version = CURRENT_RISK_RULES_VERSION if version is None else version
+    if version not in _compiled_rules:
+        _compiled_rules[version] = CompiledRiskRules(version)
+    return _compiled_rules[version]
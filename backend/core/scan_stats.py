@@ -0,0 +1,183 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from schemas import Scan, ScanStatsCounter, ScanDailyRollup, TargetRiskRollup, DashboardStats, DailyScanCounts
+from utils.logger import logger
+
+FINISHED_STATUSES = ("completed", "failed")
+
+# Recomputes every rollup from the scan table. The rollup tables are locked so
+# concurrent state changes wait and are applied on top of the rebuilt values.
+REBUILD_STATEMENTS: List[str] = [
+    "LOCK TABLE scanstatscounter, scandailyrollup, targetriskrollup IN EXCLUSIVE MODE",
+    "DELETE FROM scanstatscounter",
+    "DELETE FROM scandailyrollup",
+    "DELETE FROM targetriskrollup",
+    """
+    INSERT INTO scanstatscounter (metric, key, value)
+    SELECT 'status', status, count(*) FROM scan GROUP BY status
+    UNION ALL
+    SELECT 'severity', severity, count(*) FROM scan WHERE severity IS NOT NULL GROUP BY severity
+    """,
+    """
+    INSERT INTO scandailyrollup (day, created, completed, failed)
+    SELECT day, sum(created), sum(completed), sum(failed) FROM (
+        SELECT created_at::date AS day, 1 AS created, 0 AS completed, 0 AS failed FROM scan
+        UNION ALL
+        SELECT finished_at::date, 0, (status = 'completed')::int, (status = 'failed')::int FROM scan
+        WHERE finished_at IS NOT NULL AND status IN ('completed', 'failed')
+    ) AS events
+    GROUP BY day
+    """,
+    """
+    INSERT INTO targetriskrollup (target, scans, last_risk_score, last_severity, max_risk_score, last_scan_at)
+    SELECT DISTINCT ON (target)
+        target, count(*) OVER per_target, risk_score, severity, max(risk_score) OVER per_target,
+        coalesce(finished_at, created_at)
+    FROM scan
+    WHERE risk_score IS NOT NULL
+    WINDOW per_target AS (PARTITION BY target)
+    ORDER BY target, coalesce(finished_at, created_at) DESC, id DESC
+    """,
+]
+
+
+async def _bump_counters(session: AsyncSession, deltas: Dict[Tuple[str, str], int]):
+    # Always in key order, so concurrent transactions lock counter rows in the same order
+    for (metric, key), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        statement = insert(ScanStatsCounter).values(metric=metric, key=key, value=delta)
+        await session.execute(statement.on_conflict_do_update(
+            index_elements=["metric", "key"],
+            set_={"value": ScanStatsCounter.value + delta},
+        ))
+
+async def _bump_day(session: AsyncSession, day: date, **deltas: int):
+    statement = insert(ScanDailyRollup).values(day=day, **{name: deltas.get(name, 0) for name in ("created", "completed", "failed")})
+    await session.execute(statement.on_conflict_do_update(
+        index_elements=["day"],
+        set_={name: getattr(ScanDailyRollup, name) + delta for name, delta in deltas.items()},
+    ))
+
+async def record_scan_created(session: AsyncSession, scan: Scan):
+    """
+    Counts a new scan. Call it in the transaction that inserts the scan.
+    """
+    await _bump_counters(session, {("status", scan.status): 1})
+    await _bump_day(session, scan.created_at.date(), created=1)
+
+async def set_scan_status(session: AsyncSession, scan: Scan, status: str):
+    """
+    Changes a scan's status and moves it between the status counters in the same transaction.
+    """
+    if scan.status == status:
+        return
+    await _bump_counters(session, {("status", scan.status): -1, ("status", status): 1})
+    if status == "in_progress":
+        scan.started_at = scan.started_at or datetime.utcnow()
+    if status in FINISHED_STATUSES:
+        scan.finished_at = scan.finished_at or datetime.utcnow()
+        await _bump_day(session, scan.finished_at.date(), **{status: 1})
+    scan.status = status
+    session.add(scan)
+
+async def record_scan_risk(session: AsyncSession, scan: Scan, risk_score: int, severity: str):
+    """
+    Stores a scan's risk on its row and updates the severity distribution and the target's risk.
+    """
+    deltas = {("severity", severity): 1}
+    if scan.severity is not None:
+        # Re-scored: move the scan out of its previous severity
+        deltas[("severity", scan.severity)] = deltas.get(("severity", scan.severity), 0) - 1
+    await _bump_counters(session, deltas)
+
+    scored_at = scan.finished_at or datetime.utcnow()
+    statement = insert(TargetRiskRollup).values(
+        target=scan.target,
+        scans=0 if scan.risk_score is not None else 1,
+        last_risk_score=risk_score,
+        last_severity=severity,
+        max_risk_score=risk_score,
+        last_scan_at=scored_at,
+    )
+    newer = statement.excluded.last_scan_at >= TargetRiskRollup.last_scan_at
+    await session.execute(statement.on_conflict_do_update(
+        index_elements=["target"],
+        set_={
+            "scans": TargetRiskRollup.scans + statement.excluded.scans,
+            # An older scan being re-scored doesn't replace the target's current risk
+            "last_risk_score": case((newer, statement.excluded.last_risk_score), else_=TargetRiskRollup.last_risk_score),
+            "last_severity": case((newer, statement.excluded.last_severity), else_=TargetRiskRollup.last_severity),
+            "last_scan_at": func.greatest(TargetRiskRollup.last_scan_at, statement.excluded.last_scan_at),
+            "max_risk_score": func.greatest(TargetRiskRollup.max_risk_score, statement.excluded.max_risk_score),
+        },
+    ))
+
+    scan.risk_score = risk_score
+    scan.severity = severity
+    session.add(scan)
+
+async def rebuild_scan_stats(session: AsyncSession):
+    """
+    Recomputes all dashboard rollups from the scan table, e.g. after upgrading
+    or if they have drifted.
+    """
+    for statement in REBUILD_STATEMENTS:
+        await session.execute(text(statement))
+    await session.commit()
+    logger.info("Rebuilt the dashboard rollups.")
+
+async def ensure_scan_stats(session: AsyncSession):
+    """
+    Builds the rollups if they are empty while scans exist, e.g. on a database
+    created before they were added. Otherwise status changes of the existing
+    scans would be counted from zero.
+    """
+    if (await session.execute(select(ScanStatsCounter.metric).limit(1))).first() is not None:
+        return
+    if (await session.execute(select(Scan.id).limit(1))).first() is None:
+        return
+    logger.info("The dashboard rollups are empty; building them from the existing scans.")
+    await rebuild_scan_stats(session)
+
+async def get_dashboard_stats(session: AsyncSession, days: int = 30, top: int = 10, today: Optional[date] = None) -> DashboardStats:
+    """
+    Reads the dashboard aggregates from the rollup tables. The cost depends on
+    `days` and `top`, not on how many scans exist.
+    """
+    today = today or datetime.utcnow().date()
+    first_day = today - timedelta(days=days - 1)
+
+    counters = (await session.execute(select(ScanStatsCounter))).scalars().all()
+    daily = (await session.execute(
+        select(ScanDailyRollup).where(ScanDailyRollup.day >= first_day).where(ScanDailyRollup.day <= today)
+    )).scalars().all()
+    targets = (await session.execute(
+        select(TargetRiskRollup).order_by(TargetRiskRollup.last_risk_score.desc()).limit(top)
+    )).scalars().all()
+
+    by_day = {row.day: row for row in daily}
+    scans_per_day = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        row = by_day.get(day)
+        scans_per_day.append(DailyScanCounts(
+            day=day,
+            created=row.created if row else 0,
+            completed=row.completed if row else 0,
+            failed=row.failed if row else 0,
+        ))
+
+    return DashboardStats(
+        # Counters that drifted below zero (e.g. changes applied before a rebuild) are left out, like empty ones
+        scans_by_status={row.key: row.value for row in counters if row.metric == "status" and row.value > 0},
+        severity_distribution={row.key: row.value for row in counters if row.metric == "severity" and row.value > 0},
+        scans_per_day=scans_per_day,
+        top_risky_targets=targets,
+    )
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import redis.asyncio as redis
+
+from config import settings
+from utils.logger import logger
+from tools.tool_controller import CLI_TOOL_PATHS, EXTERNAL_TOOLS, TOOL_NAMES, get_available_tools
+
+# Tools that need something only some workers have (a binary, a wordlist); every
+# other tool is plain Python and runs anywhere, so it plays no part in routing.
+ROUTED_TOOLS: Set[str] = set(EXTERNAL_TOOLS)
+
+# Flag that prints the version of each CLI tool
+VERSION_FLAGS = {"nikto_scan": "-Version"}
+
+WORKER_KEY_PREFIX = "workers:"
+WORKER_INDEX_KEY = "workers:index"
+
+
+async def _tool_version(path: str, flag: str) -> Optional[str]:
+    """ First line a tool prints for its version flag, or None if it can't be run. """
+    try:
+        process = await asyncio.create_subprocess_exec(
+            path, flag, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        )
+    except OSError:
+        return None
+    try:
+        output, _ = await asyncio.wait_for(process.communicate(), timeout=5)
+    except asyncio.TimeoutError:
+        # Reap the hung tool, so neither the process nor its pipes are left behind
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        return None
+    for line in output.decode("utf-8", errors="replace").splitlines():
+        if line.strip():
+            return line.strip()[:120]
+    return None
+
+def _cpu_class(cpu_count: int) -> str:
+    if cpu_count <= 2:
+        return "small"
+    if cpu_count <= 8:
+        return "medium"
+    return "large"
+
+async def detect_capabilities() -> Dict[str, Any]:
+    """
+    Describes what this worker process can run: its tools and their versions,
+    the wordlists it has and its CPU class.
+    """
+    available = set(await asyncio.to_thread(get_available_tools))
+    wordlists = [path for path in [settings.DIRSEARCH_DEFAULT_WORDLIST] if os.path.exists(path)]
+    if shutil.which(settings.DIRSEARCH_PATH) and wordlists:
+        available.add("dir_discovery")
+    tools = sorted((set(TOOL_NAMES) - ROUTED_TOOLS) | available)
+
+    versions = {}
+    for tool_name in sorted(available & set(CLI_TOOL_PATHS)):
+        version = await _tool_version(getattr(settings, CLI_TOOL_PATHS[tool_name]), VERSION_FLAGS.get(tool_name, "--version"))
+        if version:
+            versions[tool_name] = version
+
+    cpu_count = os.cpu_count() or 1
+    hostname = socket.gethostname()
+    return {
+        "worker_id": f"{hostname}-{os.getpid()}",
+        "hostname": hostname,
+        "pid": os.getpid(),
+        "tools": tools,
+        "versions": versions,
+        "wordlists": wordlists,
+        "cpu": {"count": cpu_count, "machine": platform.machine(), "class": _cpu_class(cpu_count)},
+        "started_at": time.time(),
+    }
+
+
+class WorkerRegistry:
+    """
+    Tracks the live workers and what each of them can run.
+
+    Every worker stores its capabilities under `workers:<worker_id>` with a TTL
+    and refreshes it on a heartbeat, so workers that die drop out on their own.
+    The API uses the registry to route scans to a queue that only capable
+    workers consume (see TaskQueue.enqueue_task) and to report fleet-wide tool
+    availability.
+    """
+    def __init__(self, client: redis.Redis, ttl: int, heartbeat_interval: float):
+        self.redis = client
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    async def register(self, capabilities: Dict[str, Any]):
+        worker_id = capabilities["worker_id"]
+        payload = json.dumps({**capabilities, "heartbeat_at": time.time()})
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(WORKER_KEY_PREFIX + worker_id, payload, ex=self.ttl)
+            pipe.sadd(WORKER_INDEX_KEY, worker_id)
+            await pipe.execute()
+
+    async def unregister(self, worker_id: str):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.delete(WORKER_KEY_PREFIX + worker_id)
+            pipe.srem(WORKER_INDEX_KEY, worker_id)
+            await pipe.execute()
+
+    def start(self, capabilities: Dict[str, Any]):
+        """
+        Registers the worker and keeps its entry alive until `stop` is called.
+        """
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat(capabilities))
+
+    async def stop(self, worker_id: str):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        try:
+            await self.unregister(worker_id)
+        except Exception as e:
+            logger.warning(f"Failed to unregister worker {worker_id}: {e}")
+
+    async def _heartbeat(self, capabilities: Dict[str, Any]):
+        logger.info(f"Worker {capabilities['worker_id']} registered with tools: {', '.join(capabilities['tools'])}")
+        while True:
+            try:
+                await self.register(capabilities)
+            except Exception as e:
+                # Retried on the next beat; the entry only expires after `ttl`
+                logger.warning(f"Worker heartbeat failed: {type(e).__name__}: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def live_workers(self) -> List[Dict[str, Any]]:
+        worker_ids = sorted(await self.redis.smembers(WORKER_INDEX_KEY))
+        if not worker_ids:
+            return []
+        payloads = await self.redis.mget([WORKER_KEY_PREFIX + worker_id for worker_id in worker_ids])
+        expired = [worker_id for worker_id, payload in zip(worker_ids, payloads) if payload is None]
+        if expired:
+            await self.redis.srem(WORKER_INDEX_KEY, *expired)
+        return [json.loads(payload) for payload in payloads if payload is not None]
+
+    async def fleet_tools(self, workers: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Availability of every tool across the live workers.
+        """
+        if workers is None:
+            workers = await self.live_workers()
+        fleet = {}
+        for tool_name in TOOL_NAMES:
+            running = [worker for worker in workers if tool_name in worker["tools"]]
+            fleet[tool_name] = {
+                "available": bool(running),
+                "workers": [worker["worker_id"] for worker in running],
+                "versions": sorted({worker["versions"][tool_name] for worker in running if tool_name in worker.get("versions", {})}),
+            }
+        return fleet
+
+    async def route_for(self, pipeline: Iterable[Dict[str, Any]]) -> Tuple[str, ...]:
+        """
+        The tools a worker must have to run the pipeline. If no live worker has
+        all of them, the largest subset some worker does have is used, and that
+        worker skips the rest as before. Empty when routing doesn't matter or no
+        worker has registered.
+        """
+        required = {step["name"] for step in pipeline} & ROUTED_TOOLS
+        if not required:
+            return ()
+        workers = await self.live_workers()
+        if not workers:
+            return ()
+        best = max((required & set(worker["tools"]) for worker in workers), key=len)
+        if best != required:
+            logger.warning(f"No live worker can run all of {', '.join(sorted(required))}; routing to one with {', '.join(sorted(best)) or 'none of them'}.")
+        return tuple(sorted(best))
+
+
+# Singleton instance
+_worker_registry: Optional[WorkerRegistry] = None
+
+def get_worker_registry() -> WorkerRegistry:
+    """
+    Returns a singleton instance of the WorkerRegistry.
+    """
+    global _worker_registry
+    if _worker_registry is None:
+        _worker_registry = WorkerRegistry(
+            redis.Redis.from_url(settings.REDIS_URL, decode_responses=True),
+            ttl=settings.WORKER_HEARTBEAT_TTL,
+            heartbeat_interval=settings.WORKER_HEARTBEAT_INTERVAL,
+        )
+    return _worker_registry
@@ -0,0 +1,54 @@
+from typing import Any, Dict, List, Sequence, Type
+
+from sqlalchemy import inspect, insert
+from sqlalchemy.dialects.postgresql import JSON, JSONB
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config import settings
+from utils.helpers import to_compact_json
+from utils.logger import logger
+
+
+def _column_rows(model: Type[SQLModel], objects: Sequence[SQLModel]) -> List[Dict[str, Any]]:
+    """
+    Turns model instances into {column name: value} dicts, defaults applied and
+    server-generated primary keys left out.
+    """
+    columns = [(attribute.key, attribute.columns[0]) for attribute in inspect(model).column_attrs]
+    columns = [
+        (key, column.name) for key, column in columns
+        if not (column.primary_key and getattr(objects[0], key) is None)
+    ]
+    return [{name: getattr(obj, key) for key, name in columns} for obj in objects]
+
+async def _copy_rows(session: AsyncSession, model: Type[SQLModel], rows: List[Dict[str, Any]]):
+    table = model.__table__
+    names = list(rows[0])
+    json_columns = {name for name in names if isinstance(table.c[name].type, (JSON, JSONB))}
+    records = [
+        tuple(to_compact_json(row[name]) if name in json_columns else row[name] for name in names)
+        for row in rows
+    ]
+    # COPY runs on the session's own connection, so it is part of the same transaction
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(table.name, records=records, columns=names)
+
+async def bulk_insert(session: AsyncSession, model: Type[SQLModel], objects: Sequence[SQLModel]) -> int:
+    """
+    Inserts many rows in the session's transaction without going through the
+    unit of work. Large batches are streamed with COPY (asyncpg), smaller ones
+    are sent as batched multi-row INSERTs. The objects are not added to the
+    session and don't get their IDs back. Returns the number of rows inserted.
+    """
+    if not objects:
+        return 0
+    rows = _column_rows(model, objects)
+    if 0 < settings.DB_BULK_COPY_THRESHOLD <= len(rows) and session.bind.dialect.driver == "asyncpg":
+        await _copy_rows(session, model, rows)
+    else:
+        table = model.__table__
+        await session.execute(insert(table), rows)
+    logger.debug(f"Bulk inserted {len(rows)} {model.__tablename__} rows.")
+    return len(rows)
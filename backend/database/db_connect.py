@@ -3,11 +3,19 @@ from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 
+import orjson
+
 from config import settings
+from monitoring.metrics import instrument_engine
+from utils.helpers import to_compact_json
 from utils.logger import logger
 
-# The database engine
-engine = create_async_engine(settings.DATABASE_URL, echo=False, future=True)
+# The database engine; JSONB columns are (de)serialized with orjson
+engine = create_async_engine(
+    settings.DATABASE_URL, echo=False, future=True,
+    json_serializer=to_compact_json, json_deserializer=orjson.loads,
+)
+instrument_engine(engine)
 
 # Async session maker
 AsyncSessionLocal = sessionmaker(
@@ -30,8 +38,15 @@ async def create_db_and_tables():
         # The following import is needed to ensure models are registered with SQLModel
         from database import models
         await conn.run_sync(SQLModel.metadata.create_all)
+        from database.migrations import apply_schema_upgrades
+        await apply_schema_upgrades(conn)
         logger.info("Database tables created successfully.")
 
+    # Fills the dashboard rollups of a database that predates them
+    from core.scan_stats import ensure_scan_stats
+    async with AsyncSessionLocal() as session:
+        await ensure_scan_stats(session)
+
 async def close_db_connection():
     """
     Closes the database engine connection.
@@ -0,0 +1,76 @@
+"""
+Idempotent schema upgrades applied at startup.
+
+`SQLModel.metadata.create_all` only creates missing tables, so columns added to
+existing tables after the first release are listed here and applied with
+`IF NOT EXISTS` guards. Statements run in order on every startup.
+"""
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from utils.logger import logger
+
+SCHEMA_UPGRADES: List[str] = [
+    # Per-tool resource accounting
+    "ALTER TABLE scanresult ADD COLUMN IF NOT EXISTS coalesced_from VARCHAR",
+    "ALTER TABLE scanresult ADD COLUMN IF NOT EXISTS wall_time DOUBLE PRECISION",
+    "ALTER TABLE scanresult ADD COLUMN IF NOT EXISTS wait_time DOUBLE PRECISION",
+    "ALTER TABLE scanresult ADD COLUMN IF NOT EXISTS cpu_user_time DOUBLE PRECISION",
+    "ALTER TABLE scanresult ADD COLUMN IF NOT EXISTS cpu_system_time DOUBLE PRECISION",
+    "ALTER TABLE scanresult ADD COLUMN IF NOT EXISTS peak_rss_bytes BIGINT",
+    "ALTER TABLE scanresult ADD COLUMN IF NOT EXISTS output_bytes BIGINT",
+    "ALTER TABLE scanresult ADD COLUMN IF NOT EXISTS http_requests INTEGER",
+    # Findings moved from pretty-printed text to JSONB. Older rows that stored a bare
+    # error string are wrapped as {"error": ...} so every row holds an object.
+    # This rewrites the table once; later startups skip it.
+    """
+    DO $$
+    BEGIN
+        IF (SELECT data_type FROM information_schema.columns
+            WHERE table_name = 'scanresult' AND column_name = 'findings') <> 'jsonb' THEN
+            ALTER TABLE scanresult ALTER COLUMN findings TYPE JSONB USING
+                CASE WHEN jsonb_typeof(findings::jsonb) = 'object' THEN findings::jsonb
+                     ELSE jsonb_build_object('error', findings::jsonb) END;
+        END IF;
+    END
+    $$
+    """,
+    # Containment (@>) and JSON path (@?) filters on findings
+    "CREATE INDEX IF NOT EXISTS ix_scanresult_findings ON scanresult USING GIN (findings jsonb_path_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_scanresult_scan_id ON scanresult (scan_id)",
+    # Report bytes moved to the content-addressed artifact store
+    "ALTER TABLE report ADD COLUMN IF NOT EXISTS content_digest VARCHAR",
+    "ALTER TABLE report ADD COLUMN IF NOT EXISTS content_size BIGINT",
+    "ALTER TABLE report ADD COLUMN IF NOT EXISTS content_path VARCHAR",
+    "ALTER TABLE report ALTER COLUMN content DROP NOT NULL",
+    "ALTER TABLE report ADD COLUMN IF NOT EXISTS content_encoding VARCHAR",
+    "CREATE INDEX IF NOT EXISTS ix_report_content_digest ON report (content_digest)",
+    # Keyset pagination of the scan and report listings
+    "CREATE INDEX IF NOT EXISTS ix_scan_created_at_id ON scan (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_report_created_at_id ON report (created_at, id)",
+    # Risk denormalized onto the scan, filled in from the JSON reports of older scans
+    "ALTER TABLE scan ADD COLUMN IF NOT EXISTS risk_score INTEGER",
+    "ALTER TABLE scan ADD COLUMN IF NOT EXISTS severity VARCHAR",
+    "CREATE INDEX IF NOT EXISTS ix_scan_severity ON scan (severity)",
+    """
+    UPDATE scan SET risk_score = report.risk_score, severity = report.severity
+    FROM report
+    WHERE scan.severity IS NULL AND scan.status = 'completed'
+      AND report.scan_id = scan.scan_id AND report.report_type = 'json'
+    """,
+    # Scores from before versioned risk rules came from the original engine (version 1)
+    "ALTER TABLE scan ADD COLUMN IF NOT EXISTS risk_rules_version INTEGER",
+    "UPDATE scan SET risk_rules_version = 1 WHERE risk_score IS NOT NULL AND risk_rules_version IS NULL",
+    # When a worker picked the scan up, for queue wait measurements
+    "ALTER TABLE scan ADD COLUMN IF NOT EXISTS started_at TIMESTAMP WITHOUT TIME ZONE",
+]
+
+async def apply_schema_upgrades(conn: AsyncConnection):
+    """
+    Applies all schema upgrades on the given connection.
+    """
+    for statement in SCHEMA_UPGRADES:
+        await conn.execute(text(statement))
+    logger.info(f"Applied {len(SCHEMA_UPGRADES)} schema upgrade statements.")
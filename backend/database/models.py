@@ -6,7 +6,7 @@ as the database models.
 We import them here to make them accessible via the `models` module path,
 maintaining a conventional structure.
 """
-from schemas import Scan, ScanResult, Report
+from schemas import Scan, ScanResult, Finding, Report, ScanStatsCounter, ScanDailyRollup, TargetRiskRollup
 
 # This makes the models available through `backend.database.models.Scan`, etc.
-__all__ = ["Scan", "ScanResult", "Report"]
+__all__ = ["Scan", "ScanResult", "Finding", "Report", "ScanStatsCounter", "ScanDailyRollup", "TargetRiskRollup"]
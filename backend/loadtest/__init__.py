@@ -0,0 +1,4 @@
+"""
+End-to-end load tests: the real API and workers, fake tool binaries and a local
+target web app. Run with `python -m loadtest --help` from the backend directory.
+"""
@@ -0,0 +1,80 @@
+"""
+Runs an end-to-end load test: starts a target web app, the API and N workers
+with fake tool binaries, submits scans and reports throughput, queue wait,
+latency percentiles, database load and memory growth.
+
+    python -m loadtest --scans 2000 --workers 8
+    python -m loadtest --duration 3600 --rate 2 --scans 0     # one-hour soak
+    python -m loadtest --scans 500 --viewers-per-scan 10      # plus 5000 WebSocket viewers
+
+Postgres and Redis are the ones configured for the backend (.env / environment);
+use a database you don't mind filling with test scans.
+"""
+import asyncio
+import os
+import resource
+import tempfile
+from typing import List, Optional
+
+import typer
+
+from loadtest.cluster import Cluster, ClusterOptions
+from loadtest.driver import DEFAULT_TOOLS, LoadOptions, LoadTest, format_report, write_report
+
+cli = typer.Typer()
+
+@cli.command()
+def run(
+    scans: int = typer.Option(1000, help="Scans to submit (0: no limit, use --duration)."),
+    duration: Optional[float] = typer.Option(None, help="Seconds to keep submitting, for soak runs."),
+    rate: float = typer.Option(0.0, help="Submissions per second (0: as fast as --concurrency allows)."),
+    concurrency: int = typer.Option(20, help="Concurrent submitting clients."),
+    workers: int = typer.Option(4, help="Worker processes."),
+    tools: List[str] = typer.Option(DEFAULT_TOOLS, "--tool", help="Tools of each scan (repeat the option)."),
+    tool_delay: float = typer.Option(1.0, help="Seconds each fake tool takes."),
+    tool_lines: int = typer.Option(200, help="Output lines of the chatty fake tools (nikto, xsser)."),
+    target_hosts: int = typer.Option(50, help="Loopback addresses the target listens on (127.0.0.1 to 127.0.0.N); scans are spread over them. macOS only has 127.0.0.1 unless aliases are added."),
+    target_latency: float = typer.Option(0.0, help="Seconds added to every response of the target."),
+    viewers_per_scan: int = typer.Option(0, help="WebSocket viewers opened on each scan."),
+    watched_scans: int = typer.Option(0, help="Only open viewers on the first N scans (0: all)."),
+    drain_timeout: float = typer.Option(1800.0, help="Seconds to wait for the queue to drain after submitting."),
+    api_port: int = typer.Option(8100),
+    target_port: int = typer.Option(8181),
+    rate_limit: bool = typer.Option(False, help="Keep the API rate limits on."),
+    log_level: str = typer.Option("INFO", help="LOG_LEVEL of the API and workers; INFO, the default, also sends scan logs through the live feed as in production."),
+    work_dir: Optional[str] = typer.Option(None, help="Where the fake tools, logs and artifacts go (default: a new temporary directory)."),
+    report: Optional[str] = typer.Option(None, help="Also write the report as JSON to this file."),
+):
+    # Every viewer and client connection is a file descriptor
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else 65536, hard))
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix="cybersentinel-loadtest-")
+    os.makedirs(work_dir, exist_ok=True)
+    cluster = Cluster(ClusterOptions(
+        workers=workers, api_port=api_port, target_port=target_port, target_hosts=target_hosts, target_latency=target_latency,
+        tool_delay=tool_delay, tool_lines=tool_lines, log_level=log_level, rate_limit=rate_limit,
+    ), work_dir)
+    options = LoadOptions(
+        scans=scans or None, duration=duration, rate=rate, concurrency=concurrency, tools=tools,
+        viewers_per_scan=viewers_per_scan, watched_scans=watched_scans, drain_timeout=drain_timeout,
+    )
+    if options.scans is None and options.duration is None:
+        raise typer.BadParameter("Give --scans or --duration.")
+
+    async def main():
+        await cluster.start()
+        print(f"Cluster up: API {cluster.api_url}, {workers} workers; logs in {work_dir}/logs")
+        return await LoadTest(cluster, options).run()
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        cluster.stop()
+    print(format_report(results))
+    if report:
+        write_report(results, report)
+
+
+if __name__ == "__main__":
+    cli()
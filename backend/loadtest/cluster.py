@@ -0,0 +1,186 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import httpx
+import psutil
+
+from loadtest import fake_tools
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fake executable of each tool, by the setting holding its path (see tools.tool_controller.CLI_TOOL_PATHS)
+TOOL_EXECUTABLES = {
+    "NMAP_PATH": "nmap", "SSLSCAN_PATH": "sslscan", "NIKTO_PATH": "nikto",
+    "SQLMAP_PATH": "sqlmap", "XSSER_PATH": "xsser", "DIRSEARCH_PATH": "dirsearch",
+}
+
+WORDLIST = ["admin", "login", "api", "backup", "config", "uploads", "images", "static", "old", "test", "dev", ".git", ".env", "private"]
+
+
+@dataclass
+class ClusterOptions:
+    workers: int = 4
+    api_port: int = 8100
+    target_port: int = 8181
+    # Loopback addresses the target listens on; scans are spread over them
+    target_hosts: int = 50
+    target_latency: float = 0.0
+    tool_delay: float = 1.0
+    tool_lines: int = 200
+    wordlist_size: int = 500
+    log_level: str = "INFO"
+    rate_limit: bool = False
+    # Extra environment for the API and the workers, e.g. {"GOVERNOR_ENABLED": "false"}
+    env: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class ManagedProcess:
+    role: str
+    popen: subprocess.Popen
+    log_path: str
+
+
+class Cluster:
+    """
+    The processes under test: the target web app, the API and the workers, each
+    logging to `<work_dir>/logs`. The workers run the fake tools from `<work_dir>/bin`.
+    """
+    def __init__(self, options: ClusterOptions, work_dir: str):
+        self.options = options
+        self.work_dir = work_dir
+        self.processes: List[ManagedProcess] = []
+        self.api_url = f"http://127.0.0.1:{options.api_port}"
+
+    def target_url(self, index: int) -> str:
+        return f"http://127.0.0.{index % self.options.target_hosts + 1}:{self.options.target_port}/"
+
+    def _environment(self) -> Dict[str, str]:
+        bin_dir = fake_tools.install(os.path.join(self.work_dir, "bin"))
+        wordlist = os.path.join(self.work_dir, "wordlist.txt")
+        with open(wordlist, "w") as f:
+            f.write("\n".join(f"{WORDLIST[index % len(WORDLIST)]}{index // len(WORDLIST) or ''}" for index in range(self.options.wordlist_size)) + "\n")
+
+        env = dict(os.environ)
+        env.update({setting: os.path.join(bin_dir, executable) for setting, executable in TOOL_EXECUTABLES.items()})
+        env.update({
+            "PATH": bin_dir + os.pathsep + env.get("PATH", ""),
+            "PYTHONPATH": BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+            "DATA_DIR": os.path.join(self.work_dir, "data"),
+            "DIRSEARCH_DEFAULT_WORDLIST": wordlist,
+            "LOADTEST_TOOL_DELAY": str(self.options.tool_delay),
+            "LOADTEST_TOOL_LINES": str(self.options.tool_lines),
+            "RATE_LIMIT_ENABLED": str(self.options.rate_limit).lower(),
+            "LOG_LEVEL": self.options.log_level,
+            # The workers would all want the same metrics port
+            "WORKER_METRICS_PORT": "0",
+        })
+        env.update(self.options.env)
+        return env
+
+    def _spawn(self, role: str, command: List[str], env: Dict[str, str]):
+        log_path = os.path.join(self.work_dir, "logs", f"{role}.log")
+        with open(log_path, "wb") as log:
+            # Run from the work dir, so the processes' log files land there too
+            popen = subprocess.Popen(command, cwd=self.work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        self.processes.append(ManagedProcess(role, popen, log_path))
+
+    async def start(self, timeout: float = 120.0):
+        os.makedirs(os.path.join(self.work_dir, "logs"), exist_ok=True)
+        env = self._environment()
+        self._spawn("target", [sys.executable, "-m", "loadtest.target_server", "--port", str(self.options.target_port),
+                               "--hosts", str(self.options.target_hosts), "--latency", str(self.options.target_latency)], env)
+        self._spawn("api", [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR, "--host", "127.0.0.1",
+                            "--port", str(self.options.api_port), "--log-level", self.options.log_level.lower(), "--no-access-log"], env)
+        # Workers register with the API's Redis, so start them once the API has set up the database
+        await self._wait_for(lambda client: client.get(f"{self.api_url}/"), "the API", timeout)
+        for index in range(self.options.workers):
+            self._spawn(f"worker-{index}", [sys.executable, os.path.join(BACKEND_DIR, "main.py"), "worker"], env)
+
+        async def workers_registered(client: httpx.AsyncClient):
+            response = await client.get(f"{self.api_url}/api/tools/fleet")
+            pids = {process.popen.pid for process in self.processes}
+            mine = [worker for worker in response.json()["workers"] if worker["pid"] in pids]
+            if len(mine) < self.options.workers:
+                raise RuntimeError(f"{len(mine)} of {self.options.workers} workers registered")
+            return response
+        await self._wait_for(workers_registered, "the workers", timeout)
+
+    async def _wait_for(self, probe, what: str, timeout: float):
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient(timeout=5) as client:
+            while True:
+                self.check_alive()
+                try:
+                    response = await probe(client)
+                    if response.status_code < 500:
+                        return
+                except (httpx.HTTPError, RuntimeError):
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Timed out waiting for {what}; see the logs in {self.work_dir}/logs")
+                await asyncio.sleep(0.5)
+
+    def check_alive(self):
+        for process in self.processes:
+            if process.popen.poll() is not None:
+                raise RuntimeError(f"{process.role} exited with status {process.popen.returncode}; see {process.log_path}")
+
+    def pids(self, prefix: str = "") -> Dict[str, int]:
+        return {process.role: process.popen.pid for process in self.processes if process.role.startswith(prefix)}
+
+    def stop(self, timeout: float = 15.0):
+        for process in self.processes:
+            if process.popen.poll() is None:
+                process.popen.send_signal(signal.SIGINT)
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            try:
+                process.popen.wait(max(0.1, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.popen.kill()
+                process.popen.wait()
+
+
+class MemorySampler:
+    """
+    Resident memory of the API and worker processes over the run. Tool
+    subprocesses come and go, so only the long-lived processes are counted.
+    """
+    def __init__(self, pids: Dict[str, int]):
+        self.processes = {role: psutil.Process(pid) for role, pid in pids.items()}
+        self.samples: Dict[str, List[tuple]] = {role: [] for role in pids}
+
+    def sample(self):
+        now = time.monotonic()
+        for role, process in self.processes.items():
+            try:
+                self.samples[role].append((now, process.memory_info().rss))
+            except psutil.Error:
+                pass
+
+    def summary(self, warmup_fraction: float = 0.1) -> Dict[str, Dict[str, float]]:
+        """
+        Per process: RSS after the warm-up (the first `warmup_fraction` of the
+        samples), at the end, at its peak, and the growth per hour in between.
+        """
+        summary = {}
+        for role, samples in self.samples.items():
+            if len(samples) < 2:
+                continue
+            start_time, start_rss = samples[min(len(samples) - 1, int(len(samples) * warmup_fraction))]
+            end_time, end_rss = samples[-1]
+            hours = max(end_time - start_time, 1e-9) / 3600
+            summary[role] = {
+                "start_mb": start_rss / 1e6,
+                "end_mb": end_rss / 1e6,
+                "peak_mb": max(rss for _, rss in samples) / 1e6,
+                "growth_mb_per_hour": (end_rss - start_rss) / 1e6 / hours if end_time > start_time else 0.0,
+            }
+        return summary
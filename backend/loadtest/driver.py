@@ -0,0 +1,309 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+import websockets
+from sqlalchemy import text
+
+from core.queue_manager import get_queue, initialize_queue
+from database.db_connect import engine
+from loadtest.cluster import Cluster, MemorySampler
+from utils.live_feed import is_scan_finished
+
+# Every tool, so each scan runs all the fake binaries and all the HTTP testers
+DEFAULT_TOOLS = [
+    "nmap_scan", "ssl_scan", "header_analysis", "sql_injection_test", "xss_test",
+    "dir_discovery", "nikto_scan", "sqlmap_scan", "xsser_scan",
+]
+
+DB_COUNTERS = ["xact_commit", "xact_rollback", "tup_returned", "tup_fetched", "tup_inserted", "tup_updated", "tup_deleted", "blks_read", "blks_hit"]
+
+
+@dataclass
+class LoadOptions:
+    # Stop submitting after this many scans and/or this many seconds
+    scans: Optional[int] = 1000
+    duration: Optional[float] = None
+    # Submissions per second (0: as fast as `concurrency` clients can submit)
+    rate: float = 0.0
+    concurrency: int = 20
+    tools: List[str] = field(default_factory=lambda: list(DEFAULT_TOOLS))
+    scan_mode: str = "offensive"
+    scan_depth: str = "deep"
+    # WebSocket viewers opened on each of the first `watched_scans` scans (0: every scan)
+    viewers_per_scan: int = 0
+    watched_scans: int = 0
+    # How long to wait for the queue to drain once submitting stops
+    drain_timeout: float = 1800.0
+    sample_interval: float = 1.0
+
+
+def percentiles(values: List[float], points=(50, 90, 99)) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    summary = {f"p{point}": ordered[min(len(ordered) - 1, round(point / 100 * (len(ordered) - 1)))] for point in points}
+    summary["max"] = ordered[-1]
+    return summary
+
+
+class ViewerStats:
+    def __init__(self):
+        self.open = 0
+        self.peak_open = 0
+        self.connect_seconds: List[float] = []
+        self.messages = 0
+        self.finished = 0
+        self.close_codes: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "viewers": len(self.connect_seconds) + sum(self.errors.values()),
+            "peak_concurrent": self.peak_open,
+            "connect_seconds": percentiles(self.connect_seconds),
+            "messages": self.messages,
+            "saw_scan_finished": self.finished,
+            "close_codes": dict(self.close_codes),
+            "errors": dict(self.errors),
+        }
+
+
+class LoadTest:
+    """
+    Submits scans to a running cluster, optionally watches them over WebSockets,
+    waits for them to finish and collects what the run cost.
+    """
+    def __init__(self, cluster: Cluster, options: LoadOptions):
+        self.cluster = cluster
+        self.options = options
+        self.client = httpx.AsyncClient(base_url=cluster.api_url, timeout=120, limits=httpx.Limits(max_connections=options.concurrency + 10))
+        self.memory = MemorySampler(cluster.pids("api") | cluster.pids("worker"))
+        self.viewers = ViewerStats()
+        self.viewer_tasks: List[asyncio.Task] = []
+        self.submitted: List[str] = []
+        self.submit_seconds: List[float] = []
+        self.submit_errors: Counter = Counter()
+        self.queue_depths: List[int] = []
+        self.db_connections: List[int] = []
+        self.finished_timeline: List[tuple] = []
+        self.run_started_at: Optional[datetime] = None
+
+    async def _submit(self, index: int):
+        started = time.perf_counter()
+        try:
+            response = await self.client.post("/api/scan/", headers={"X-Legal-Accepted": "true"}, json={
+                "target": self.cluster.target_url(index), "scan_mode": self.options.scan_mode,
+                "scan_depth": self.options.scan_depth, "tools": self.options.tools,
+            })
+        except httpx.HTTPError as e:
+            self.submit_errors[type(e).__name__] += 1
+            return
+        self.submit_seconds.append(time.perf_counter() - started)
+        if response.status_code != 202:
+            self.submit_errors[f"HTTP {response.status_code}"] += 1
+            return
+        scan_id = response.json()["scan_id"]
+        self.submitted.append(scan_id)
+        if self.options.viewers_per_scan and (not self.options.watched_scans or len(self.submitted) <= self.options.watched_scans):
+            for _ in range(self.options.viewers_per_scan):
+                self.viewer_tasks.append(asyncio.create_task(self._watch(scan_id)))
+
+    async def _submit_all(self):
+        """ Submits until the scan count or the duration is reached, at `rate` if one is set. """
+        options = self.options
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(options.concurrency)
+        pending = set()
+
+        async def submit(index: int):
+            try:
+                await self._submit(index)
+            finally:
+                semaphore.release()
+
+        index = 0
+        while (options.scans is None or index < options.scans) and (options.duration is None or time.monotonic() - started < options.duration):
+            await semaphore.acquire()
+            task = asyncio.create_task(submit(index))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            index += 1
+            if options.rate:
+                await asyncio.sleep(max(0.0, started + index / options.rate - time.monotonic()))
+        await asyncio.gather(*pending)
+
+    async def _watch(self, scan_id: str):
+        """ A live output viewer: reads the scan's WebSocket until the server closes it. """
+        url = self.cluster.api_url.replace("http://", "ws://") + f"/api/scan/ws/{scan_id}"
+        started = time.perf_counter()
+        try:
+            async with websockets.connect(url, max_size=None, open_timeout=60, close_timeout=5) as websocket:
+                self.viewers.connect_seconds.append(time.perf_counter() - started)
+                self.viewers.open += 1
+                self.viewers.peak_open = max(self.viewers.peak_open, self.viewers.open)
+                try:
+                    async for message in websocket:
+                        self.viewers.messages += 1
+                        if is_scan_finished(message):
+                            self.viewers.finished += 1
+                except websockets.ConnectionClosed:
+                    pass
+                finally:
+                    self.viewers.open -= 1
+                    self.viewers.close_codes[websocket.close_code] += 1
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+            self.viewers.errors[type(e).__name__] += 1
+
+    async def _finished_count(self) -> int:
+        response = await self.client.get("/api/stats/", params={"days": 1, "top": 1})
+        by_status = response.json()["scans_by_status"]
+        return by_status.get("completed", 0) + by_status.get("failed", 0)
+
+    async def _db_counters(self) -> Dict[str, int]:
+        async with engine.connect() as connection:
+            row = (await connection.execute(text(
+                f"SELECT {', '.join(DB_COUNTERS)} FROM pg_stat_database WHERE datname = current_database()"
+            ))).one()
+        return dict(zip(DB_COUNTERS, row))
+
+    async def _sample(self, baseline_finished: int, started: float):
+        """ Every `sample_interval`: RSS, queue depth, database connections and scans finished so far. """
+        queue = get_queue()
+        while True:
+            self.cluster.check_alive()
+            self.memory.sample()
+            self.queue_depths.append(await queue.get_queue_size())
+            async with engine.connect() as connection:
+                self.db_connections.append((await connection.execute(text(
+                    "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()"
+                ))).scalar_one())
+            self.finished_timeline.append((time.monotonic() - started, await self._finished_count() - baseline_finished))
+            await asyncio.sleep(self.options.sample_interval)
+
+    async def _run_scans(self, fields: str) -> List[Dict[str, Any]]:
+        """ The given fields of the scans this run submitted, through the paginated listing. """
+        wanted = set(self.submitted)
+        scans, cursor = [], None
+        while True:
+            params = {"fields": fields, "limit": 1000, "since": self.run_started_at.isoformat()}
+            if cursor:
+                params["cursor"] = cursor
+            response = await self.client.get("/api/scan/", params=params)
+            scans += [scan for scan in response.json() if scan["scan_id"] in wanted]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                return scans
+
+    async def _queue_waits(self) -> List[float]:
+        """
+        Seconds each scan spent queued: from its creation until a worker set it
+        in progress (`started_at`).
+        """
+        return [
+            (datetime.fromisoformat(scan["started_at"]) - datetime.fromisoformat(scan["created_at"])).total_seconds()
+            for scan in await self._run_scans("scan_id,created_at,started_at") if scan["started_at"]
+        ]
+
+    async def _latencies(self) -> Dict[str, Any]:
+        """ End-to-end time (created to finished) and status of the submitted scans. """
+        latencies, statuses = [], Counter()
+        for scan in await self._run_scans("scan_id,status,created_at,finished_at"):
+            statuses[scan["status"]] += 1
+            if scan["finished_at"]:
+                latencies.append((datetime.fromisoformat(scan["finished_at"]) - datetime.fromisoformat(scan["created_at"])).total_seconds())
+        return {"statuses": dict(statuses), "end_to_end_seconds": percentiles(latencies)}
+
+    async def run(self) -> Dict[str, Any]:
+        await initialize_queue()
+        self.run_started_at = datetime.utcnow()
+        baseline_finished = await self._finished_count()
+        db_before = await self._db_counters()
+        started = time.monotonic()
+        sampler = asyncio.create_task(self._sample(baseline_finished, started))
+        try:
+            await self._submit_all()
+            submitted_in = time.monotonic() - started
+            drain_deadline = time.monotonic() + self.options.drain_timeout
+            while await self._finished_count() - baseline_finished < len(self.submitted) and time.monotonic() < drain_deadline:
+                self.cluster.check_alive()
+                await asyncio.sleep(self.options.sample_interval)
+            elapsed = time.monotonic() - started
+            if self.viewer_tasks:
+                # Viewers are closed by the scan-finished message; give the last ones a moment
+                await asyncio.wait(self.viewer_tasks, timeout=30)
+        finally:
+            sampler.cancel()
+            for task in self.viewer_tasks:
+                task.cancel()
+        db_after = await self._db_counters()
+
+        finished = await self._finished_count() - baseline_finished
+        report = {
+            "submitted": len(self.submitted),
+            "submit_errors": dict(self.submit_errors),
+            "submit_seconds": percentiles(self.submit_seconds),
+            "submission_rate_per_s": len(self.submitted) / submitted_in if submitted_in else 0.0,
+            "finished": finished,
+            "elapsed_seconds": elapsed,
+            "throughput_scans_per_min": finished / elapsed * 60 if elapsed else 0.0,
+            **await self._latencies(),
+            "queue_wait_seconds": percentiles(await self._queue_waits()),
+            "queue_depth": {"max": max(self.queue_depths, default=0), "final": self.queue_depths[-1] if self.queue_depths else 0},
+            "database": {
+                **{f"{name}_per_s": (db_after[name] - db_before[name]) / elapsed for name in DB_COUNTERS},
+                "commits_per_scan": (db_after["xact_commit"] - db_before["xact_commit"]) / max(finished, 1),
+                "max_connections": max(self.db_connections, default=0),
+            },
+            "rss": self.memory.summary(),
+            # (seconds since the start, scans finished), for plotting a soak run
+            "finished_timeline": self.finished_timeline,
+        }
+        if self.options.viewers_per_scan:
+            report["viewers"] = self.viewers.summary()
+        await self.client.aclose()
+        return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    def seconds(values: Dict[str, float]) -> str:
+        return "  ".join(f"{name} {value:.2f}s" for name, value in values.items()) or "-"
+
+    lines = [
+        f"Submitted        {report['submitted']} scans at {report['submission_rate_per_s']:.1f}/s, submit latency {seconds(report['submit_seconds'])}",
+        f"Submit errors    {report['submit_errors'] or 'none'}",
+        f"Finished         {report['finished']} in {report['elapsed_seconds']:.0f}s: {report['throughput_scans_per_min']:.1f} scans/min {report['statuses']}",
+        f"End to end       {seconds(report['end_to_end_seconds'])}",
+        f"Queue wait       {seconds(report['queue_wait_seconds'])}",
+        f"Queue depth      max {report['queue_depth']['max']}, at the end {report['queue_depth']['final']}",
+    ]
+    database = report["database"]
+    lines.append(
+        f"Database         {database['xact_commit_per_s']:.0f} commits/s ({database['commits_per_scan']:.1f} per scan), "
+        f"{database['tup_inserted_per_s']:.0f} rows inserted/s, {database['tup_updated_per_s']:.0f} updated/s, "
+        f"{database['tup_fetched_per_s']:.0f} fetched/s, {database['blks_read_per_s']:.0f} blocks read/s, max {database['max_connections']} connections"
+    )
+    for role, memory in report["rss"].items():
+        lines.append(
+            f"RSS {role:<12} {memory['start_mb']:.0f} MB -> {memory['end_mb']:.0f} MB (peak {memory['peak_mb']:.0f} MB, "
+            f"{memory['growth_mb_per_hour']:+.1f} MB/h)"
+        )
+    if "viewers" in report:
+        viewers = report["viewers"]
+        lines.append(
+            f"Viewers          {viewers['viewers']} (peak {viewers['peak_concurrent']} open), connect {seconds(viewers['connect_seconds'])}, "
+            f"{viewers['messages']} messages, {viewers['saw_scan_finished']} saw the scan finish, close codes {viewers['close_codes']}, "
+            f"errors {viewers['errors'] or 'none'}"
+        )
+    return "\n".join(lines)
+
+
+def write_report(report: Dict[str, Any], path: str):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+        f.write("\n")
@@ -0,0 +1,155 @@
+"""
+Stand-ins for the external scanners, used by the load tests. `install` puts
+an executable named after each tool in a directory to prepend to PATH; each
+one prints canned output in the real tool's format, spread over a delay.
+
+    LOADTEST_TOOL_DELAY=2           seconds every tool takes (default 1)
+    LOADTEST_TOOL_DELAY_NIKTO=10    the same, for one tool
+    LOADTEST_TOOL_LINES=500         output lines of the chatty tools (nikto, xsser)
+
+This file runs once per tool invocation, so it only uses the standard library.
+"""
+import json
+import os
+import random
+import stat
+import sys
+import time
+from typing import Callable, Dict, List
+from urllib.parse import urlparse
+
+TOOLS = ("nmap", "sslscan", "nikto", "sqlmap", "xsser", "dirsearch")
+
+VERSIONS = {
+    "nmap": "Nmap version 7.94 ( https://nmap.org )",
+    "sslscan": "sslscan version 2.0.15-static",
+    "nikto": "Nikto 2.5.0 (fake)",
+    "sqlmap": "1.8#stable",
+    "xsser": "XSSer v1.8[4] (fake)",
+    "dirsearch": "dirsearch v0.4.3",
+}
+
+# port, service name, product, version, CPE; Apache 2.4.49 matches built-in CVEs, so the CVE lookup has work to do
+SERVICES = [
+    (22, "ssh", "OpenSSH", "8.2p1", "cpe:/a:openbsd:openssh:8.2p1"),
+    (80, "http", "Apache httpd", "2.4.49", "cpe:/a:apache:http_server:2.4.49"),
+    (443, "https", "nginx", "1.18.0", "cpe:/a:igor_sysoev:nginx:1.18.0"),
+    (3306, "mysql", "MySQL", "5.7.33", "cpe:/a:mysql:mysql:5.7.33"),
+]
+
+
+def tool_delay(tool: str) -> float:
+    return float(os.getenv(f"LOADTEST_TOOL_DELAY_{tool.upper()}", os.getenv("LOADTEST_TOOL_DELAY", 1.0)))
+
+def install(bin_dir: str) -> str:
+    """ Writes an executable for each tool into `bin_dir` and returns it. """
+    os.makedirs(bin_dir, exist_ok=True)
+    for tool in TOOLS:
+        path = os.path.join(bin_dir, tool)
+        with open(path, "w") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" {tool} "$@"\n')
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return bin_dir
+
+
+def _option(args: List[str], name: str, default: str = "") -> str:
+    return args[args.index(name) + 1] if name in args and args.index(name) + 1 < len(args) else default
+
+def _emit(lines: List[str], delay: float, chunks: int = 10):
+    """ Prints the lines in a few bursts over `delay` seconds, like a tool working through its checks. """
+    step = max(1, -(-len(lines) // chunks))
+    for start in range(0, max(len(lines), 1), step):
+        time.sleep(delay / chunks)
+        sys.stdout.write("".join(line + "\n" for line in lines[start:start + step]))
+        sys.stdout.flush()
+
+def _nmap(args: List[str], rng: random.Random, delay: float):
+    # python-nmap runs: nmap -oX - <hosts> <arguments>
+    positional = [arg for index, arg in enumerate(args) if not arg.startswith("-") and (index == 0 or args[index - 1] != "-oX")]
+    host = positional[0] if positional else "127.0.0.1"
+    started = int(time.time())
+    out = ['<?xml version="1.0" encoding="UTF-8"?>',
+           f'<nmaprun scanner="nmap" args="nmap {" ".join(args)}" start="{started}" version="7.94" xmloutputversion="1.05">',
+           '<scaninfo type="syn" protocol="tcp" numservices="1000" services="1-1000"/>',
+           f'<host><status state="up" reason="syn-ack" reason_ttl="0"/><address addr="{host}" addrtype="ipv4"/>'
+           '<hostnames><hostname name="loadtest.local" type="user"/></hostnames><ports>']
+    for port, name, product, version, cpe in sorted(rng.sample(SERVICES, rng.randint(1, len(SERVICES)))):
+        out.append(f'<port protocol="tcp" portid="{port}"><state state="open" reason="syn-ack" reason_ttl="64"/>'
+                   f'<service name="{name}" product="{product}" version="{version}" method="probed" conf="10"><cpe>{cpe}</cpe></service></port>')
+    out.append(f'</ports></host><runstats><finished time="{started + int(delay)}" timestr="" elapsed="{delay:.2f}" summary="" exit="success"/>'
+               '<hosts up="1" down="0" total="1"/></runstats></nmaprun>')
+    # python-nmap reads the XML only once nmap exits
+    time.sleep(delay)
+    sys.stdout.write("\n".join(out) + "\n")
+
+def _sslscan(args: List[str], rng: random.Random, delay: float):
+    host = args[-1] if args else "127.0.0.1"
+    lines = [f"Testing SSL server {host} on port 443 using SNI name {host}", "", "  SSL/TLS Protocols:",
+             "SSLv2     disabled", f"SSLv3     {rng.choice(['disabled', 'enabled'])}", f"TLSv1.0   {rng.choice(['disabled', 'enabled'])}",
+             "TLSv1.1   enabled", "TLSv1.2   enabled", "TLSv1.3   enabled", "", "  Heartbleed:",
+             f"TLSv1.2 {rng.choice(['not vulnerable', 'not vulnerable', 'vulnerable'])} to heartbleed", "",
+             "  Supported Server Cipher(s):"]
+    for cipher in ["ECDHE-RSA-AES256-GCM-SHA384", "ECDHE-RSA-AES128-GCM-SHA256", "AES256-SHA", "DES-CBC3-SHA"]:
+        lines.append(f"Accepted  TLSv1.2  256 bits  {cipher}   Curve P-256 DHE 256")
+    _emit(lines, delay)
+
+def _nikto(args: List[str], rng: random.Random, delay: float):
+    target = _option(args, "-h", "127.0.0.1")
+    host = urlparse(target).hostname or target
+    count = int(os.getenv("LOADTEST_TOOL_LINES", 200))
+    lines = ["- Nikto v2.5.0", f"+ Target IP:          {host}", "+ Target Port:        80", f"+ Start Time:         {time.ctime()}"]
+    checks = ["The anti-clickjacking X-Frame-Options header is not present.", "Server may leak inodes via ETags.",
+              "OSVDB-3092: This might be interesting.", "Directory indexing found.", "Cookie session created without the httponly flag."]
+    lines += [f"+ /{rng.choice(['admin', 'backup', 'old', 'test', 'cgi-bin'])}/{index}: {rng.choice(checks)}" for index in range(count)]
+    lines += [f"+ {count * 40} requests: 0 error(s) and {count} item(s) reported on remote host", "+ 1 host(s) tested"]
+    _emit(lines, delay)
+
+def _sqlmap(args: List[str], rng: random.Random, delay: float):
+    target = _option(args, "-u", "http://127.0.0.1/")
+    output_dir = os.path.join(_option(args, "--output-dir", "."), urlparse(target).hostname or "target")
+    os.makedirs(output_dir, exist_ok=True)
+    log = [{"type": "info", "data": f"testing connection to the target URL ({index})"} for index in range(20)]
+    if rng.random() < 0.5:
+        log.append({"type": "vulnerable", "data": {
+            "parameter": "id", "dbms": "MySQL", "title": "boolean-based blind - WHERE or HAVING clause",
+            "data": {"1": {"payload": "id=1 AND 4321=4321", "title": "AND boolean-based blind"}},
+        }})
+    _emit([f"[{time.strftime('%H:%M:%S')}] [INFO] {entry['data']}" for entry in log if entry["type"] == "info"], delay)
+    with open(os.path.join(output_dir, "log"), "w") as f:
+        json.dump(log, f)
+
+def _xsser(args: List[str], rng: random.Random, delay: float):
+    target = _option(args, "-u", "http://127.0.0.1/")
+    count = int(os.getenv("LOADTEST_TOOL_LINES", 200))
+    lines = [f"[*] Crawling {target}search?q={index}" for index in range(count)]
+    lines += [f"[+] Payload: {target}search?q=<script>alert({index})</script>" for index in range(rng.randint(0, 3))]
+    _emit(lines, delay)
+
+def _dirsearch(args: List[str], rng: random.Random, delay: float):
+    target = _option(args, "-u", "http://127.0.0.1").rstrip("/")
+    wordlist = _option(args, "-w")
+    with open(wordlist) as f:
+        words = [line.strip() for line in f if line.strip()]
+    # dirsearch only reports the paths that didn't come back 404
+    lines = [f"# Dirsearch started {time.ctime()} as: dirsearch {' '.join(args)}"]
+    for word in words:
+        status = rng.choices([200, 301, 403, 404], weights=[5, 2, 2, 91])[0]
+        if status != 404:
+            lines.append(f"{status}   {rng.randint(1, 999)}B  - {target}/{word}")
+    _emit(lines, delay)
+
+HANDLERS: Dict[str, Callable[[List[str], random.Random, float], None]] = {
+    "nmap": _nmap, "sslscan": _sslscan, "nikto": _nikto, "sqlmap": _sqlmap, "xsser": _xsser, "dirsearch": _dirsearch,
+}
+
+def main(argv: List[str]) -> int:
+    tool, args = argv[0], argv[1:]
+    if args in (["-V"], ["--version"], ["-Version"]):
+        print(VERSIONS[tool])
+        return 0
+    HANDLERS[tool](args, random.Random(), tool_delay(tool))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
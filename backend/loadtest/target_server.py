@@ -0,0 +1,106 @@
+"""
+A small web application for the load tests to scan: a home page with forms
+(one reflects its input, one answers quotes with a SQL error), a few
+discoverable paths, and missing security headers.
+
+It listens on the same port on several loopback addresses (127.0.0.1,
+127.0.0.2...), so scans look like they target different hosts and the
+per-host governor and run coalescing behave as they would across real targets.
+
+    python -m loadtest.target_server --port 8081 --hosts 50 --latency 0.05
+"""
+import asyncio
+import html
+import socket
+from typing import List
+from urllib.parse import parse_qs
+
+import typer
+import uvicorn
+
+HOME_PAGE = """<!DOCTYPE html>
+<html><head><title>Load test target</title></head><body>
+<h1>Store</h1>
+<a href="/search?q=shoes">Search</a> <a href="/products?id=1">Product</a> <a href="/admin/">Admin</a>
+<form action="/search" method="get"><input type="text" name="q"><input type="submit" value="Search"></form>
+<form action="/login" method="post"><input type="text" name="username"><input type="password" name="password">
+<input type="hidden" name="csrf" value="abc123"><input type="submit" value="Log in"></form>
+<form action="/comment" method="post"><textarea name="comment"></textarea><input type="email" name="email"></form>
+</body></html>"""
+
+PATHS = {
+    "/robots.txt": (200, "text/plain", "User-agent: *\nDisallow: /admin/\nDisallow: /backup/\n"),
+    "/admin/": (200, "text/html", "<html><body><form action=\"/admin/login\" method=\"post\"><input name=\"user\"></form></body></html>"),
+    "/backup/": (403, "text/html", "<html><body>Forbidden</body></html>"),
+    "/.git/HEAD": (200, "text/plain", "ref: refs/heads/main\n"),
+    "/api/health": (200, "application/json", '{"status": "ok"}'),
+}
+
+# Deliberately without Content-Security-Policy, HSTS or X-Content-Type-Options
+HEADERS = [(b"server", b"Apache/2.4.49 (Unix)"), (b"x-frame-options", b"SAMEORIGIN")]
+
+
+def target_app(latency: float = 0.0):
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        if latency:
+            await asyncio.sleep(latency)
+
+        path = scope["path"]
+        params = {**parse_qs(scope["query_string"].decode()), **parse_qs(body.decode(errors="replace"))}
+        status, content_type, text = 404, "text/html", "<html><body>Not found</body></html>"
+        if path == "/":
+            status, content_type, text = 200, "text/html", HOME_PAGE
+        elif path == "/search":
+            # Reflected without escaping: the XSS test finds this one
+            status, text = 200, f"<html><body>Results for {params.get('q', [''])[0]}</body></html>"
+        elif path in ("/login", "/products"):
+            values = " ".join(value for values in params.values() for value in values)
+            if "'" in values or '"' in values:
+                status, text = 500, "<html><body>You have an error in your SQL syntax near '" + html.escape(values) + "'</body></html>"
+            else:
+                status, text = 200, "<html><body>OK</body></html>"
+        elif path == "/comment":
+            status, text = 200, f"<html><body>Thanks, {html.escape(params.get('email', [''])[0])}</body></html>"
+        elif path in PATHS:
+            status, content_type, text = PATHS[path]
+
+        content = text.encode()
+        await send({"type": "http.response.start", "status": status, "headers": HEADERS + [
+            (b"content-type", content_type.encode()), (b"content-length", str(len(content)).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": content})
+    return app
+
+
+def bind_sockets(port: int, hosts: int) -> List[socket.socket]:
+    """ One listening socket per loopback address, 127.0.0.1 to 127.0.0.<hosts>. """
+    sockets = []
+    for index in range(1, hosts + 1):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((f"127.0.0.{index}", port))
+        sockets.append(sock)
+    return sockets
+
+
+cli = typer.Typer()
+
+@cli.command()
+def serve(port: int = 8081, hosts: int = 1, latency: float = 0.0):
+    """
+    Serve the target on 127.0.0.1 to 127.0.0.<hosts>, adding `latency` seconds to every response.
+    """
+    config = uvicorn.Config(target_app(latency), log_level="warning", access_log=False, lifespan="off")
+    uvicorn.Server(config).run(sockets=bind_sockets(port, hosts))
+
+
+if __name__ == "__main__":
+    cli()
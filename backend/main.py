@@ -1,27 +1,48 @@
 import typer
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
+from typing import List, Optional
 
-from api import routes_scan, routes_reports, routes_tools
+from api import routes_scan, routes_reports, routes_tools, routes_findings, routes_stats
+from api.pagination import NEXT_CURSOR_HEADER
+from core.scan_stats import rebuild_scan_stats
 from core.queue_manager import initialize_queue
-from database.db_connect import create_db_and_tables, close_db_connection
-from utils.logger import logger
+from database.db_connect import AsyncSessionLocal, create_db_and_tables, close_db_connection
+from monitoring.metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, refresh_queue_depth, render_metrics
+from tools.live_output import get_live_output_hub
+from tools.tool_controller import get_available_tools
+from reports.pdf_renderer import get_pdf_renderer
+from utils.logger import logger, setup_logging
 from config import settings
-from worker import run_worker
 
 cli = typer.Typer()
 
+@cli.callback()
+def before_command():
+    """
+    CyberSentinel backend commands.
+    """
+    setup_logging()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Handles application startup and shutdown events.
     """
+    # Also when served as `uvicorn main:app`, without the CLI
+    setup_logging()
     logger.info("Starting up CyberSentinel backend...")
     await create_db_and_tables()
     await initialize_queue()
+    # Searched once here rather than at import time; the result is cached
+    await asyncio.to_thread(get_available_tools)
+    await get_live_output_hub().start()
     yield
     logger.info("Shutting down CyberSentinel backend...")
+    await get_live_output_hub().stop()
+    get_pdf_renderer().shutdown()
     await close_db_connection()
 
 
@@ -39,12 +60,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Response headers the frontend reads: the keyset pagination cursor and those of ranged report downloads
+    expose_headers=[NEXT_CURSOR_HEADER, "Content-Range", "Accept-Ranges", "ETag"],
 )
+# Request latency per route, outermost so it covers the other middleware too
+app.add_middleware(MetricsMiddleware)
 
 # Include API routers
 app.include_router(routes_scan.router, prefix="/api/scan", tags=["Scan"])
 app.include_router(routes_reports.router, prefix="/api/reports", tags=["Reports"])
 app.include_router(routes_tools.router, prefix="/api/tools", tags=["Tools"])
+app.include_router(routes_findings.router, prefix="/api/findings", tags=["Findings"])
+app.include_router(routes_stats.router, prefix="/api/stats", tags=["Stats"])
 
 
 @app.get("/", tags=["Health Check"])
@@ -55,6 +82,15 @@ async def read_root():
     return {"status": "CyberSentinel backend is running"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrics of the API process (see monitoring.metrics).
+    """
+    await refresh_queue_depth()
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 @cli.command()
 def run_api():
     """
@@ -62,16 +98,90 @@ def run_api():
     """
     import uvicorn
     logger.info("Starting FastAPI server...")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Behind the frontend's nginx every request comes from the proxy; the client IP (which the
+    # rate limits key on) is taken from X-Forwarded-For, but only when the peer is a trusted proxy
+    uvicorn.run(app, host="0.0.0.0", port=8000, proxy_headers=True, forwarded_allow_ips=settings.FORWARDED_ALLOW_IPS)
 
 @cli.command()
 def worker():
     """
     Run the background worker process.
     """
+    from worker import run_worker
     logger.info("Starting background worker...")
     run_worker()
 
+@cli.command()
+def backfill_findings_table(batch_size: int = 100):
+    """
+    Extract typed findings for scans completed before the findings table existed.
+    """
+    from worker import backfill_findings
+
+    async def backfill():
+        await create_db_and_tables()
+        count = await backfill_findings(batch_size)
+        await close_db_connection()
+        return count
+
+    logger.info(f"Backfilled findings for {asyncio.run(backfill())} scans.")
+
+@cli.command()
+def migrate_reports_to_store(batch_size: int = 20):
+    """
+    Move report bytes stored in Postgres into the content-addressed artifact store.
+    """
+    from worker import migrate_report_blobs
+
+    async def migrate():
+        await create_db_and_tables()
+        count = await migrate_report_blobs(batch_size)
+        await close_db_connection()
+        return count
+
+    logger.info(f"Moved {asyncio.run(migrate())} reports to the artifact store.")
+
+@cli.command()
+def rescore_scans(batch_size: int = 2000, rules_version: Optional[int] = None):
+    """
+    Recompute the risk of past scans with the current (or given) risk rules version.
+    """
+    from worker import rescore_scans as rescore
+
+    async def run():
+        await create_db_and_tables()
+        count = await rescore(batch_size, rules_version)
+        await close_db_connection()
+        return count
+
+    logger.info(f"Re-scored {asyncio.run(run())} scans.")
+
+@cli.command()
+def ingest_cve_feed(feeds: List[str]):
+    """
+    Add NVD JSON feeds (optionally gzipped) to the offline CVE index; re-ingesting only updates changed CVEs.
+    """
+    import os
+    from scanners.cve_index import CVEIndex
+
+    os.makedirs(os.path.dirname(settings.CVE_INDEX_PATH) or ".", exist_ok=True)
+    index = CVEIndex(settings.CVE_INDEX_PATH, read_only=False)
+    for feed in feeds:
+        index.ingest_feed(feed)
+
+@cli.command()
+def rebuild_dashboard_stats():
+    """
+    Recompute the dashboard rollups from the scan history (after upgrading, or if they drifted).
+    """
+    async def rebuild():
+        await create_db_and_tables()
+        async with AsyncSessionLocal() as session:
+            await rebuild_scan_stats(session)
+        await close_db_connection()
+
+    asyncio.run(rebuild())
+
 
 if __name__ == "__main__":
     cli()
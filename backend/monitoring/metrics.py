@@ -0,0 +1,207 @@
+"""
+Prometheus metrics of the API and the workers.
+
+The API serves them at /metrics. Workers have no HTTP server, so each one
+serves its own on WORKER_METRICS_PORT and/or writes them every few seconds to
+a file in WORKER_METRICS_TEXTFILE_DIR, in the text format node_exporter's
+textfile collector and the Pushgateway read.
+
+Only the standard library, prometheus_client and config are imported at module
+level, so the logging setup and the database module can use it.
+"""
+import asyncio
+import os
+import re
+import time
+from typing import Any, Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+
+from config import settings
+
+# Scans and tool runs take from seconds to hours
+LONG_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+REPORT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+QUEUE_DEPTH = Gauge("cybersentinel_queue_depth", "Scans waiting to be picked up, by queue (route).", ["queue"])
+QUEUE_WAIT = Histogram("cybersentinel_queue_wait_seconds", "Time scans spent queued before a worker took them.", buckets=LONG_BUCKETS)
+SCANS_IN_PROGRESS = Gauge("cybersentinel_scans_in_progress", "Scans this worker is running.")
+TOOL_DURATION = Histogram(
+    "cybersentinel_tool_duration_seconds", "Tool runs by tool and outcome (success, error, timeout or coalesced).",
+    ["tool", "outcome"], buckets=LONG_BUCKETS,
+)
+TOOLS_SKIPPED = Counter("cybersentinel_tools_skipped_total", "Pipeline steps skipped, by tool and reason.", ["tool", "reason"])
+HTTP_REQUEST_DURATION = Histogram(
+    "cybersentinel_http_request_duration_seconds", "API request latency until the response is sent, by route.",
+    ["method", "route", "status"],
+)
+REDIS_PUBLISHES = Counter("cybersentinel_redis_publishes_total", "Live feed messages written to Redis, by source.", ["source", "live"])
+REDIS_PUBLISH_ERRORS = Counter("cybersentinel_redis_publish_errors_total", "Live feed messages Redis failed to take, by source.", ["source"])
+REPORT_RENDER = Histogram("cybersentinel_report_render_seconds", "Time to generate and store a report, by format.", ["format"], buckets=REPORT_BUCKETS)
+DB_CONNECTS = Counter("cybersentinel_db_connects_total", "Database connections opened by the pool.")
+DB_CHECKOUTS = Counter("cybersentinel_db_checkouts_total", "Connections taken from the pool, about one per session transaction.")
+DB_CHECKOUT_DURATION = Histogram("cybersentinel_db_checkout_seconds", "How long sessions held a pooled connection.", buckets=REPORT_BUCKETS)
+
+
+def observe_queue_wait(task: Dict[str, Any]):
+    """ Records how long a dequeued task waited, if it says when it was enqueued. """
+    enqueued_at = task.get("enqueued_at")
+    if enqueued_at is not None:
+        QUEUE_WAIT.observe(max(0.0, time.time() - enqueued_at))
+
+async def refresh_queue_depth():
+    """ Reads the queue lengths from Redis into the queue depth gauge; called before each scrape. """
+    from core.queue_manager import get_queue
+
+    sizes = await get_queue().get_queue_sizes()
+    QUEUE_DEPTH.clear()
+    for queue, size in sizes.items():
+        QUEUE_DEPTH.labels(queue).set(size)
+
+def render_metrics() -> bytes:
+    return generate_latest(REGISTRY)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request, labelled with its route template
+    (e.g. /api/scan/{scan_id}) rather than the raw path. Streamed responses are
+    timed until their last chunk is sent.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router adds the matched route to the scope
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(scope["method"], template, str(status)).observe(time.perf_counter() - started)
+
+
+class _PoolCollector:
+    """ Pool occupancy, read when scraped. """
+    def __init__(self, pool):
+        self.pool = pool
+
+    def collect(self):
+        for name, description, method in (
+            ("cybersentinel_db_pool_size", "Connections the pool keeps open.", "size"),
+            ("cybersentinel_db_pool_checked_out", "Pooled connections in use by sessions.", "checkedout"),
+            ("cybersentinel_db_pool_checked_in", "Idle pooled connections.", "checkedin"),
+            ("cybersentinel_db_pool_overflow", "Connections open beyond the pool size.", "overflow"),
+        ):
+            if hasattr(self.pool, method):
+                yield GaugeMetricFamily(name, description, value=getattr(self.pool, method)())
+
+_instrumented_engine = None
+
+def instrument_engine(engine):
+    """ Adds the connection pool metrics of the (async) engine; once per process. """
+    global _instrumented_engine
+    if _instrumented_engine is not None:
+        return
+    from sqlalchemy import event
+
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        DB_CONNECTS.inc()
+
+    @event.listens_for(sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_CHECKOUTS.inc()
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            DB_CHECKOUT_DURATION.observe(time.perf_counter() - checked_out_at)
+
+    REGISTRY.register(_PoolCollector(sync_engine.pool))
+    _instrumented_engine = engine
+
+
+def with_label(exposition: str, name: str, value: str) -> str:
+    """ Adds a label to every sample of a text exposition, so files of several workers don't clash. """
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    label = f'{name}="{escaped}"'
+    lines = []
+    for line in exposition.splitlines():
+        if line and not line.startswith("#"):
+            metric, brace, rest = line.partition("{")
+            if brace:
+                line = f"{metric}{{{label},{rest}"
+            else:
+                metric, _, rest = line.partition(" ")
+                line = f"{metric}{{{label}}} {rest}"
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+class WorkerMetricsExporter:
+    """
+    Exposes a worker's metrics: on an HTTP port of its own, and/or as a text
+    file rewritten every WORKER_METRICS_TEXTFILE_INTERVAL seconds. Each worker
+    writes its own file, with a `worker` label on every sample.
+    """
+    def __init__(self, worker_id: str, port: int = settings.WORKER_METRICS_PORT,
+                 textfile_dir: str = settings.WORKER_METRICS_TEXTFILE_DIR,
+                 interval: float = settings.WORKER_METRICS_TEXTFILE_INTERVAL):
+        self.worker_id = worker_id
+        self.port = port
+        self.textfile_path = os.path.join(textfile_dir, f"cybersentinel_worker_{re.sub(r'[^A-Za-z0-9_.-]', '_', worker_id)}.prom") if textfile_dir else None
+        self.interval = interval
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        from utils.logger import logger
+
+        if self.port:
+            try:
+                start_http_server(self.port)
+                logger.info(f"Worker metrics served on port {self.port}.")
+            except OSError as e:
+                # Typically another worker on this host has the port; it can use the text file instead
+                logger.warning(f"Could not serve worker metrics on port {self.port}: {e}")
+        if self.textfile_path:
+            os.makedirs(os.path.dirname(self.textfile_path), exist_ok=True)
+            self._writer = asyncio.create_task(self._write_periodically())
+
+    def write_textfile(self):
+        exposition = with_label(render_metrics().decode(), "worker", self.worker_id)
+        # Written aside and renamed, so a collector never reads half a file
+        temporary = f"{self.textfile_path}.tmp"
+        with open(temporary, "w") as f:
+            f.write(exposition)
+        os.replace(temporary, self.textfile_path)
+
+    async def _write_periodically(self):
+        while True:
+            await asyncio.to_thread(self.write_textfile)
+            await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        if self._writer is not None:
+            self._writer.cancel()
+            # A stopped worker's file would otherwise be collected forever
+            try:
+                os.remove(self.textfile_path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,114 @@
+import asyncio
+import contextvars
+import resource
+import time
+from typing import Any, Dict, List, Optional
+
+import psutil
+
+from config import settings
+
+# The usage record of the tool currently running in this task (and the tasks it spawns)
+_current_usage: contextvars.ContextVar[Optional["ToolUsage"]] = contextvars.ContextVar("tool_usage", default=None)
+
+
+class ToolUsage:
+    """
+    Resource usage of a single tool run. Field names match the ScanResult columns.
+    """
+    def __init__(self):
+        self.wall_time: float = 0.0
+        self.wait_time: float = 0.0
+        self.cpu_user_time: float = 0.0
+        self.cpu_system_time: float = 0.0
+        self.peak_rss_bytes: int = 0
+        self.output_bytes: int = 0
+        self.http_requests: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "wall_time": round(self.wall_time, 3),
+            "wait_time": round(self.wait_time, 3),
+            "cpu_user_time": round(self.cpu_user_time, 3),
+            "cpu_system_time": round(self.cpu_system_time, 3),
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "output_bytes": self.output_bytes,
+            "http_requests": self.http_requests,
+        }
+
+
+def record_wait(seconds: float):
+    """ Adds time spent waiting for a shared run or a slot to the current tool's usage. """
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.wait_time += seconds
+
+def record_output_bytes(count: int):
+    """ Adds bytes of tool output read to the current tool's usage. """
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.output_bytes += count
+
+async def _count_http_request(request):
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.http_requests += 1
+
+def http_event_hooks() -> Dict[str, List[Any]]:
+    """
+    Event hooks for httpx.AsyncClient that count requests made by Python testers.
+    """
+    return {"request": [_count_http_request]}
+
+
+class ToolUsageTracker:
+    """
+    Async context manager that measures one tool run.
+
+    Child CPU time comes from the RUSAGE_CHILDREN delta, which is exact as long as
+    the worker runs one tool at a time. Peak RSS is the larger of the sampled RSS of
+    the live child process tree and the children's ru_maxrss, if that grew during
+    the run (short-lived children can finish between samples).
+    """
+    def __init__(self, sample_interval: float = settings.TOOL_USAGE_SAMPLE_INTERVAL):
+        self.usage = ToolUsage()
+        self.sample_interval = sample_interval
+        self._token: Optional[contextvars.Token] = None
+        self._sampler: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> ToolUsage:
+        self._token = _current_usage.set(self.usage)
+        self._rusage_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self._started = time.monotonic()
+        self._sampler = asyncio.create_task(self._sample_rss())
+        return self.usage
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._sampler.cancel()
+        try:
+            await self._sampler
+        except asyncio.CancelledError:
+            pass
+
+        rusage_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.usage.wall_time = time.monotonic() - self._started
+        self.usage.cpu_user_time = rusage_end.ru_utime - self._rusage_start.ru_utime
+        self.usage.cpu_system_time = rusage_end.ru_stime - self._rusage_start.ru_stime
+        if rusage_end.ru_maxrss > self._rusage_start.ru_maxrss:
+            # ru_maxrss is reported in kilobytes on Linux
+            self.usage.peak_rss_bytes = max(self.usage.peak_rss_bytes, rusage_end.ru_maxrss * 1024)
+
+        _current_usage.reset(self._token)
+        return False
+
+    async def _sample_rss(self):
+        current = psutil.Process()
+        while True:
+            rss = 0
+            for child in current.children(recursive=True):
+                try:
+                    rss += child.memory_info().rss
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+            self.usage.peak_rss_bytes = max(self.usage.peak_rss_bytes, rss)
+            await asyncio.sleep(self.sample_interval)
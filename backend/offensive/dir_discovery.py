@@ -1,15 +1,22 @@
-import asyncio
 import re
 import os
 from typing import Dict, Any, List, Optional
 from utils.logger import logger
-from utils.helpers import run_command, validate_tool_path # Import validate_tool_path
+from utils.helpers import validate_tool_path
+from tools.command_runner import run_command
+from tools.target_governor import GovernorSlot, classify_exit
 from config import settings
 
+PATH_PATTERN = re.compile(r"(\d{3})\s+[\d.]+\w\s+-\s+(http.*)")
+# Responses telling us to slow down
+THROTTLED_STATUSES = (429, 503)
+
 class DirectoryDiscovery:
-    def __init__(self, target: str, scan_id: Optional[str] = None):
+    def __init__(self, target: str, scan_id: Optional[str] = None, slot: Optional[GovernorSlot] = None):
         self.target = self._ensure_scheme(target)
         self.scan_id = scan_id
+        self.slot = slot
+        self.throttled = False
         # In a real app, provide options for different wordlists
         self.wordlist_path = settings.DIRSEARCH_DEFAULT_WORDLIST
 
@@ -35,47 +42,61 @@ class DirectoryDiscovery:
         try:
             validate_tool_path(settings.DIRSEARCH_PATH, "Dirsearch")
             logger.info("Using dirsearch for directory discovery.", extra={"scan_id": self.scan_id})
-            command = f"{settings.DIRSEARCH_PATH} -u {self.target} -w {self.wordlist_path} -e php,html,js,txt --plain-text-report=-"
-            stdout, stderr = await run_command(command)
-            if stderr:
-                logger.warning(f"Dirsearch produced stderr output: {stderr}", extra={"scan_id": self.scan_id})
-            return self._parse_dirsearch_results(stdout)
+            command = [
+                settings.DIRSEARCH_PATH,
+                "-u", self.target,
+                "-w", self.wordlist_path,
+                "-e", "php,html,js,txt",
+                "--plain-text-report=-",
+            ]
+            if self.slot is not None:
+                command += ["-t", str(self.slot.concurrency), "--max-rate", str(max(1, int(self.slot.rate)))]
+            discovered_paths: List[Dict[str, Any]] = []
+            outcome = await run_command(
+                command,
+                scan_id=self.scan_id,
+                tool_name="dir_discovery",
+                on_stdout=lambda line: self._parse_line(line, discovered_paths),
+                timeout=settings.DIRSEARCH_TIMEOUT,
+            )
+            if outcome.stderr:
+                logger.warning(f"Dirsearch produced stderr output: {outcome.stderr}", extra={"scan_id": self.scan_id})
+            logger.info(f"Directory discovery finished. Found {len(discovered_paths)} interesting paths.", extra={"scan_id": self.scan_id})
+            if self.slot is not None:
+                self.slot.report(classify_exit(outcome.returncode, outcome.timed_out, self.throttled))
+            results: Dict[str, Any] = {"discovered_paths": discovered_paths}
+            # The paths found so far are kept, but marked as incomplete
+            if outcome.timed_out:
+                results["error"] = f"dirsearch did not finish within {settings.DIRSEARCH_TIMEOUT} seconds."
+            elif outcome.truncated:
+                results["error"] = "dirsearch output was cut short (output cap reached)."
+            return results
         except Exception as e:
             logger.error(f"Directory discovery failed with dirsearch: {e}", extra={"scan_id": self.scan_id})
             return {"error": "Directory discovery tool failed to run."}
 
-    def _parse_dirsearch_results(self, scan_output: str) -> Dict[str, Any]:
-        discovered_paths: List[Dict[str, Any]] = []
-        path_pattern = re.compile(r"(\d{3})\s+[\d.]+\w\s+-\s+(http.*)")
-        for line in scan_output.splitlines():
-            if not line.strip() or line.startswith('#'):
-                continue
-            match = path_pattern.search(line)
-            if match:
-                status_code = int(match.group(1))
-                path = match.group(2).strip()
-                if 200 <= status_code < 400:
-                    discovered_paths.append({"path": path, "status": status_code})
-        logger.info(f"Directory discovery finished. Found {len(discovered_paths)} interesting paths.", extra={"scan_id": self.scan_id})
-        return {"discovered_paths": discovered_paths}
-
+    def _parse_line(self, line: str, discovered_paths: List[Dict[str, Any]]):
+        """
+        Incrementally parses a single line of dirsearch output.
+        """
+        if not line.strip() or line.startswith('#'):
+            return
+        match = PATH_PATTERN.search(line)
+        if match:
+            status_code = int(match.group(1))
+            if status_code in THROTTLED_STATUSES:
+                self.throttled = True
+            if 200 <= status_code < 400:
+                discovered_paths.append({"path": match.group(2).strip(), "status": status_code})
 
     def _parse_dirsearch_results(self, scan_output: str) -> Dict[str, Any]:
         discovered_paths: List[Dict[str, Any]] = []
-        path_pattern = re.compile(r"(\d{3})\s+[\d.]+\w\s+-\s+(http.*)")
         for line in scan_output.splitlines():
-            if not line.strip() or line.startswith('#'):
-                continue
-            match = path_pattern.search(line)
-            if match:
-                status_code = int(match.group(1))
-                path = match.group(2).strip()
-                if 200 <= status_code < 400:
-                    discovered_paths.append({"path": path, "status": status_code})
+            self._parse_line(line, discovered_paths)
         logger.info(f"Directory discovery finished. Found {len(discovered_paths)} interesting paths.", extra={"scan_id": self.scan_id})
         return {"discovered_paths": discovered_paths}
 
 
-async def run_dir_discovery(target: str, scan_id: Optional[str] = None) -> Dict[str, Any]:
-    discoverer = DirectoryDiscovery(target, scan_id)
+async def run_dir_discovery(target: str, scan_id: Optional[str] = None, slot: Optional[GovernorSlot] = None) -> Dict[str, Any]:
+    discoverer = DirectoryDiscovery(target, scan_id, slot)
     return await discoverer.discover()
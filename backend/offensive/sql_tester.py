@@ -4,6 +4,8 @@ from typing import Dict, Any, List, Set, Optional
 from urllib.parse import urljoin, urlparse
 
 from utils.logger import logger
+from monitoring.tool_usage import http_event_hooks
+from tools.governed_http import governed_client
 
 class SQLTester:
     def __init__(self, url: str, scan_id: Optional[str] = None):
@@ -27,7 +29,7 @@ class SQLTester:
         vulnerable_forms: List[Dict[str, str]] = []
 
         try:
-            async with httpx.AsyncClient(verify=False, follow_redirects=True) as client:
+            async with governed_client(verify=False, follow_redirects=True, event_hooks=http_event_hooks()) as client:
                 response = await client.get(self.url)
                 soup = BeautifulSoup(response.text, "html.parser")
                 forms = soup.find_all("form")
@@ -8,15 +8,21 @@ import shutil # Import shutil for rmtree
 
 from config import settings
 from tools.subprocess_stream import SubprocessStreamer
+from tools.target_governor import GovernorSlot, classify_exit
 from utils.logger import logger
 
+# sqlmap's summary of HTTP errors, e.g. "429 (Too Many Requests) - 12 times"
+THROTTLED_MARKERS = ("429 (Too Many Requests)", "503 (Service Unavailable)")
+
 class SQLMapScanner:
-    def __init__(self, target: str, level: int = 1, risk: int = 1, aggressive: bool = False, scan_id: Optional[str] = None):
+    def __init__(self, target: str, level: int = 1, risk: int = 1, aggressive: bool = False, scan_id: Optional[str] = None,
+                 slot: Optional[GovernorSlot] = None):
         self.target = target
         self.level = level
         self.risk = risk
         self.aggressive = aggressive
         self.scan_id = scan_id
+        self.slot = slot
         self.output_dir = tempfile.mkdtemp(prefix="sqlmap_")
         self.command = self._build_command()
 
@@ -32,17 +38,23 @@ class SQLMapScanner:
             f"--risk={self.risk}",
         ]
 
+        threads = 10 if self.aggressive else 4
+        if self.slot is not None:
+            # --delay applies to each thread's requests
+            threads = min(threads, self.slot.concurrency)
+            cmd.append(f"--delay={self.slot.delay(threads):.3f}")
+
         if not self.aggressive:
             cmd.extend([
                 "--dbms-fingerprint",
                 "--no-cast",
-                "--threads=4",
+                f"--threads={threads}",
             ])
         else: # Aggressive mode
              cmd.extend([
                 "--all", # This is very noisy and can be dangerous
                 "--random-agent",
-                "--threads=10",
+                f"--threads={threads}",
              ])
         
         return cmd
@@ -57,8 +69,12 @@ class SQLMapScanner:
         try:
             # Stream output for live feedback, but we will parse the JSON file for results
             streamer = SubprocessStreamer(self.command)
+            throttled = False
             async for line in streamer.start():
                 logger.debug(f"SQLMap output: {line}", extra={"scan_id": self.scan_id})
+                throttled = throttled or any(marker in line for marker in THROTTLED_MARKERS)
+            if self.slot is not None:
+                self.slot.report(classify_exit(streamer.process.returncode if streamer.process else None, throttled=throttled))
 
             # After command finishes, parse the JSON file for results
             result_file = self._find_json_result()
@@ -140,9 +156,9 @@ class SQLMapScanner:
             logger.error(f"Failed to clean up temporary directory {self.output_dir}: {e}", extra={"scan_id": self.scan_id})
 
 
-async def run_sqlmap_scan(target: str, aggressive: bool = False, scan_id: Optional[str] = None) -> Dict[str, Any]:
+async def run_sqlmap_scan(target: str, aggressive: bool = False, scan_id: Optional[str] = None, slot: Optional[GovernorSlot] = None) -> Dict[str, Any]:
     """
     High-level function to run a SQLMap scan.
     """
-    scanner = SQLMapScanner(target, aggressive=aggressive, scan_id=scan_id)
+    scanner = SQLMapScanner(target, aggressive=aggressive, scan_id=scan_id, slot=slot)
     return await scanner.scan()
@@ -4,13 +4,15 @@ import re
 
 from config import settings
 from tools.subprocess_stream import SubprocessStreamer
+from tools.target_governor import GovernorSlot, classify_exit
 from utils.logger import logger
 
 class XSSerScanner:
-    def __init__(self, target: str, aggressive: bool = False, scan_id: Optional[str] = None):
+    def __init__(self, target: str, aggressive: bool = False, scan_id: Optional[str] = None, slot: Optional[GovernorSlot] = None):
         self.target = target
         self.aggressive = aggressive
         self.scan_id = scan_id
+        self.slot = slot
         self.command = self._build_command()
 
     def _build_command(self) -> List[str]:
@@ -36,6 +38,13 @@ class XSSerScanner:
                 "--XSS", # Check for XSS in every link
                 "--DS", # Check for DOM XSS
              ])
+
+        if self.slot is not None:
+            cmd.append(f"--threads={self.slot.concurrency}")
+            # XSSer only takes whole seconds, so the delay only kicks in once the rate drops below one per thread
+            delay = int(self.slot.delay(self.slot.concurrency))
+            if delay:
+                cmd.append(f"--delay={delay}")
         
         return cmd
 
@@ -55,6 +64,8 @@ class XSSerScanner:
                 if parsed_line:
                     found_vulns.append(parsed_line)
                     logger.debug(f"XSSer found: {parsed_line}", extra={"scan_id": self.scan_id})
+            if self.slot is not None:
+                self.slot.report(classify_exit(streamer.process.returncode if streamer.process else None))
 
             summary = f"XSSer scan completed. Found {len(found_vulns)} potential vulnerabilities."
             logger.info(summary, extra={"scan_id": self.scan_id})
@@ -91,9 +102,9 @@ class XSSerScanner:
         return None
 
 
-async def run_xsser_scan(target: str, aggressive: bool = False, scan_id: Optional[str] = None) -> Dict[str, Any]:
+async def run_xsser_scan(target: str, aggressive: bool = False, scan_id: Optional[str] = None, slot: Optional[GovernorSlot] = None) -> Dict[str, Any]:
     """
     High-level function to run an XSSer scan.
     """
-    scanner = XSSerScanner(target, aggressive=aggressive, scan_id=scan_id)
+    scanner = XSSerScanner(target, aggressive=aggressive, scan_id=scan_id, slot=slot)
     return await scanner.scan()
@@ -4,6 +4,8 @@ from typing import Dict, Any, List, Optional
 from urllib.parse import urljoin, urlparse, unquote
 
 from utils.logger import logger
+from monitoring.tool_usage import http_event_hooks
+from tools.governed_http import governed_client
 
 class XSSTester:
     def __init__(self, url: str, scan_id: Optional[str] = None):
@@ -23,7 +25,7 @@ class XSSTester:
         vulnerable_points: List[Dict[str, str]] = []
 
         try:
-            async with httpx.AsyncClient(verify=False, follow_redirects=True) as client:
+            async with governed_client(verify=False, follow_redirects=True, event_hooks=http_event_hooks()) as client:
                 # 1. Test URL parameters
                 if await self._test_url_parameters(client):
                     vulnerable_points.append({"type": "URL Parameter", "location": self.url})
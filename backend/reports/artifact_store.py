@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+import os
+import tempfile
+from typing import AsyncIterator, Dict, Iterable, Optional, Type
+
+import aiofiles
+
+from config import settings
+from schemas import Report
+from utils.compression import compress_chunks
+from utils.logger import logger
+
+
+class StoredArtifact:
+    """
+    Where an artifact ended up. `path` is the store-relative key saved in the DB.
+    """
+    def __init__(self, digest: str, size: int, path: str):
+        self.digest = digest
+        self.size = size
+        self.path = path
+
+
+class ArtifactStore(ABC):
+    """
+    Content-addressed storage for report bytes.
+
+    Artifacts are keyed by the SHA-256 of their content, so storing identical
+    bytes twice keeps a single copy. Backends implement `_write`, `exists` and
+    `iter_bytes`; those with files on local disk also return a path from
+    `local_path` so downloads can be served with sendfile.
+    """
+    @classmethod
+    def from_settings(cls) -> "ArtifactStore":
+        return cls()
+
+    def key_for(self, digest: str) -> str:
+        return f"{digest[:2]}/{digest[2:4]}/{digest}"
+
+    async def put(self, data: bytes) -> StoredArtifact:
+        digest = hashlib.sha256(data).hexdigest()
+        key = self.key_for(digest)
+        if not await self.exists(key):
+            await self._write(key, data)
+        else:
+            logger.debug(f"Artifact {digest} already stored, reusing it.")
+        return StoredArtifact(digest, len(data), key)
+
+    async def put_chunks(self, chunks: Iterable[bytes]) -> StoredArtifact:
+        """
+        Stores an artifact produced piece by piece. Backends that can write
+        incrementally override this; the default collects the chunks first.
+        """
+        return await self.put(b"".join(chunks))
+
+    @abstractmethod
+    async def _write(self, key: str, data: bytes):
+        ...
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+    @abstractmethod
+    def iter_bytes(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Yields the artifact's bytes from `start` up to and including `end`.
+        """
+
+    async def read(self, key: str) -> bytes:
+        return b"".join([chunk async for chunk in self.iter_bytes(key)])
+
+
+class LocalArtifactStore(ArtifactStore):
+    """
+    Stores artifacts as files under a root directory (`ab/cd/<digest>`).
+    """
+    def __init__(self, root: str, chunk_size: int = 256 * 1024):
+        self.root = root
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_settings(cls) -> "LocalArtifactStore":
+        return cls(settings.REPORT_STORE_DIR)
+
+    def local_path(self, key: str) -> Optional[str]:
+        return os.path.join(self.root, key)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self.local_path(key))
+
+    async def _write(self, key: str, data: bytes):
+        await asyncio.to_thread(self._write_atomically, self.local_path(key), data)
+
+    @staticmethod
+    def _write_atomically(path: str, data: bytes):
+        # Write to a temporary file next to the target and rename it, so readers
+        # never see a partial artifact and concurrent writers of the same content can't clash
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    async def put_chunks(self, chunks: Iterable[bytes]) -> StoredArtifact:
+        # Producing the chunks (serializing, compressing) happens in the thread as well
+        return await asyncio.to_thread(self._write_chunks, chunks)
+
+    def _write_chunks(self, chunks: Iterable[bytes]) -> StoredArtifact:
+        # The digest is only known at the end, so write to a temporary file and rename it
+        temp_dir = os.path.join(self.root, ".tmp")
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        digest, size = hashlib.sha256(), 0
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    temp_file.write(chunk)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+
+            key = self.key_for(digest.hexdigest())
+            path = self.local_path(key)
+            if os.path.exists(path):
+                logger.debug(f"Artifact {digest.hexdigest()} already stored, reusing it.")
+                os.unlink(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+            return StoredArtifact(digest.hexdigest(), size, key)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    async def iter_bytes(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        remaining = None if end is None else end - start + 1
+        async with aiofiles.open(self.local_path(key), "rb") as artifact:
+            await artifact.seek(start)
+            while remaining is None or remaining > 0:
+                chunk = await artifact.read(self.chunk_size if remaining is None else min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+
+# Available backends by REPORT_STORE_BACKEND name; other backends register themselves here
+ARTIFACT_STORE_BACKENDS: Dict[str, Type[ArtifactStore]] = {
+    "local": LocalArtifactStore,
+}
+
+# Singleton instance
+_artifact_store: Optional[ArtifactStore] = None
+
+def get_artifact_store() -> ArtifactStore:
+    """
+    Returns a singleton instance of the configured report ArtifactStore.
+    """
+    global _artifact_store
+    if _artifact_store is None:
+        backend = ARTIFACT_STORE_BACKENDS.get(settings.REPORT_STORE_BACKEND)
+        if backend is None:
+            raise ValueError(f"Unknown REPORT_STORE_BACKEND: {settings.REPORT_STORE_BACKEND}")
+        _artifact_store = backend.from_settings()
+    return _artifact_store
+
+async def store_report_content(report: Report, content: bytes) -> Report:
+    """
+    Writes the report bytes to the artifact store and points the report at them.
+    """
+    stored = await get_artifact_store().put(content)
+    report.content_digest = stored.digest
+    report.content_size = stored.size
+    report.content_path = stored.path
+    report.content_encoding = None
+    report.content_blob = None
+    return report
+
+async def store_report_stream(report: Report, chunks: Iterable[bytes], encoding: Optional[str] = None) -> Report:
+    """
+    Streams report bytes, optionally compressed ("gzip" or "zstd"), into the
+    artifact store and points the report at them.
+    """
+    stored = await get_artifact_store().put_chunks(compress_chunks(chunks, encoding))
+    report.content_digest = stored.digest
+    report.content_size = stored.size
+    report.content_path = stored.path
+    report.content_encoding = encoding
+    report.content_blob = None
+    return report
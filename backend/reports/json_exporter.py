@@ -1,9 +1,27 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
+
+import orjson
 
 from utils.logger import logger
-from utils.helpers import get_timestamp, to_json
+from utils.helpers import get_timestamp
+
+# Report formats the exporter can stream, with their media types
+EXPORT_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+def _dumps(data: Any) -> bytes:
+    # Anything orjson can't serialize natively is written as its string form
+    return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
 
 class JSONExporter:
+    """
+    Streams a scan report as JSON or NDJSON.
+
+    Output is produced piece by piece (one tool result, or one finding, at a
+    time), so the full serialized report never has to exist in memory.
+    """
     def __init__(self, scan_id: str, target: str, results: List[Dict[str, Any]], risk_assessment: Dict[str, Any]):
         self.scan_id = scan_id
         self.target = target
@@ -11,32 +29,59 @@ class JSONExporter:
         self.risk_assessment = risk_assessment
         self.timestamp = get_timestamp()
 
-    def export(self) -> str:
+    def _metadata(self) -> Dict[str, Any]:
+        return {
+            "scan_id": self.scan_id,
+            "target": self.target,
+            "timestamp": self.timestamp,
+        }
+
+    def iter_json(self) -> Iterator[bytes]:
         """
-        Generates a JSON report from the scan data.
+        Yields the report as one compact JSON document:
+        {"scan_metadata": ..., "risk_summary": ..., "scan_results": [...]}
         """
-        logger.info(f"Generating JSON report for scan ID: {self.scan_id}")
-        
-        report = {
-            "scan_metadata": {
-                "scan_id": self.scan_id,
-                "target": self.target,
-                "timestamp": self.timestamp,
-            },
-            "risk_summary": self.risk_assessment,
-            "scan_results": self.results
-        }
-        
-        try:
-            # Use a custom default to handle non-serializable objects gracefully
-            return to_json(report)
-        except TypeError as e:
-            logger.error(f"Error serializing report to JSON: {e}")
-            return to_json({"error": "Failed to generate JSON report due to serialization error."})
-
-def generate_json_report(scan_id: str, target: str, results: List[Dict[str, Any]], risk_assessment: Dict[str, Any]) -> str:
+        yield b'{"scan_metadata":' + _dumps(self._metadata()) + b',"risk_summary":' + _dumps(self.risk_assessment) + b',"scan_results":['
+        for index, result in enumerate(self.results):
+            yield (b"," if index else b"") + _dumps(result)
+        yield b"]}"
+
+    def iter_ndjson(self) -> Iterator[bytes]:
+        """
+        Yields the report as newline-delimited JSON: a metadata line, a risk summary
+        line, then per tool a "tool_result" line followed by one "finding" line per
+        finding (list-valued findings get one line per entry).
+        """
+        yield _dumps({"type": "scan_metadata", **self._metadata()}) + b"\n"
+        yield _dumps({"type": "risk_summary", **self.risk_assessment}) + b"\n"
+        for result in self.results:
+            tool_name = result.get("tool_name", "unknown")
+            yield _dumps({
+                "type": "tool_result",
+                "tool_name": tool_name,
+                "error": result.get("error"),
+                "coalesced_from": result.get("coalesced_from"),
+                "usage": result.get("usage"),
+            }) + b"\n"
+            findings = result.get("findings") or {}
+            for key, value in findings.items():
+                if isinstance(value, list):
+                    for index, item in enumerate(value):
+                        yield _dumps({"type": "finding", "tool_name": tool_name, "key": key, "index": index, "value": item}) + b"\n"
+                else:
+                    yield _dumps({"type": "finding", "tool_name": tool_name, "key": key, "value": value}) + b"\n"
+
+    def iter_chunks(self, report_format: str) -> Iterator[bytes]:
+        logger.info(f"Generating {report_format.upper()} report for scan ID: {self.scan_id}")
+        if report_format == "ndjson":
+            return self.iter_ndjson()
+        if report_format == "json":
+            return self.iter_json()
+        raise ValueError(f"Unsupported report format: {report_format}")
+
+def generate_json_report(scan_id: str, target: str, results: List[Dict[str, Any]], risk_assessment: Dict[str, Any], report_format: str = "json") -> Iterator[bytes]:
     """
-    High-level function to generate a JSON report.
+    High-level function to stream a JSON or NDJSON report.
     """
     exporter = JSONExporter(scan_id, target, results, risk_assessment)
-    return exporter.export()
+    return exporter.iter_chunks(report_format)
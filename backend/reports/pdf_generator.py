@@ -1,108 +1,67 @@
-import weasyprint
-import asyncio
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-from typing import List, Dict, Any
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
+from collections.abc import Mapping
+from itertools import islice
+from typing import List, Dict, Any, Optional, Tuple
 import os
 
+from config import settings
 from utils.logger import logger
 from utils.helpers import get_timestamp
 
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
+
+# Compiled once per process, on first use
+_jinja_env: Optional[Environment] = None
+
+def get_report_template() -> Template:
+    """
+    Returns the compiled report template. Jinja keeps it cached in memory after the first load.
+    """
+    global _jinja_env
+    if _jinja_env is None:
+        _jinja_env = Environment(
+            loader=FileSystemLoader(TEMPLATE_DIR),
+            autoescape=select_autoescape(['html', 'xml']),
+            auto_reload=False,
+        )
+    return _jinja_env.get_template("report.html")
+
+
+def _format_label(key: Any) -> str:
+    return str(key).replace('_', ' ').title()
+
+def _format_value(value: Any) -> str:
+    """
+    One compact line per value; long values are cut at PDF_MAX_VALUE_CHARS.
+    """
+    if isinstance(value, Mapping):
+        text = ", ".join(f"{key}: {item}" for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        text = ", ".join(str(item) for item in value)
+    else:
+        text = str(value)
+    if len(text) > settings.PDF_MAX_VALUE_CHARS:
+        text = text[:settings.PDF_MAX_VALUE_CHARS] + "..."
+    return text
+
+
 class PDFGenerator:
-    def __init__(self, scan_id: str, target: str, results: List[Dict[str, Any]], risk_assessment: Dict[str, Any]):
+    """
+    Renders the PDF report for a scan.
+
+    Findings are laid out per tool. Each list shows at most PDF_SECTION_MAX_ITEMS
+    entries inline; longer lists (tens of thousands of discovered paths, for
+    example) continue in an appendix at the end of the report, itself capped at
+    PDF_APPENDIX_MAX_ITEMS entries. Only the entries that are shown get formatted.
+    """
+    def __init__(self, scan_id: str, target: str, results: List[Dict[str, Any]], risk_assessment: Dict[str, Any], timestamp: Optional[str] = None):
         self.scan_id = scan_id
         self.target = target
         self.results = results
         self.risk_assessment = risk_assessment
-        self.timestamp = get_timestamp()
-        
-        # Setup Jinja2 environment
-        # In a real app, templates would be in a dedicated 'templates' folder
-        template_dir = os.path.dirname(__file__)
-        self.jinja_env = Environment(
-            loader=FileSystemLoader(template_dir),
-            autoescape=select_autoescape(['html', 'xml'])
-        )
-
-    def _create_html_template(self):
-        """ Creates a basic HTML template file for the report. """
-        template_string = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>CyberSentinel Scan Report</title>
-            <style>
-                body { font-family: sans-serif; margin: 2em; color: #333; }
-                h1, h2, h3 { color: #1a237e; border-bottom: 2px solid #1a237e; padding-bottom: 5px; }
-                h1 { font-size: 2.5em; text-align: center; margin-bottom: 1em; }
-                h2 { font-size: 1.8em; margin-top: 1.5em; }
-                .summary { background-color: #e8eaf6; padding: 1.5em; border-radius: 8px; margin-bottom: 2em; }
-                .risk-score { text-align: center; }
-                .risk-score .score { font-size: 4em; font-weight: bold; color: {{ risk_color }}; }
-                .risk-score .severity { font-size: 1.5em; color: {{ risk_color }}; }
-                .metadata { word-wrap: break-word; }
-                .tool-section { margin-top: 1.5em; border: 1px solid #ccc; border-radius: 8px; overflow: hidden; }
-                .tool-header { background-color: #3f51b5; color: white; padding: 10px; font-size: 1.2em; }
-                .tool-content { padding: 15px; }
-                pre { background-color: #f5f5f5; padding: 10px; border-radius: 5px; white-space: pre-wrap; word-wrap: break-word; }
-                ul { padding-left: 20px; }
-                li { margin-bottom: 0.5em; }
-            </style>
-        </head>
-        <body>
-            <h1>CyberSentinel Scan Report</h1>
-            <div class="summary">
-                <h2>Executive Summary</h2>
-                <div class="metadata">
-                    <p><strong>Target:</strong> {{ target }}</p>
-                    <p><strong>Scan ID:</strong> {{ scan_id }}</p>
-                    <p><strong>Timestamp:</strong> {{ timestamp }}</p>
-                </div>
-                <div class="risk-score">
-                    <div class="score">{{ risk_assessment.total_risk_score }}</div>
-                    <div class="severity">{{ risk_assessment.severity }}</div>
-                </div>
-            </div>
-
-            <h2>Technical Findings</h2>
-            {% for result in results %}
-            <div class="tool-section">
-                <div class="tool-header">{{ result.tool_name | title | replace('_', ' ') }}</div>
-                <div class="tool-content">
-                    {% if result.error %}
-                        <p><strong>Error:</strong> {{ result.error }}</p>
-                    {% elif result.findings %}
-                        <ul>
-                        {% for key, value in result.findings.items() %}
-                           <li><strong>{{ key | title | replace('_', ' ') }}:</strong>
-                           {% if value is mapping %}
-                                <ul>
-                                {% for sub_key, sub_value in value.items() %}
-                                    <li><strong>{{ sub_key | title }}:</strong> <pre>{{ sub_value | tojson(indent=2) }}</pre></li>
-                                {% endfor %}
-                                </ul>
-                           {% elif value is iterable and value is not string %}
-                                <ul>
-                                {% for item in value %}
-                                    <li><pre>{{ item }}</pre></li>
-                                {% endfor %}
-                                </ul>
-                           {% else %}
-                                <pre>{{ value }}</pre>
-                           {% endif %}
-                           </li>
-                        {% endfor %}
-                        </ul>
-                    {% else %}
-                        <p>No findings for this tool.</p>
-                    {% endif %}
-                </div>
-            </div>
-            {% endfor %}
-        </body>
-        </html>
-        """
-        with open(os.path.join(os.path.dirname(__file__), "report_template.html"), "w") as f:
-            f.write(template_string)
+        self.timestamp = timestamp or get_timestamp()
+        self.section_max_items = settings.PDF_SECTION_MAX_ITEMS
+        self.appendix_max_items = settings.PDF_APPENDIX_MAX_ITEMS
 
     def _get_risk_color(self, severity: str) -> str:
         return {
@@ -112,39 +71,75 @@ class PDFGenerator:
             "Low": "#388e3c",
         }.get(severity, "#757575")
 
+    def _build_sections(self) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        sections: List[Dict[str, Any]] = []
+        appendices: List[Dict[str, Any]] = []
+
+        for result in self.results:
+            tool_title = _format_label(result.get("tool_name", "unknown"))
+            findings = result.get("findings") or {}
+            fields = []
+            for key, value in (findings.items() if isinstance(findings, Mapping) else [("findings", findings)]):
+                label = _format_label(key)
+                if isinstance(value, Mapping):
+                    fields.append({
+                        "label": label,
+                        "kind": "mapping",
+                        "entries": [(_format_label(sub_key), _format_value(sub_value)) for sub_key, sub_value in value.items()],
+                    })
+                elif isinstance(value, (list, tuple)):
+                    field = {
+                        "label": label,
+                        "kind": "list",
+                        "lines": [_format_value(item) for item in islice(value, self.section_max_items)],
+                        "total": len(value),
+                        "appendix": None,
+                    }
+                    if len(value) > self.section_max_items:
+                        name = f"Appendix {len(appendices) + 1}"
+                        field["appendix"] = name
+                        shown = value[self.section_max_items:self.section_max_items + self.appendix_max_items]
+                        appendices.append({
+                            "name": name,
+                            "title": f"{tool_title} - {label}",
+                            "lines": [_format_value(item) for item in shown],
+                            "omitted": max(0, len(value) - self.section_max_items - self.appendix_max_items),
+                        })
+                    fields.append(field)
+                else:
+                    fields.append({"label": label, "kind": "scalar", "value": _format_value(value)})
+
+            sections.append({"title": tool_title, "error": result.get("error"), "fields": fields})
+        return sections, appendices
+
+    def render_html(self) -> str:
+        sections, appendices = self._build_sections()
+        return get_report_template().render(
+            scan_id=self.scan_id,
+            target=self.target,
+            timestamp=self.timestamp,
+            sections=sections,
+            appendices=appendices,
+            risk_assessment=self.risk_assessment,
+            risk_color=self._get_risk_color(self.risk_assessment.get("severity", "Low")),
+        )
+
     def generate(self) -> bytes:
         logger.info(f"Generating PDF report for scan ID: {self.scan_id}")
-        self._create_html_template()
-        template = self.jinja_env.get_template("report_template.html")
-        
-        render_context = {
-            "scan_id": self.scan_id,
-            "target": self.target,
-            "timestamp": self.timestamp,
-            "results": self.results,
-            "risk_assessment": self.risk_assessment,
-            "risk_color": self._get_risk_color(self.risk_assessment.get("severity", "Low"))
-        }
-
-        html_out = template.render(render_context)
-        
+        # Imported here so only the render pool processes pay for loading weasyprint
+        import weasyprint
+        html_out = self.render_html()
         try:
-            pdf_bytes = weasyprint.HTML(string=html_out).write_pdf()
-            # Clean up template file
-            os.remove(os.path.join(os.path.dirname(__file__), "report_template.html"))
-            return pdf_bytes
+            return weasyprint.HTML(string=html_out).write_pdf()
         except Exception as e:
             logger.error(f"Failed to generate PDF: {e}")
-            # Clean up template file even on error
-            os.remove(os.path.join(os.path.dirname(__file__), "report_template.html"))
             raise
 
 
-async def generate_pdf_report(scan_id: str, target: str, results: List[Dict[str, Any]], risk_assessment: Dict[str, Any]) -> bytes:
+def render_pdf_report(scan_id: str, target: str, results: List[Dict[str, Any]], risk_assessment: Dict[str, Any], timestamp: Optional[str] = None) -> bytes:
     """
-    High-level function to generate a PDF report.
+    High-level function to generate a PDF report. Synchronous and CPU bound;
+    it runs in the PDF renderer's process pool (see reports.pdf_renderer).
     """
-    generator = PDFGenerator(scan_id, target, results, risk_assessment)
-    # Run synchronous PDF generation in an executor to avoid blocking
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, generator.generate)
+    generator = PDFGenerator(scan_id, target, results, risk_assessment, timestamp)
+    return generator.generate()
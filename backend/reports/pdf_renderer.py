@@ -0,0 +1,139 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+import orjson
+from sqlalchemy.orm import defer
+from sqlmodel import select
+
+from config import settings
+from database.db_connect import AsyncSessionLocal
+from monitoring.metrics import REPORT_RENDER
+from reports.artifact_store import get_artifact_store, store_report_content
+from reports.pdf_generator import render_pdf_report
+from schemas import Report
+from utils.compression import decompress
+from utils.logger import logger
+
+
+class PDFRenderBusy(Exception):
+    """ Raised when the render queue is full; the caller should retry later. """
+
+
+class PDFRenderer:
+    """
+    Renders PDF reports on demand in a dedicated, bounded process pool.
+
+    Scans only store their JSON report and an empty PDF report row. The PDF is
+    rendered from the JSON report the first time it is needed (a download or an
+    explicit pre-render), written to the artifact store, and served from there
+    afterwards. Concurrent requests for the same report share one render.
+    """
+    def __init__(self, max_workers: int, max_pending: int, max_tasks_per_child: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_tasks_per_child = max_tasks_per_child
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Renders in progress in this process, by report ID
+        self._inflight: Dict[int, asyncio.Future] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned, not forked: the parent runs an event loop and logging threads.
+            # Workers are recycled to keep weasyprint's memory growth in check.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=self.max_tasks_per_child,
+            )
+        return self._executor
+
+    async def ensure_rendered(self, report_id: int) -> Report:
+        """
+        Returns the PDF report with its content stored, rendering it first if needed.
+        """
+        future = self._inflight.get(report_id)
+        if future is None:
+            if len(self._inflight) >= self.max_pending:
+                raise PDFRenderBusy(f"{len(self._inflight)} PDF renders are already in progress.")
+            future = asyncio.ensure_future(self._render_report(report_id))
+            self._inflight[report_id] = future
+            future.add_done_callback(lambda done: self._finish(report_id, done))
+        # A caller that goes away doesn't cancel the render for the others
+        return await asyncio.shield(future)
+
+    def _finish(self, report_id: int, future: asyncio.Future):
+        self._inflight.pop(report_id, None)
+        if not future.cancelled():
+            # Mark the exception as retrieved if nobody was waiting any more
+            future.exception()
+
+    async def _render_report(self, report_id: int) -> Report:
+        async with AsyncSessionLocal() as session:
+            report = await session.get(Report, report_id, options=[defer(Report.content_blob)])
+            if report is None:
+                raise ValueError(f"Report {report_id} does not exist.")
+            if report.content_path is not None:
+                # Rendered meanwhile, possibly by another process
+                return report
+
+            result = await session.execute(
+                select(Report)
+                .where(Report.scan_id == report.scan_id, Report.report_type == 'json')
+                .order_by(Report.id.desc())
+                .limit(1)
+            )
+            source = result.scalars().first()
+            if source is None:
+                raise ValueError(f"Scan {report.scan_id} has no JSON report to render the PDF from.")
+            if source.content_path is not None:
+                stored = await get_artifact_store().read(source.content_path)
+                document = orjson.loads(decompress(stored, source.content_encoding))
+            else:
+                document = orjson.loads(source.content_blob)
+            metadata = document.get("scan_metadata", {})
+
+            logger.info(f"Rendering PDF report for scan ID: {report.scan_id}", extra={"scan_id": report.scan_id})
+            started = time.monotonic()
+            pdf_bytes = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(),
+                render_pdf_report,
+                report.scan_id,
+                metadata.get("target", ""),
+                document.get("scan_results", []),
+                document.get("risk_summary", {}),
+                metadata.get("timestamp"),
+            )
+            elapsed = time.monotonic() - started
+            REPORT_RENDER.labels("pdf").observe(elapsed)
+            logger.info(f"Rendered PDF report for scan ID {report.scan_id} in {elapsed:.2f}s ({len(pdf_bytes)} bytes).")
+
+            await store_report_content(report, pdf_bytes)
+            session.add(report)
+            await session.commit()
+            await session.refresh(report)
+            return report
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Singleton instance
+_pdf_renderer: Optional[PDFRenderer] = None
+
+def get_pdf_renderer() -> PDFRenderer:
+    """
+    Returns a singleton instance of the PDFRenderer.
+    """
+    global _pdf_renderer
+    if _pdf_renderer is None:
+        _pdf_renderer = PDFRenderer(
+            max_workers=settings.PDF_RENDER_WORKERS,
+            max_pending=settings.PDF_RENDER_MAX_PENDING,
+            max_tasks_per_child=settings.PDF_RENDER_MAX_TASKS_PER_CHILD,
+        )
+    return _pdf_renderer
@@ -0,0 +1,380 @@
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+from config import settings
+from utils.logger import logger
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS cve (id TEXT PRIMARY KEY, summary TEXT, cvss REAL, severity TEXT, modified TEXT)",
+    # One row per vulnerable version interval of a product. Bounds are version keys
+    # (see `version_key`); '' is an open start and OPEN_END an open end.
+    """
+    CREATE TABLE IF NOT EXISTS cve_range (
+        product TEXT NOT NULL, vendor TEXT NOT NULL,
+        start_key TEXT NOT NULL, start_incl INTEGER NOT NULL,
+        end_key TEXT NOT NULL, end_incl INTEGER NOT NULL,
+        cve_id TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_cve_range_lookup ON cve_range (product, start_key, end_key)",
+    "CREATE INDEX IF NOT EXISTS ix_cve_range_cve ON cve_range (cve_id)",
+    "CREATE TABLE IF NOT EXISTS feed (name TEXT PRIMARY KEY, ingested_at TEXT, records INTEGER)",
+]
+
+# Sorts after every version key
+OPEN_END = "\x7f"
+
+# Bumped whenever `version_key` changes; an index built with other keys is rebuilt
+KEY_FORMAT = 2
+
+# nmap product names whose CPE product differs, by normalized name
+PRODUCT_ALIASES: Dict[str, Tuple[str, str]] = {
+    "apache_httpd": ("apache", "http_server"),
+    "microsoft_iis_httpd": ("microsoft", "internet_information_services"),
+    "openssh": ("openbsd", "openssh"),
+    "isc_bind": ("isc", "bind"),
+    "mysql": ("oracle", "mysql"),
+    "postgresql_db": ("postgresql", "postgresql"),
+    "vsftpd": ("vsftpd_project", "vsftpd"),
+    "proftpd": ("proftpd", "proftpd"),
+    "exim_smtpd": ("exim", "exim"),
+    "postfix_smtpd": ("postfix", "postfix"),
+    "lighttpd": ("lighttpd", "lighttpd"),
+    "nginx": ("", "nginx"),
+}
+
+# Used when no index has been ingested yet, so scans still flag the best-known issues
+BUILTIN_RECORDS: List[Dict[str, Any]] = [
+    {"id": "CVE-2021-41773", "summary": "Path Traversal and File Disclosure", "cvss": 7.5, "severity": "HIGH",
+     "ranges": [("apache", "http_server", "2.4.49", True, "2.4.49", True)]},
+    {"id": "CVE-2021-42013", "summary": "Path Traversal and RCE", "cvss": 9.8, "severity": "CRITICAL",
+     "ranges": [("apache", "http_server", "2.4.49", True, "2.4.50", True)]},
+    {"id": "CVE-2021-28041", "summary": "Double Free vulnerability", "cvss": 7.1, "severity": "HIGH",
+     "ranges": [("openbsd", "openssh", "8.5", True, "8.5p1", True)]},
+]
+
+VERSION_PART = re.compile(r"\d+|[a-z]+")
+# Rank of the pre-release tags; they sort before the release (KEY_END)
+PRE_RELEASE_TAGS = {"dev": "0", "alpha": "1", "beta": "2", "pre": "3", "preview": "3", "rc": "4"}
+KEY_END = '"'
+FEED_ARRAY_START = re.compile(r'"(CVE_Items|vulnerabilities)"\s*:\s*\[')
+
+
+def version_key(version: str) -> str:
+    """
+    A string that sorts like the version, so intervals can be compared as text:
+    numbers compare numerically (length-prefixed) and sort before letters, and
+    pre-release tags (dev, alpha, beta, pre, rc) sort before the release. Every
+    key ends with a terminator that sorts after pre-release tags and before
+    anything else, so a release sorts after its pre-releases.
+
+    >>> version_key("2.4.9") < version_key("2.4.49") < version_key("2.4.49a")
+    True
+    >>> version_key("8.5") < version_key("8.5p1") < version_key("8.6")
+    True
+    >>> version_key("1.2.0alpha1") < version_key("1.2.0-beta.2") < version_key("1.2.0rc1") < version_key("1.2.0rc10") < version_key("1.2.0")
+    True
+    >>> version_key("1.2.0.dev3") < version_key("1.2.0a1") # a single letter is a patch level (OpenSSL's 1.0.2a)
+    True
+    """
+    key = []
+    for part in VERSION_PART.findall(version.lower()):
+        if part.isdigit():
+            digits = part.lstrip("0") or "0"
+            key.append(f"#{len(digits):02d}{digits}")
+        elif part in PRE_RELEASE_TAGS:
+            key.append(f"!{PRE_RELEASE_TAGS[part]}")
+        else:
+            key.append(f"~{part}")
+    key.append(KEY_END)
+    return "".join(key)
+
+def normalize_name(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+def parse_cpe(cpe: str) -> Optional[Tuple[str, str, str]]:
+    """
+    (vendor, product, version) of a CPE 2.3 name or 2.2 URI, e.g. nmap's
+    "cpe:/a:openbsd:openssh:8.5p1". The version is '' if not given.
+    """
+    if cpe.startswith("cpe:2.3:"):
+        parts = cpe.split(":")[3:7]
+    elif cpe.startswith("cpe:/"):
+        parts = cpe[5:].split(":")[1:5]
+    else:
+        return None
+    if len(parts) < 2:
+        return None
+    vendor, product = parts[0], parts[1]
+    version = parts[2] if len(parts) > 2 and parts[2] not in ("*", "-") else ""
+    update = parts[3] if len(parts) > 3 and parts[3] not in ("*", "-", "") else ""
+    return vendor, product, version + update
+
+
+def _feed_records(stream: IO[str], chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """
+    Yields CVE records one at a time from an NVD JSON feed (1.1 `CVE_Items` or
+    API 2.0 `vulnerabilities`) without loading the whole document.
+    """
+    decoder = json.JSONDecoder()
+    buffer = stream.read(chunk_size)
+    start = FEED_ARRAY_START.search(buffer)
+    while start is None:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            raise ValueError("Not an NVD JSON feed: no CVE_Items or vulnerabilities array.")
+        buffer += chunk
+        start = FEED_ARRAY_START.search(buffer)
+    buffer = buffer[start.end():]
+
+    position, done = 0, False
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if done:
+                raise
+            chunk = stream.read(chunk_size)
+            done = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield record
+
+def _line_records(stream: IO[str]) -> Iterator[Dict[str, Any]]:
+    """ Yields CVE records from a file with one record per line. """
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+def _record_fields(record: Dict[str, Any]) -> Tuple[str, str, Optional[float], Optional[str], str, List[Dict[str, Any]]]:
+    """ (id, summary, CVSS score, severity, modified, CPE matches) of a 1.1 or 2.0 feed record. """
+    if "cve" in record and "id" in record["cve"]:
+        # NVD API 2.0
+        cve = record["cve"]
+        summary = next((d["value"] for d in cve.get("descriptions", []) if d.get("lang") == "en"), "")
+        cvss, severity = None, None
+        for metric in ("cvssMetricV31", "cvssMetricV30", "cvssMetricV2"):
+            if cve.get("metrics", {}).get(metric):
+                data = cve["metrics"][metric][0]
+                cvss = data["cvssData"].get("baseScore")
+                severity = data["cvssData"].get("baseSeverity") or data.get("baseSeverity")
+                break
+        nodes = [node for config in cve.get("configurations", []) for node in config.get("nodes", [])]
+        matches = [{**match, "cpe": match.get("criteria", "")} for node in nodes for match in node.get("cpeMatch", [])]
+        return cve["id"], summary, cvss, severity, cve.get("lastModified", ""), matches
+
+    # NVD 1.1 feed
+    cve = record["cve"]
+    summary = next((d["value"] for d in cve.get("description", {}).get("description_data", []) if d.get("lang") == "en"), "")
+    impact = record.get("impact", {})
+    cvss, severity = None, None
+    if "baseMetricV3" in impact:
+        cvss = impact["baseMetricV3"]["cvssV3"].get("baseScore")
+        severity = impact["baseMetricV3"]["cvssV3"].get("baseSeverity")
+    elif "baseMetricV2" in impact:
+        cvss = impact["baseMetricV2"]["cvssV2"].get("baseScore")
+        severity = impact["baseMetricV2"].get("severity")
+
+    def walk(nodes):
+        for node in nodes:
+            yield from node.get("cpe_match", [])
+            yield from walk(node.get("children", []))
+    matches = [{**match, "cpe": match.get("cpe23Uri", "")} for match in walk(record.get("configurations", {}).get("nodes", []))]
+    return cve["CVE_data_meta"]["ID"], summary, cvss, severity, record.get("lastModifiedDate", ""), matches
+
+def _match_ranges(match: Dict[str, Any]) -> Optional[Tuple[str, str, str, int, str, int]]:
+    """ The interval row of a vulnerable CPE match: (product, vendor, start, incl, end, incl). """
+    if not match.get("vulnerable", True):
+        return None
+    parsed = parse_cpe(match["cpe"])
+    if parsed is None:
+        return None
+    vendor, product, version = parsed
+    if any(bound in match for bound in ("versionStartIncluding", "versionStartExcluding", "versionEndIncluding", "versionEndExcluding")):
+        start = match.get("versionStartIncluding") or match.get("versionStartExcluding")
+        end = match.get("versionEndIncluding") or match.get("versionEndExcluding")
+        return (
+            product, vendor,
+            version_key(start) if start else "", int("versionStartExcluding" not in match),
+            version_key(end) if end else OPEN_END, int("versionEndExcluding" not in match),
+        )
+    if version:
+        key = version_key(version)
+        return product, vendor, key, 1, key, 1
+    # Every version
+    return product, vendor, "", 1, OPEN_END, 1
+
+
+class CVEIndex:
+    """
+    Local CVE index in SQLite, keyed by CPE product with each vulnerable version
+    range stored as an interval of sortable version keys. A lookup is one
+    indexed range query, cached per (product, version).
+
+    Feeds are ingested with `ingest_feed` by a single writer (the CLI); the
+    database is in WAL mode so workers keep reading it, read-only, meanwhile.
+    Ingesting a newer feed only rewrites the CVEs modified since.
+    """
+    def __init__(self, path: str, read_only: bool = True):
+        self.path = path
+        if read_only:
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+            if self._stale_keys():
+                # The stored intervals can't be converted, so the feeds are ingested again in full
+                logger.warning(f"Clearing the CVE index at {path}: it uses an older version key format.")
+                self.conn.execute("DELETE FROM cve_range")
+                self.conn.execute("DELETE FROM cve")
+                self.conn.execute("DELETE FROM feed")
+            self.conn.execute(f"PRAGMA user_version = {KEY_FORMAT}")
+            self.conn.commit()
+        if read_only and self._stale_keys():
+            logger.warning(f"The CVE index at {path} uses an older version key format; ingest the feeds again to rebuild it.")
+        self._lock = threading.Lock()
+        self._data_version = None
+        self._cached_lookup = lru_cache(maxsize=4096)(self._lookup)
+
+    def _stale_keys(self) -> bool:
+        """ Whether the index holds intervals built with another KEY_FORMAT (0: before it was recorded). """
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] == KEY_FORMAT:
+            return False
+        if self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'cve_range'").fetchone() is None:
+            return False
+        return self.conn.execute("SELECT 1 FROM cve_range LIMIT 1").fetchone() is not None
+
+    def lookup(self, product: str, vendor: str, version: str) -> Tuple[Dict[str, Any], ...]:
+        """
+        CVEs affecting a product version, most severe first; `vendor` may be ''
+        to match any vendor. Cached until the index changes.
+        """
+        with self._lock:
+            # Changes whenever another connection (an ingest) commits
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._cached_lookup.cache_clear()
+            self._data_version = data_version
+        return self._cached_lookup(product, vendor, version)
+
+    def _lookup(self, product: str, vendor: str, version: str) -> Tuple[Dict[str, Any], ...]:
+        key = version_key(version)
+        with self._lock:
+            rows = self.conn.execute(
+                """
+                SELECT r.cve_id, r.start_key, r.start_incl, r.end_key, r.end_incl, c.summary, c.cvss, c.severity
+                FROM cve_range r JOIN cve c ON c.id = r.cve_id
+                WHERE r.product = ? AND (? = '' OR r.vendor = ?) AND r.start_key <= ? AND r.end_key >= ?
+                """,
+                (product, vendor, vendor, key, key),
+            ).fetchall()
+        found = {}
+        for cve_id, start_key, start_incl, end_key, end_incl, summary, cvss, severity in rows:
+            if (start_key == key and not start_incl) or (end_key == key and not end_incl):
+                continue
+            found[cve_id] = {"cve_id": cve_id, "summary": summary, "cvss": cvss, "severity": severity}
+        return tuple(sorted(found.values(), key=lambda cve: (-(cve["cvss"] or 0), cve["cve_id"])))
+
+    def _write_record(self, cve_id: str, summary: str, cvss: Optional[float], severity: Optional[str], modified: str, ranges: Iterable[tuple]) -> bool:
+        stored = self.conn.execute("SELECT modified FROM cve WHERE id = ?", (cve_id,)).fetchone()
+        if stored is not None and modified and stored[0] and stored[0] >= modified:
+            return False
+        self.conn.execute("DELETE FROM cve_range WHERE cve_id = ?", (cve_id,))
+        self.conn.execute("INSERT OR REPLACE INTO cve VALUES (?, ?, ?, ?, ?)", (cve_id, summary, cvss, severity, modified))
+        self.conn.executemany("INSERT INTO cve_range VALUES (?, ?, ?, ?, ?, ?, ?)", [(*row, cve_id) for row in set(ranges)])
+        return True
+
+    def ingest_records(self, records: Iterable[Dict[str, Any]], batch_size: int = 5000) -> int:
+        """
+        Adds or updates feed records, committing every `batch_size`. Records not
+        modified since they were last ingested are skipped. Returns the number written.
+        """
+        written = 0
+        with self._lock:
+            for count, record in enumerate(records, 1):
+                cve_id, summary, cvss, severity, modified, matches = _record_fields(record)
+                ranges = [row for row in map(_match_ranges, matches) if row is not None]
+                written += self._write_record(cve_id, summary, cvss, severity, modified, ranges)
+                if count % batch_size == 0:
+                    self.conn.commit()
+            self.conn.commit()
+        self._cached_lookup.cache_clear()
+        return written
+
+    def ingest_feed(self, feed_path: str) -> int:
+        """
+        Streams an NVD JSON feed, or a .ndjson/.jsonl file of its records
+        (optionally gzipped), into the index.
+        """
+        opener = gzip.open if feed_path.endswith(".gz") else open
+        by_line = feed_path.removesuffix(".gz").endswith((".ndjson", ".jsonl"))
+        with opener(feed_path, "rt", encoding="utf-8") as stream:
+            written = self.ingest_records(_line_records(stream) if by_line else _feed_records(stream))
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO feed VALUES (?, datetime('now'), ?)", (os.path.basename(feed_path), written),
+            )
+            self.conn.commit()
+        logger.info(f"Ingested {written} new or updated CVEs from {feed_path}.")
+        return written
+
+    def load_builtin(self):
+        with self._lock:
+            for record in BUILTIN_RECORDS:
+                ranges = [
+                    (product, vendor, version_key(start), int(start_incl), version_key(end), int(end_incl))
+                    for vendor, product, start, start_incl, end, end_incl in record["ranges"]
+                ]
+                self._write_record(record["id"], record["summary"], record["cvss"], record["severity"], "", ranges)
+            self.conn.commit()
+        self._cached_lookup.cache_clear()
+
+
+def service_product(service: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+    """
+    (product, vendor, version) to look up for an nmap service entry, from its
+    CPE if nmap found one, else from its product name. Vendor '' matches any.
+    """
+    version = (service.get("version") or "").split(" ")[0]
+    parsed = parse_cpe(service.get("cpe") or "")
+    if parsed is not None:
+        vendor, product, cpe_version = parsed
+        version = version or cpe_version
+    else:
+        name = normalize_name(service.get("product") or "")
+        vendor, product = PRODUCT_ALIASES.get(name, ("", name))
+    if not product or not version:
+        return None
+    return product, vendor, version
+
+
+# Singleton instance, per process
+_cve_index: Optional[CVEIndex] = None
+
+def get_cve_index() -> CVEIndex:
+    """
+    Returns the shared read-only index at CVE_INDEX_PATH, or an in-memory one
+    with the built-in records if no feed has been ingested yet.
+    """
+    global _cve_index
+    if _cve_index is None:
+        if os.path.exists(settings.CVE_INDEX_PATH):
+            _cve_index = CVEIndex(settings.CVE_INDEX_PATH)
+        else:
+            logger.warning(f"No CVE index at {settings.CVE_INDEX_PATH}; using the built-in records. Run `python main.py ingest-cve-feed`.")
+            _cve_index = CVEIndex(":memory:", read_only=False)
+            _cve_index.load_builtin()
+    return _cve_index
@@ -1,6 +1,8 @@
 import httpx
 from typing import Dict, Any, List, Optional
 from utils.logger import logger
+from monitoring.tool_usage import http_event_hooks
+from tools.governed_http import governed_client
 
 class HeaderAnalyzer:
     def __init__(self, url: str, scan_id: Optional[str] = None):
@@ -38,7 +40,7 @@ class HeaderAnalyzer:
         }
 
         try:
-            async with httpx.AsyncClient(verify=False, follow_redirects=True) as client:
+            async with governed_client(verify=False, follow_redirects=True, event_hooks=http_event_hooks()) as client:
                 response = await client.get(self.url, timeout=10.0)
                 
                 headers = response.headers
@@ -2,12 +2,17 @@ import nmap
 import asyncio
 from typing import Dict, Any, Optional
 from utils.logger import logger
+from tools.target_governor import GovernorSlot, classify_exit
 
 class NmapScanner:
-    def __init__(self, target: str, options: str = "-sV -T4", scan_id: Optional[str] = None):
+    def __init__(self, target: str, options: str = "-sV -T4", scan_id: Optional[str] = None, slot: Optional[GovernorSlot] = None):
         self.target = target
         self.options = options
         self.scan_id = scan_id
+        self.slot = slot
+        if slot is not None:
+            # Last, so it overrides a --max-rate in the requested options
+            self.options = f"{options} --max-rate {slot.rate:g}"
         self.port_scanner = nmap.PortScanner()
 
     async def scan(self) -> Dict[str, Any]:
@@ -22,11 +27,19 @@ class NmapScanner:
                 None, self._run_scan
             )
             
-            return self._parse_results()
+            results = self._parse_results()
+            self._report(0)
+            return results
         except Exception as e:
             logger.error(f"An error occurred during Nmap scan: {e}", extra={"scan_id": self.scan_id})
+            # python-nmap raises when nmap fails or exits with an error
+            self._report(1)
             return {"error": str(e)}
 
+    def _report(self, returncode: int):
+        if self.slot is not None:
+            self.slot.report(classify_exit(returncode))
+
     def _run_scan(self):
         """
         Synchronous method to run the Nmap scan.
@@ -61,9 +74,9 @@ class NmapScanner:
         logger.info(f"Nmap scan finished for {self.target}. Found {len(results['open_ports'])} open ports.", extra={"scan_id": self.scan_id})
         return results
 
-async def run_nmap_scan(target: str, options: str = "-sV -T4", scan_id: Optional[str] = None) -> Dict[str, Any]:
+async def run_nmap_scan(target: str, options: str = "-sV -T4", scan_id: Optional[str] = None, slot: Optional[GovernorSlot] = None) -> Dict[str, Any]:
     """
     High-level function to run an Nmap scan.
     """
-    scanner = NmapScanner(target, options, scan_id)
+    scanner = NmapScanner(target, options, scan_id, slot)
     return await scanner.scan()
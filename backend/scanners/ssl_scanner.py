@@ -1,34 +1,57 @@
-import asyncio
 import re
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Optional
 from utils.logger import logger
-from utils.helpers import run_command
+from tools.command_runner import run_command
+from tools.target_governor import GovernorSlot, classify_exit
 from config import settings
 
+# (protocol marker, result flag, vulnerability text) for protocols that should be disabled
+WEAK_PROTOCOLS = [
+    ("SSLv2", "sslv2_enabled", "SSLv2 is enabled, which is insecure."),
+    ("SSLv3", "sslv3_enabled", "SSLv3 is enabled, which is insecure."),
+    ("TLSv1.0", "tlsv1_0_enabled", "TLSv1.0 is enabled, which is considered weak."),
+    ("TLSv1.1", "tlsv1_1_enabled", "TLSv1.1 is enabled, which is considered weak."),
+]
+
+CIPHER_PATTERN = re.compile(r"Accepted\s+(TLSv[\d.]+)\s+[\d\s]+bits\s+(.*)")
+
 class SSLScanner:
-    def __init__(self, target: str, scan_id: Optional[str] = None):
+    def __init__(self, target: str, scan_id: Optional[str] = None, slot: Optional[GovernorSlot] = None):
         self.target = target
         self.scan_id = scan_id
+        self.slot = slot
 
     async def scan(self) -> Dict[str, Any]:
         """
         Performs an SSL scan using sslscan.
         """
         logger.info(f"Starting SSL scan on {self.target}", extra={"scan_id": self.scan_id})
-        command = f"{settings.SSLSCAN_PATH} --no-colour {self.target}"
-        
-        stdout, stderr = await run_command(command)
-        
-        if stderr:
-            logger.error(f"SSLScan returned an error for {self.target}: {stderr}", extra={"scan_id": self.scan_id})
+        command = [settings.SSLSCAN_PATH, "--no-colour", self.target]
+        if self.slot is not None:
+            # sslscan opens one connection at a time
+            command[-1:-1] = [f"--sleep={round(self.slot.delay() * 1000)}"]
+        results = self._new_results()
 
-        return self._parse_results(stdout)
+        outcome = await run_command(
+            command,
+            scan_id=self.scan_id,
+            tool_name="ssl_scan",
+            on_stdout=lambda line: self._parse_line(line, results),
+            timeout=settings.SSLSCAN_TIMEOUT,
+        )
 
-    def _parse_results(self, scan_output: str) -> Dict[str, Any]:
-        """
-        Parses the text output from sslscan into a structured format.
-        """
-        results: Dict[str, Any] = {
+        if outcome.stderr:
+            logger.error(f"SSLScan returned an error for {self.target}: {outcome.stderr}", extra={"scan_id": self.scan_id})
+        if outcome.timed_out:
+            results["error"] = f"sslscan did not finish within {settings.SSLSCAN_TIMEOUT} seconds."
+        if self.slot is not None:
+            self.slot.report(classify_exit(outcome.returncode, outcome.timed_out))
+
+        logger.info(f"SSL scan finished for {self.target}.", extra={"scan_id": self.scan_id})
+        return results
+
+    def _new_results(self) -> Dict[str, Any]:
+        return {
             "target": self.target,
             "sslv2_enabled": False,
             "sslv3_enabled": False,
@@ -39,36 +62,39 @@ class SSLScanner:
             "vulnerabilities": []
         }
 
-        if "SSLv2" in scan_output and "enabled" in scan_output:
-            results["sslv2_enabled"] = True
-            results["vulnerabilities"].append("SSLv2 is enabled, which is insecure.")
-        if "SSLv3" in scan_output and "enabled" in scan_output:
-            results["sslv3_enabled"] = True
-            results["vulnerabilities"].append("SSLv3 is enabled, which is insecure.")
-        if "TLSv1.0" in scan_output and "enabled" in scan_output:
-            results["tlsv1_0_enabled"] = True
-            results["vulnerabilities"].append("TLSv1.0 is enabled, which is considered weak.")
-        if "TLSv1.1" in scan_output and "enabled" in scan_output:
-            results["tlsv1_1_enabled"] = True
-            results["vulnerabilities"].append("TLSv1.1 is enabled, which is considered weak.")
-            
-        if "Heartbleed" in scan_output and "vulnerable" in scan_output:
-            results["heartbleed_vulnerable"] = True
-            results["vulnerabilities"].append("Vulnerable to Heartbleed attack.")
+    def _parse_line(self, line: str, results: Dict[str, Any]):
+        """
+        Incrementally parses a single line of sslscan output into the results.
+        """
+        match = CIPHER_PATTERN.search(line)
+        if match:
+            results["supported_ciphers"].append(f"{match.group(1)}: {match.group(2).strip()}")
+            return
 
-        # Extract accepted ciphers
-        cipher_pattern = re.compile(r"Accepted\s+(TLSv[\d.]+)\s+[\d\s]+bits\s+(.*)")
-        for line in scan_output.splitlines():
-            match = cipher_pattern.search(line)
-            if match:
-                results["supported_ciphers"].append(f"{match.group(1)}: {match.group(2).strip()}")
+        if "enabled" in line:
+            for marker, flag, vulnerability in WEAK_PROTOCOLS:
+                if marker in line and not results[flag]:
+                    results[flag] = True
+                    results["vulnerabilities"].append(vulnerability)
 
-        logger.info(f"SSL scan finished for {self.target}.", extra={"scan_id": self.scan_id})
+        lowered = line.lower()
+        if "heartbleed" in lowered and "vulnerable" in lowered and "not vulnerable" not in lowered:
+            if not results["heartbleed_vulnerable"]:
+                results["heartbleed_vulnerable"] = True
+                results["vulnerabilities"].append("Vulnerable to Heartbleed attack.")
+
+    def _parse_results(self, scan_output: str) -> Dict[str, Any]:
+        """
+        Parses the complete text output from sslscan into a structured format.
+        """
+        results = self._new_results()
+        for line in scan_output.splitlines():
+            self._parse_line(line, results)
         return results
 
-async def run_ssl_scan(target: str, scan_id: Optional[str] = None) -> Dict[str, Any]:
+async def run_ssl_scan(target: str, scan_id: Optional[str] = None, slot: Optional[GovernorSlot] = None) -> Dict[str, Any]:
     """
     High-level function to run an SSL scan.
     """
-    scanner = SSLScanner(target, scan_id)
+    scanner = SSLScanner(target, scan_id, slot)
     return await scanner.scan()
@@ -1,23 +1,13 @@
 from typing import Dict, Any, List, Optional
 from utils.logger import logger
+from scanners.cve_index import get_cve_index, service_product
 
 class VulnerabilityAnalyzer:
     def __init__(self, scan_results: List[Dict[str, Any]], scan_id: Optional[str] = None):
         self.scan_results = scan_results
         self.scan_id = scan_id
-        # In a real application, this would be a comprehensive, up-to-date database.
-        self.vulnerability_db = {
-            "apache": {
-                "2.4.49": "CVE-2021-41773: Path Traversal and File Disclosure",
-                "2.4.50": "CVE-2021-42013: Path Traversal and RCE",
-            },
-            "openssh": {
-                "8.5p1": "CVE-2021-28041: Double Free vulnerability",
-            },
-            "nginx": {
-                "1.20.1": "Multiple vulnerabilities in njs module"
-            }
-        }
+        # Local CVE index built from the NVD feeds (see scanners.cve_index)
+        self.cve_index = get_cve_index()
 
     async def analyze(self) -> Dict[str, Any]:
         """
@@ -25,32 +15,32 @@ class VulnerabilityAnalyzer:
         """
         logger.info("Starting vulnerability analysis based on service versions.", extra={"scan_id": self.scan_id})
         vulnerabilities_found: List[str] = []
+        cves: List[Dict[str, Any]] = []
 
         nmap_results = next((r for r in self.scan_results if r.get("tool_name") == "nmap_scan"), None)
 
         if not nmap_results or "findings" not in nmap_results:
             logger.info("No Nmap results found to analyze for vulnerabilities.", extra={"scan_id": self.scan_id})
-            return {"vulnerabilities_found": []}
+            return {"vulnerabilities_found": [], "cves": []}
 
         findings = nmap_results["findings"]
         for key, value in findings.items():
             if key.startswith("port_") and isinstance(value, dict):
-                product = value.get("product", "").lower()
-                version = value.get("version", "")
-                
-                if not product or not version:
+                # Keyed by the CPE nmap reported, else by the product name
+                lookup = service_product(value)
+                if lookup is None:
                     continue
+                product_name = (value.get("product") or lookup[0]).lower()
+                port, version = int(key.split('_')[1]), lookup[2]
 
-                # Check for product family (e.g., "Apache httpd" -> "apache")
-                for db_product, cves in self.vulnerability_db.items():
-                    if db_product in product:
-                        if version in cves:
-                            vulnerability_info = f"Port {key.split('_')[1]} ({product} {version}): {cves[version]}"
-                            vulnerabilities_found.append(vulnerability_info)
-                            logger.warning(f"Potential vulnerability found: {vulnerability_info}", extra={"scan_id": self.scan_id})
+                for cve in self.cve_index.lookup(*lookup):
+                    vulnerability_info = f"Port {port} ({product_name} {version}): {cve['cve_id']}: {cve['summary']}"
+                    vulnerabilities_found.append(vulnerability_info)
+                    cves.append({"port": port, "product": product_name, "version": version, **cve})
+                    logger.warning(f"Potential vulnerability found: {vulnerability_info}", extra={"scan_id": self.scan_id})
         
         logger.info(f"Vulnerability analysis finished. Found {len(vulnerabilities_found)} potential issues.", extra={"scan_id": self.scan_id})
-        return {"vulnerabilities_found": vulnerabilities_found}
+        return {"vulnerabilities_found": vulnerabilities_found, "cves": cves}
 
 async def run_vulnerability_analysis(scan_results: List[Dict[str, Any]], scan_id: Optional[str] = None) -> Dict[str, Any]:
     """
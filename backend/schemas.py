@@ -1,7 +1,8 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import BigInteger, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from typing import Optional, List, Dict, Any
-from datetime import datetime
-from utils.helpers import to_json # Import to_json
+from datetime import date, datetime
 
 # Shared properties
 class ScanBase(SQLModel):
@@ -15,39 +16,57 @@ class Scan(ScanBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     scan_id: str = Field(unique=True, index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # When a worker took the scan off the queue
+    started_at: Optional[datetime] = None
     finished_at: Optional[datetime] = None
+    # Denormalized from the risk assessment once the scan completes
+    risk_score: Optional[int] = None
+    severity: Optional[str] = Field(default=None, index=True)
+    # Version of core.risk_rules that produced the score
+    risk_rules_version: Optional[int] = None
     
     results: List["ScanResult"] = Relationship(back_populates="scan")
 
+    # Keyset pagination of listings, newest first
+    __table_args__ = (Index("ix_scan_created_at_id", "created_at", "id"),)
+
 # Properties to receive via API on creation
 class ScanCreate(ScanBase):
     aggressive: bool = False
     tools: Optional[List[str]] = None
+    # Render the PDF report as soon as the scan finishes instead of on first download
+    prerender_pdf: Optional[bool] = None
 
 # Properties to return via API
 class ScanRead(ScanBase):
     id: int
     scan_id: str
     created_at: datetime
+    started_at: Optional[datetime] = None
     finished_at: Optional[datetime] = None
+    risk_score: Optional[int] = None
+    severity: Optional[str] = None
+    risk_rules_version: Optional[int] = None
 
-# Using JSON for flexible findings
+# Using JSONB for flexible findings that can still be indexed and filtered in Postgres
 class ScanResultBase(SQLModel):
     tool_name: str
-    findings_json: str = Field(sa_column_kwargs={"name": "findings"})
-
-    @property
-    def findings(self) -> Dict[str, Any]:
-        # Still use json.loads for reading, as it expects a string
-        return json.loads(self.findings_json)
+    findings: Dict[str, Any] = Field(default_factory=dict, sa_type=JSONB)
+    # Set when the findings were reused from an identical run of another scan
+    coalesced_from: Optional[str] = None
 
-    @findings.setter
-    def findings(self, value: Dict[str, Any]):
-        self.findings_json = to_json(value)
+    # Resource accounting for the tool run (see monitoring.tool_usage)
+    wall_time: Optional[float] = None
+    wait_time: Optional[float] = None
+    cpu_user_time: Optional[float] = None
+    cpu_system_time: Optional[float] = None
+    peak_rss_bytes: Optional[int] = Field(default=None, sa_type=BigInteger)
+    output_bytes: Optional[int] = Field(default=None, sa_type=BigInteger)
+    http_requests: Optional[int] = None
 
 class ScanResult(ScanResultBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    scan_id: str = Field(foreign_key="scan.scan_id")
+    scan_id: str = Field(foreign_key="scan.scan_id", index=True)
     scan: Scan = Relationship(back_populates="results")
     
 class ScanResultCreate(ScanResultBase):
@@ -59,17 +78,127 @@ class ScanResultRead(ScanResultBase):
 class ScanReadWithResults(ScanRead):
     results: List[ScanResultRead] = []
 
+# One typed row per individual finding, extracted from the raw results for cross-scan queries
+class FindingBase(SQLModel):
+    scan_id: str = Field(foreign_key="scan.scan_id", index=True)
+    tool_name: str
+    kind: str  # e.g. 'open_port', 'weak_protocol', 'missing_header', 'sql_injection'
+    host: str
+    port: Optional[int] = None
+    service: Optional[str] = None
+    product: Optional[str] = None
+    version: Optional[str] = None
+    severity: str  # 'info', 'low', 'medium', 'high' or 'critical'
+    # The distinguishing value of the finding: a protocol, header, path, parameter...
+    detail: Optional[str] = None
+    # Identical findings on the same host share this hash across scans
+    evidence_hash: str = Field(index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Finding(FindingBase, table=True):
+    __table_args__ = (
+        Index("ix_finding_kind_port_host", "kind", "port", "host"),
+        Index("ix_finding_kind_detail_host", "kind", "detail", "host"),
+        Index("ix_finding_kind_created_at", "kind", "created_at"),
+        Index("ix_finding_host_kind", "host", "kind"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+class FindingRead(FindingBase):
+    id: int
+
+class FindingHostSummary(SQLModel):
+    host: str
+    findings: int
+    scans: int
+    first_seen: datetime
+    last_seen: datetime
+
+class ScanOutputPage(SQLModel):
+    entries: List[Dict[str, Any]]
+    # Pass as `from` to fetch the next page (the last entry ID read, or `from` if none); None if nothing was read yet
+    next_cursor: Optional[str] = None
+
+class ToolUsageSummary(SQLModel):
+    tool_name: str
+    target: Optional[str] = None
+    runs: int
+    coalesced_runs: int
+    total_wall_time: float
+    avg_wall_time: float
+    total_wait_time: float
+    total_cpu_user_time: float
+    total_cpu_system_time: float
+    max_peak_rss_bytes: Optional[int] = None
+    total_output_bytes: int
+    total_http_requests: int
+
 class ReportBase(SQLModel):
     scan_id: str = Field(foreign_key="scan.scan_id", index=True)
-    report_type: str # 'json' or 'pdf'
+    report_type: str # 'json', 'ndjson' or 'pdf'
     risk_score: int
     severity: str
 
 class Report(ReportBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
-    content_blob: bytes = Field(sa_column_kwargs={"name": "content"})
+    # The report bytes live in the artifact store (see reports.artifact_store), keyed by digest
+    content_digest: Optional[str] = Field(default=None, index=True)
+    content_size: Optional[int] = Field(default=None, sa_type=BigInteger)
+    content_path: Optional[str] = None
+    # HTTP content coding of the stored bytes ("gzip", "zstd"), None if stored as is
+    content_encoding: Optional[str] = None
+    # Only set on reports saved before the artifact store existed
+    content_blob: Optional[bytes] = Field(default=None, sa_column_kwargs={"name": "content"})
+
+    # Keyset pagination of listings, newest first
+    __table_args__ = (Index("ix_report_created_at_id", "created_at", "id"),)
 
 class ReportRead(ReportBase):
     id: int
     created_at: datetime
+    content_digest: Optional[str] = None
+    content_size: Optional[int] = None
+    content_encoding: Optional[str] = None
+
+# Dashboard rollups, kept up to date by core.scan_stats as scans change state
+class ScanStatsCounter(SQLModel, table=True):
+    metric: str = Field(primary_key=True)  # 'status' or 'severity'
+    key: str = Field(primary_key=True)
+    value: int = Field(default=0, sa_type=BigInteger)
+
+class ScanDailyRollup(SQLModel, table=True):
+    day: date = Field(primary_key=True)
+    created: int = 0
+    completed: int = 0
+    failed: int = 0
+
+class TargetRiskRollup(SQLModel, table=True):
+    target: str = Field(primary_key=True)
+    scans: int = 0
+    # Risk of the target's most recent completed scan
+    last_risk_score: int = Field(index=True)
+    last_severity: str
+    max_risk_score: int
+    last_scan_at: datetime
+
+class DailyScanCounts(SQLModel):
+    day: date
+    created: int
+    completed: int
+    failed: int
+
+class TargetRiskRead(SQLModel):
+    target: str
+    scans: int
+    last_risk_score: int
+    last_severity: str
+    max_risk_score: int
+    last_scan_at: datetime
+
+class DashboardStats(SQLModel):
+    scans_by_status: Dict[str, int]
+    severity_distribution: Dict[str, int]
+    scans_per_day: List[DailyScanCounts]
+    top_risky_targets: List[TargetRiskRead]
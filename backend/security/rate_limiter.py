@@ -1,96 +1,188 @@
+import math
 import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
 import redis.asyncio as redis
 from fastapi import Request, HTTPException, status
-from typing import Optional
 
 from config import settings
 from utils.logger import logger
 
+# Refills and takes tokens in one atomic step, using the Redis server clock so API
+# processes on different hosts agree. The bucket expires once it would be full again.
+# Returns {allowed, tokens left, seconds until a token is available}.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'last_refill')
+local tokens = tonumber(bucket[1]) or capacity
+local last_refill = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - last_refill) * refill_rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / refill_rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'last_refill', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / refill_rate * 1000) + 1000)
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+class LocalTokenBuckets:
+    """
+    In-process token buckets with the same capacity and refill rate as the shared
+    one. This process's requests are a subset of what the shared bucket sees, so
+    an empty local bucket means the shared one is empty too. Floods from one
+    client are then refused without a Redis round trip. The local buckets never
+    allow what the shared one would refuse.
+    """
+    def __init__(self, capacity: int, refill_rate: float, max_keys: int):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_keys = max_keys
+        # identifier -> (tokens, last refill, denied until); least recently used first
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+
+    def take(self, identifier: str, now: Optional[float] = None) -> Optional[float]:
+        """
+        Takes a token. Returns None if the request may go on to the shared bucket,
+        or the seconds to wait if it is certainly over the limit.
+        """
+        now = time.monotonic() if now is None else now
+        tokens, last_refill, denied_until = self._buckets.pop(identifier, (self.capacity, now, 0.0))
+        tokens = min(self.capacity, tokens + (now - last_refill) * self.refill_rate)
+        if now < denied_until:
+            retry_after = denied_until - now
+        elif tokens >= 1:
+            tokens -= 1
+            retry_after = None
+        else:
+            retry_after = (1 - tokens) / self.refill_rate
+        self._buckets[identifier] = (tokens, now, denied_until)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    def deny_for(self, identifier: str, seconds: float, now: Optional[float] = None):
+        """
+        Remembers that the shared bucket refused this client for `seconds`, and
+        gives back the local token, since the refused request didn't use a shared one.
+        """
+        now = time.monotonic() if now is None else now
+        tokens, last_refill, _ = self._buckets.get(identifier, (0.0, now, 0.0))
+        self._buckets[identifier] = (min(self.capacity, tokens + 1), last_refill, now + seconds)
+
+
 class RateLimiter:
     """
     A token bucket rate limiter implemented using Redis.
+
+    Each check is a single EVALSHA of TOKEN_BUCKET_SCRIPT, so it is atomic across
+    API processes. An optional LocalTokenBuckets pre-filter answers obvious
+    floods in-process.
     """
-    def __init__(self, capacity: int, refill_rate: float, client: redis.Redis):
+    def __init__(self, name: str, capacity: int, refill_rate: float, client: redis.Redis, local: Optional[LocalTokenBuckets] = None):
         """
         Args:
+            name: Identifies the limit in the Redis keys, e.g. "scan_submit".
             capacity: The maximum number of tokens in the bucket.
             refill_rate: The number of tokens to add per second.
             client: An asynchronous Redis client instance.
+            local: Optional in-process pre-filter with the same limits.
         """
+        self.name = name
         self.capacity = capacity
         self.refill_rate = refill_rate
         self.redis = client
+        self.local = local
+        self._take = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def check(self, identifier: str) -> Tuple[bool, float]:
+        """
+        Takes a token for the identifier (e.g. an IP address).
+
+        Returns whether the request is allowed and, if not, the seconds until it would be.
+        """
+        if self.local is not None:
+            retry_after = self.local.take(identifier)
+            if retry_after is not None:
+                return False, retry_after
+
+        try:
+            allowed, _, retry_after = await self._take(
+                keys=[f"rate_limit:{self.name}:{identifier}"],
+                args=[self.capacity, self.refill_rate, 1],
+            )
+        except redis.RedisError as e:
+            # Fail open; the local pre-filter still applies
+            logger.warning(f"Rate limiter '{self.name}' could not reach Redis: {e}")
+            return True, 0.0
+
+        if not int(allowed):
+            retry_after = float(retry_after)
+            if self.local is not None:
+                self.local.deny_for(identifier, retry_after)
+            return False, retry_after
+        return True, 0.0
 
     async def is_allowed(self, identifier: str) -> bool:
         """
         Checks if a request from the given identifier is allowed.
-        
-        Args:
-            identifier: A unique identifier for the client (e.g., IP address).
-            
-        Returns:
-            True if the request is allowed, False otherwise.
         """
-        bucket_key = f"rate_limit:{identifier}"
-        now = time.time()
-
-        # Use a Redis pipeline for atomic operations
-        pipe = self.redis.pipeline()
-        pipe.hgetall(bucket_key)
-        results = await pipe.execute()
-        
-        bucket = results[0] if results and results[0] else {}
-        tokens = float(bucket.get("tokens", self.capacity))
-        last_refill = float(bucket.get("last_refill", now))
-
-        # Refill tokens based on elapsed time
-        delta = max(0, now - last_refill)
-        tokens_to_add = delta * self.refill_rate
-        new_tokens = min(self.capacity, tokens + tokens_to_add)
-
-        if new_tokens >= 1:
-            # Consume one token
-            pipe = self.redis.pipeline()
-            pipe.hset(bucket_key, "tokens", new_tokens - 1)
-            pipe.hset(bucket_key, "last_refill", now)
-            await pipe.execute()
-            return True
-        else:
-            # Not enough tokens, deny request
-            # We can still update the bucket state without consuming a token
-            pipe = self.redis.pipeline()
-            pipe.hset(bucket_key, "tokens", new_tokens)
-            pipe.hset(bucket_key, "last_refill", now)
-            await pipe.execute()
-            return False
-
-# Singleton Redis client for the rate limiter
+        allowed, _ = await self.check(identifier)
+        return allowed
+
+# Singleton Redis client and limiters, by name
 _redis_client: Optional[redis.Redis] = None
+_rate_limiters: Dict[str, RateLimiter] = {}
 
-def get_rate_limiter() -> RateLimiter:
+def get_rate_limiter(name: str = "default", capacity: int = 10, refill_rate: float = 1.0) -> RateLimiter:
     """
-    Returns a singleton instance of the RateLimiter.
+    Returns the singleton RateLimiter for a named limit.
     """
     global _redis_client
     if _redis_client is None:
         _redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
-    
-    # Example: Allow 10 requests, refill 1 token per second
-    return RateLimiter(capacity=10, refill_rate=1.0, client=_redis_client)
+
+    if name not in _rate_limiters:
+        local = None
+        if settings.RATE_LIMIT_LOCAL_PREFILTER:
+            local = LocalTokenBuckets(capacity, refill_rate, settings.RATE_LIMIT_LOCAL_MAX_KEYS)
+        _rate_limiters[name] = RateLimiter(name, capacity, refill_rate, _redis_client, local)
+    return _rate_limiters[name]
 
 
-async def rate_limit_dependency(request: Request):
+def rate_limit(name: str, capacity: int, refill_rate: float) -> Callable:
     """
-    FastAPI dependency that applies rate limiting to an endpoint.
+    Builds a FastAPI dependency that applies the named rate limit per client IP.
     """
-    # Use client's IP address as the identifier
-    identifier = request.client.host
-    limiter = get_rate_limiter()
-    
-    if not await limiter.is_allowed(identifier):
-        logger.warning(f"Rate limit exceeded for IP: {identifier}")
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Too many requests. Please try again later.",
-            headers={"Retry-After": "60"}, # Suggest a 60-second cooldown
-        )
+    async def rate_limit_dependency(request: Request):
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        # Use client's IP address as the identifier; uvicorn sets it from X-Forwarded-For
+        # for requests relayed by a proxy in FORWARDED_ALLOW_IPS
+        identifier = request.client.host if request.client else "unknown"
+        allowed, retry_after = await get_rate_limiter(name, capacity, refill_rate).check(identifier)
+        if not allowed:
+            logger.warning(f"Rate limit '{name}' exceeded for IP: {identifier}")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests. Please try again later.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+    return rate_limit_dependency
+
+
+# The limit the original dependency applied: 10 requests, refilling 1 token per second
+rate_limit_dependency = rate_limit("default", capacity=10, refill_rate=1.0)
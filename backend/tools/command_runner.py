@@ -0,0 +1,206 @@
+import asyncio
+import gzip
+import os
+import signal
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+from config import settings
+from monitoring.tool_usage import record_output_bytes
+from utils.logger import logger
+
+# Called with each decoded output line as soon as it is read
+LineParser = Callable[[str], None]
+
+
+class CommandResult:
+    """
+    Outcome of a command run by the CommandRunner.
+
+    Only the last few lines of each stream are kept; the full output lives in
+    the compressed artifact file, if one was written.
+    """
+    def __init__(self, returncode: Optional[int], stdout_tail: List[str], stderr_tail: List[str],
+                 bytes_read: int, truncated: bool, timed_out: bool, artifact_path: Optional[str]):
+        self.returncode = returncode
+        self.stdout_tail = stdout_tail
+        self.stderr_tail = stderr_tail
+        self.bytes_read = bytes_read
+        self.truncated = truncated
+        self.timed_out = timed_out
+        self.artifact_path = artifact_path
+
+    @property
+    def stderr(self) -> str:
+        return "\n".join(self.stderr_tail)
+
+
+class CommandRunner:
+    """
+    Runs an external command (argv only, never through a shell) with bounded memory.
+
+    Output is read in chunks and split into lines, each line is handed to the
+    incremental parser, appended to a gzip artifact and kept in a small tail
+    buffer. The process runs in its own process group so the whole tree can be
+    killed when the deadline or the output cap is hit.
+    """
+    def __init__(
+        self,
+        command: List[str],
+        scan_id: Optional[str] = None,
+        tool_name: Optional[str] = None,
+        on_stdout: Optional[LineParser] = None,
+        on_stderr: Optional[LineParser] = None,
+        timeout: Optional[float] = None,
+        max_output_bytes: int = settings.COMMAND_MAX_OUTPUT_BYTES,
+        tail_lines: int = settings.COMMAND_TAIL_LINES,
+    ):
+        self.command = command
+        self.scan_id = scan_id
+        self.tool_name = tool_name or os.path.basename(command[0])
+        self.on_stdout = on_stdout
+        self.on_stderr = on_stderr
+        self.timeout = timeout
+        self.max_output_bytes = max_output_bytes
+        self.stdout_tail: Deque[str] = deque(maxlen=tail_lines)
+        self.stderr_tail: Deque[str] = deque(maxlen=tail_lines)
+        self.bytes_read = 0
+        self.truncated = False
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._kill_task: Optional[asyncio.Task] = None
+        self._artifact: Optional[gzip.GzipFile] = None
+        self.artifact_path: Optional[str] = None
+
+    def _open_artifact(self):
+        if not self.scan_id:
+            return
+        scan_dir = os.path.join(settings.SCAN_ARTIFACT_DIR, self.scan_id)
+        try:
+            os.makedirs(scan_dir, exist_ok=True)
+            self.artifact_path = os.path.join(scan_dir, f"{self.tool_name}.log.gz")
+            self._artifact = gzip.open(self.artifact_path, "wb", compresslevel=5)
+        except OSError as e:
+            logger.warning(f"Could not open output artifact for {self.tool_name}: {e}", extra={"scan_id": self.scan_id})
+            self._artifact = None
+            self.artifact_path = None
+
+    async def run(self) -> CommandResult:
+        """
+        Runs the command to completion, the deadline, or the output cap.
+        """
+        logger.info(f"Starting command: {' '.join(self.command)}", extra={"scan_id": self.scan_id})
+        self._open_artifact()
+        timed_out = False
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                *self.command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,
+            )
+            try:
+                await asyncio.wait_for(self._consume(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                logger.warning(f"{self.tool_name} exceeded its {self.timeout}s deadline. Killing it.", extra={"scan_id": self.scan_id})
+                await self.kill()
+        except asyncio.CancelledError:
+            await self.kill()
+            raise
+        finally:
+            if self._artifact is not None:
+                self._artifact.close()
+
+        return CommandResult(
+            returncode=self.process.returncode,
+            stdout_tail=list(self.stdout_tail),
+            stderr_tail=list(self.stderr_tail),
+            bytes_read=self.bytes_read,
+            truncated=self.truncated,
+            timed_out=timed_out,
+            artifact_path=self.artifact_path,
+        )
+
+    async def _consume(self):
+        await asyncio.gather(
+            self._pump(self.process.stdout, self.stdout_tail, self.on_stdout, b""),
+            self._pump(self.process.stderr, self.stderr_tail, self.on_stderr, b"[stderr] "),
+        )
+        if self._kill_task is not None:
+            await self._kill_task
+        await self.process.wait()
+
+    async def _pump(self, stream: asyncio.StreamReader, tail: Deque[str], parser: Optional[LineParser], prefix: bytes):
+        """
+        Reads a stream chunk by chunk and dispatches complete lines.
+        """
+        pending = b""
+        while True:
+            chunk = await stream.read(settings.COMMAND_READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            if self.truncated:
+                # Keep draining so the child doesn't block on a full pipe before it is killed
+                continue
+
+            self.bytes_read += len(chunk)
+            record_output_bytes(len(chunk))
+            if self.bytes_read > self.max_output_bytes:
+                self.truncated = True
+                logger.warning(f"{self.tool_name} exceeded the {self.max_output_bytes} byte output cap. Stopping it.", extra={"scan_id": self.scan_id})
+                self._kill_task = asyncio.ensure_future(self.kill())
+                continue
+
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            # Guard against a single unterminated line growing without bound
+            if len(pending) > settings.COMMAND_READ_CHUNK_BYTES:
+                lines.append(pending)
+                pending = b""
+            for raw_line in lines:
+                self._dispatch(raw_line, tail, parser, prefix)
+
+        if pending and not self.truncated:
+            self._dispatch(pending, tail, parser, prefix)
+
+    def _dispatch(self, raw_line: bytes, tail: Deque[str], parser: Optional[LineParser], prefix: bytes):
+        if self._artifact is not None:
+            self._artifact.write(prefix + raw_line + b"\n")
+        line = raw_line.decode("utf-8", errors="replace").rstrip("\r")
+        tail.append(line)
+        if parser is not None:
+            try:
+                parser(line)
+            except Exception as e:
+                logger.error(f"Output parser for {self.tool_name} failed on a line: {e}", extra={"scan_id": self.scan_id})
+
+    async def kill(self, grace_period: float = 5.0):
+        """
+        Terminates the whole process group, escalating to SIGKILL after the grace period.
+        """
+        if self.process is None or self.process.returncode is not None:
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=grace_period)
+            except asyncio.TimeoutError:
+                os.killpg(self.process.pid, signal.SIGKILL)
+                await self.process.wait()
+        except ProcessLookupError:
+            pass
+
+
+async def run_command(
+    command: List[str],
+    scan_id: Optional[str] = None,
+    tool_name: Optional[str] = None,
+    on_stdout: Optional[LineParser] = None,
+    on_stderr: Optional[LineParser] = None,
+    timeout: Optional[float] = None,
+) -> CommandResult:
+    """
+    High-level function to run a command with streaming parsers and bounded memory.
+    """
+    runner = CommandRunner(command, scan_id, tool_name, on_stdout, on_stderr, timeout)
+    return await runner.run()
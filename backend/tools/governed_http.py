@@ -0,0 +1,69 @@
+import time
+from typing import Any
+
+import httpx
+
+from config import settings
+from tools.target_governor import (
+    OUTCOME_ERROR, OUTCOME_NONE, OUTCOME_THROTTLED, OUTCOME_TIMEOUT,
+    GovernorTimeout, classify_response, get_target_governor,
+)
+
+
+def _retry_after(response: httpx.Response) -> float:
+    # Only the delay-seconds form; an HTTP date is rare enough to ignore
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", 0)))
+    except ValueError:
+        return 0.0
+
+
+class GovernedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that sends every request through the TargetGovernor, keyed
+    by the request's host, and reports back how it went.
+
+    The slot is held until the response headers arrive; latency is measured to
+    that point too.
+    """
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+        self.governor = get_target_governor()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = await self.governor.resolve(request.url.host)
+        try:
+            lease = await self.governor.acquire(host, settings.GOVERNOR_REQUEST_LEASE_TTL)
+        except GovernorTimeout as e:
+            # Surfaces as a RequestError, which the testers already handle
+            raise httpx.PoolTimeout(str(e), request=request)
+
+        outcome, retry_after = OUTCOME_NONE, 0.0
+        started = time.monotonic()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except httpx.TimeoutException:
+            outcome = OUTCOME_TIMEOUT
+            raise
+        except httpx.TransportError:
+            outcome = OUTCOME_ERROR
+            raise
+        else:
+            outcome = classify_response(response.status_code, time.monotonic() - started)
+            if outcome == OUTCOME_THROTTLED:
+                retry_after = _retry_after(response)
+            return response
+        finally:
+            await self.governor.release(host, lease, outcome, retry_after)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def governed_client(**kwargs: Any) -> httpx.AsyncClient:
+    """
+    An httpx.AsyncClient whose requests are governed per target host.
+    `verify` is passed to the underlying transport; everything else to the client.
+    """
+    transport = httpx.AsyncHTTPTransport(verify=kwargs.pop("verify", True))
+    return httpx.AsyncClient(transport=GovernedTransport(transport), **kwargs)
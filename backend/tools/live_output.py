@@ -1,55 +1,384 @@
 import redis.asyncio as redis
 import asyncio
-from typing import AsyncGenerator
+import json
+import time
+from datetime import datetime, timezone
+from collections import deque
+from typing import AsyncGenerator, Deque, Dict, List, Optional, Set, Tuple
 
 from config import settings
+from monitoring.metrics import REDIS_PUBLISH_ERRORS, REDIS_PUBLISHES
 from utils.logger import logger
+from utils.live_feed import (
+    APPEND_AND_PUBLISH_SCRIPT,
+    LIVE_FEED_CHANNEL_PREFIX,
+    SCAN_FINISHED_EVENT,
+    is_scan_finished,
+    live_feed_channel,
+    output_log_key,
+    scan_id_from_channel,
+    viewers_key,
+    with_entry_id,
+)
 
 class LiveOutputPublisher:
     """
-    Publishes messages to a Redis channel.
+    Appends messages to a scan's output log and publishes them to its Redis channel.
     """
     def __init__(self, redis_client):
         self.redis_client = redis_client
+        self._append_and_publish = redis_client.register_script(APPEND_AND_PUBLISH_SCRIPT)
 
-    async def publish(self, channel: str, message: str):
+    async def publish(self, channel: str, message: str, live: bool = True):
+        """
+        Logs a JSON object message durably and, if `live`, publishes it to viewers.
+        Both happen in one script call (one round trip).
+        """
         try:
-            await self.redis_client.publish(channel, message)
+            await self._append_and_publish(
+                keys=[output_log_key(scan_id_from_channel(channel)), channel],
+                args=[message, settings.LIVE_OUTPUT_LOG_MAXLEN, settings.LIVE_OUTPUT_LOG_RETENTION, "1" if live else "0"],
+            )
+            REDIS_PUBLISHES.labels("live_output", str(live).lower()).inc()
         except Exception as e:
+            REDIS_PUBLISH_ERRORS.labels("live_output").inc()
             logger.error(f"Failed to publish message to channel '{channel}': {e}")
 
-class LiveOutputSubscriber:
+    async def count_subscribers(self, channel: str) -> int:
+        """
+        Returns the number of direct subscribers of the channel, plus one if a
+        live output hub is watching it through its pattern subscription.
+        Errs on the side of publishing if Redis can't tell us.
+        """
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.pubsub_numsub(channel)
+            pipe.exists(viewers_key(channel))
+            numsub, viewers = await pipe.execute()
+            return (int(numsub[0][1]) if numsub else 0) + int(viewers)
+        except Exception as e:
+            logger.error(f"Failed to count subscribers of channel '{channel}': {e}")
+            return 1
+
+class LiveOutputStream:
     """
-    Subscribes to a Redis channel and yields messages.
+    Buffers high-volume tool output for one scan and publishes it in frames.
+
+    Lines are batched into frames bounded by line count, size and age, so a noisy
+    tool costs one Redis call per frame instead of one per line. Every frame is
+    appended to the scan's output log, but only published live while somebody
+    is watching the channel. Lines beyond the per-scan rate cap are dropped and
+    reported with a single "N lines dropped" marker.
     """
-    def __init__(self, redis_client):
-        self.redis_client = redis_client
+    def __init__(self, publisher: LiveOutputPublisher, channel: str, level: str = "DEBUG"):
+        self.publisher = publisher
+        self.channel = channel
+        self.level = level
+        self._lines: List[str] = []
+        self._bytes = 0
+        self._dropped = 0
+        self._tokens = float(settings.LIVE_OUTPUT_MAX_LINES_PER_SECOND)
+        self._last_refill = time.monotonic()
+        self._viewers = True
+        self._viewers_checked_at: Optional[float] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._pending_flush: Optional[asyncio.Future] = None
+        self._lock = asyncio.Lock()
+
+        # Counters reported when the stream is closed
+        self.lines_in = 0
+        self.lines_dropped = 0
+        self.frames_published = 0
+        self.frames_unwatched = 0
+        self.redis_ops = 0
+
+    def feed(self, line: str):
+        """
+        Queues a line for the next frame without waiting; safe to call from
+        synchronous line parsers. A full frame is flushed in the background.
+        """
+        self.lines_in += 1
+        if not self._take_token():
+            self._dropped += 1
+            self.lines_dropped += 1
+            return
+
+        self._lines.append(line)
+        self._bytes += len(line) + 1
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+        frame_full = len(self._lines) >= settings.LIVE_OUTPUT_MAX_FRAME_LINES or self._bytes >= settings.LIVE_OUTPUT_MAX_FRAME_BYTES
+        if frame_full and (self._pending_flush is None or self._pending_flush.done()):
+            self._pending_flush = asyncio.ensure_future(self.flush())
+
+    async def write(self, line: str):
+        """
+        Queues a line for the next frame, waiting for the flush if the frame is full.
+        """
+        self.feed(line)
+        if self._pending_flush is not None and not self._pending_flush.done():
+            await self._pending_flush
+
+    async def flush(self):
+        """
+        Publishes the buffered lines, plus a marker for any dropped lines, in as
+        few frames as the frame bounds allow.
+        """
+        async with self._lock:
+            if not self._lines and not self._dropped:
+                return
+            lines, self._lines, self._bytes = self._lines, [], 0
+            if self._dropped:
+                lines.append(f"... {self._dropped} lines dropped (output rate limit) ...")
+                self._dropped = 0
+
+            watched = await self._has_viewers()
+            for frame_lines in self._split_frames(lines):
+                frame = json.dumps({
+                    "level": self.level,
+                    "message": "\n".join(frame_lines),
+                    "lines": len(frame_lines),
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                })
+                await self.publisher.publish(self.channel, frame, live=watched)
+                self.redis_ops += 1
+                self.frames_published += 1
+                if not watched:
+                    self.frames_unwatched += 1
+
+    def _split_frames(self, lines: List[str]) -> List[List[str]]:
+        # Synchronous feeders can overshoot the bounds between flushes
+        frames: List[List[str]] = [[]]
+        frame_bytes = 0
+        for line in lines:
+            if frames[-1] and (len(frames[-1]) >= settings.LIVE_OUTPUT_MAX_FRAME_LINES or frame_bytes + len(line) + 1 > settings.LIVE_OUTPUT_MAX_FRAME_BYTES):
+                frames.append([])
+                frame_bytes = 0
+            frames[-1].append(line)
+            frame_bytes += len(line) + 1
+        return frames
 
-    async def subscribe(self, channel: str) -> AsyncGenerator[str, None]:
+    async def close(self):
+        """
+        Flushes what's left, stops the timer, and logs how many Redis ops were used.
+        """
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self._pending_flush is not None:
+            await self._pending_flush
+        await self.flush()
+        if self.lines_in:
+            logger.info(
+                f"Live output on '{self.channel}': {self.lines_in} lines sent as {self.frames_published} frames "
+                f"({self.redis_ops} Redis ops, {self.lines_in} with per-line publishing); "
+                f"{self.lines_dropped} lines dropped by the rate cap, {self.frames_unwatched} frames only logged (no viewers)."
+            )
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        rate = settings.LIVE_OUTPUT_MAX_LINES_PER_SECOND
+        self._tokens = min(rate, self._tokens + (now - self._last_refill) * rate)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def _has_viewers(self) -> bool:
+        now = time.monotonic()
+        if self._viewers_checked_at is None or now - self._viewers_checked_at >= settings.LIVE_OUTPUT_SUBSCRIBER_CHECK_INTERVAL:
+            self._viewers = await self.publisher.count_subscribers(self.channel) > 0
+            self._viewers_checked_at = now
+            self.redis_ops += 1
+        return self._viewers
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(settings.LIVE_OUTPUT_FLUSH_INTERVAL)
+            await self.flush()
+
+class LiveOutputClient:
+    """
+    One WebSocket viewer's bounded queue of pending messages.
+    """
+    def __init__(self, scan_id: str, max_pending: int):
+        self.scan_id = scan_id
+        self.max_pending = max_pending
+        self.closed = False
+        # Set when the client was disconnected for not keeping up
+        self.dropped = False
+        self._pending: Deque[str] = deque()
+        self._ready = asyncio.Event()
+
+    def push(self, message: str) -> bool:
+        if len(self._pending) >= self.max_pending:
+            return False
+        self._pending.append(message)
+        self._ready.set()
+        return True
+
+    def close(self, dropped: bool = False):
+        self.closed = True
+        if dropped:
+            self.dropped = True
+            self._pending.clear()
+        self._ready.set()
+
+    async def messages(self) -> AsyncGenerator[str, None]:
+        """
+        Yields queued messages until the client is closed.
+        """
+        while True:
+            while self._pending:
+                yield self._pending.popleft()
+            if self.closed:
+                return
+            self._ready.clear()
+            await self._ready.wait()
+
+
+class LiveOutputHub:
+    """
+    Process-wide fan-out of live output to WebSocket clients.
+
+    The hub holds a single pattern subscription to every scan's live feed and
+    dispatches each message to the bounded queues of the clients watching that
+    scan. Clients that fall too far behind are disconnected instead of buffering
+    without limit, and all clients of a scan are closed when the worker publishes
+    the scan-finished sentinel. Because pattern subscribers don't show up in
+    PUBSUB NUMSUB, the hub also refreshes a viewer key per watched scan so
+    publishers know someone is listening.
+    """
+    def __init__(self):
+        self._clients: Dict[str, Set[LiveOutputClient]] = {}
+        self._redis: Optional[redis.Redis] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._reader is not None:
+            return
+        self._redis = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        self._reader = asyncio.create_task(self._read_loop())
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        logger.info("Live output hub started.")
+
+    async def stop(self):
+        for task in (self._reader, self._heartbeat):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._reader = self._heartbeat = None
+        for clients in self._clients.values():
+            for client in clients:
+                client.close()
+        self._clients.clear()
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+        logger.info("Live output hub stopped.")
+
+    def register(self, scan_id: str) -> LiveOutputClient:
+        client = LiveOutputClient(scan_id, settings.LIVE_OUTPUT_CLIENT_QUEUE_SIZE)
+        clients = self._clients.setdefault(scan_id, set())
+        clients.add(client)
+        if len(clients) == 1 and self._redis is not None:
+            asyncio.create_task(self._mark_viewed([scan_id]))
+        return client
+
+    def unregister(self, client: LiveOutputClient):
+        client.close()
+        clients = self._clients.get(client.scan_id)
+        if clients is not None:
+            clients.discard(client)
+            if not clients:
+                del self._clients[client.scan_id]
+
+    def viewer_count(self) -> int:
+        return sum(len(clients) for clients in self._clients.values())
+
+    def dispatch(self, channel: str, data: str):
+        """
+        Delivers one message to every client watching the channel's scan.
+        """
+        clients = self._clients.get(scan_id_from_channel(channel))
+        if not clients:
+            return
+        finished = is_scan_finished(data)
+        for client in list(clients):
+            if not client.push(data):
+                logger.warning(f"Dropping slow live output client for scan {client.scan_id}.")
+                self.unregister(client)
+                client.close(dropped=True)
+            elif finished:
+                self.unregister(client)
+
+    async def _read_loop(self):
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(f"{LIVE_FEED_CHANNEL_PREFIX}*")
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self.dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Live output hub lost its Redis subscription: {e}. Reconnecting.")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(settings.LIVE_OUTPUT_VIEWER_TTL / 2)
+            if self._clients:
+                await self._mark_viewed(list(self._clients))
+
+    async def _mark_viewed(self, scan_ids: List[str]):
         try:
-            pubsub = self.redis_client.pubsub()
-            await pubsub.subscribe(channel)
-            logger.info(f"Subscribed to Redis channel: {channel}")
-            
-            while True:
-                # The timeout is important to prevent blocking indefinitely
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
-                if message and isinstance(message.get("data"), bytes):
-                    yield message['data'].decode('utf-8')
-                await asyncio.sleep(0.01) # Small sleep to prevent busy-waiting
-        except asyncio.CancelledError:
-            logger.info(f"Subscription to channel '{channel}' cancelled.")
+            pipe = self._redis.pipeline(transaction=False)
+            for scan_id in scan_ids:
+                pipe.set(viewers_key(live_feed_channel(scan_id)), 1, ex=settings.LIVE_OUTPUT_VIEWER_TTL)
+            await pipe.execute()
         except Exception as e:
-            logger.error(f"Error in Redis subscription for channel '{channel}': {e}")
-        finally:
-            if 'pubsub' in locals() and pubsub:
-                await pubsub.unsubscribe(channel)
-                logger.info(f"Unsubscribed from Redis channel: {channel}")
+            logger.error(f"Failed to refresh live output viewer keys: {e}")
+
+
+class OutputLogReader:
+    """
+    Pages through a scan's durable output log without loading all of it.
+    """
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+
+    async def read(self, scan_id: str, after: Optional[str] = None, limit: int = 500) -> Tuple[List[str], Optional[str]]:
+        """
+        Returns up to `limit` messages logged after the `after` entry ID, and the
+        entry ID to pass as `after` for the next page.
+        """
+        entries = await self.redis_client.xrange(
+            output_log_key(scan_id),
+            min=f"({after}" if after else "-",
+            max="+",
+            count=limit,
+        )
+        messages = [with_entry_id(entry_id, fields["m"]) for entry_id, fields in entries]
+        return messages, entries[-1][0] if entries else after
 
 
 # Singleton instances
 _redis_client = None
 _publisher = None
+_hub: Optional[LiveOutputHub] = None
 
 def get_live_output_publisher() -> LiveOutputPublisher:
     """
@@ -62,10 +391,31 @@ def get_live_output_publisher() -> LiveOutputPublisher:
         _publisher = LiveOutputPublisher(_redis_client)
     return _publisher
 
-async def get_live_output_subscriber() -> LiveOutputSubscriber:
+def get_output_log_reader() -> OutputLogReader:
+    """
+    Returns an OutputLogReader sharing the publisher's Redis client.
+    """
+    return OutputLogReader(get_live_output_publisher().redis_client)
+
+async def publish_scan_finished(scan_id: str):
+    """
+    Publishes the sentinel that tells live output viewers the scan is done.
+    """
+    await get_live_output_publisher().publish(
+        live_feed_channel(scan_id),
+        json.dumps({
+            "level": "INFO",
+            "message": "--- Scan processing finished ---",
+            "event": SCAN_FINISHED_EVENT,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }),
+    )
+
+def get_live_output_hub() -> LiveOutputHub:
     """
-    Returns a new subscriber instance for a client.
+    Returns the process-wide LiveOutputHub.
     """
-    # Each subscriber needs its own connection for pub/sub
-    subscriber_redis = redis.Redis.from_url(settings.REDIS_URL, decode_responses=False)
-    return LiveOutputSubscriber(subscriber_redis)
+    global _hub
+    if _hub is None:
+        _hub = LiveOutputHub()
+    return _hub
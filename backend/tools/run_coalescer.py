@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import redis.asyncio as redis
+
+from config import settings
+from utils.logger import logger
+from monitoring.tool_usage import record_wait
+
+# Tools whose output depends only on the resolved endpoint and their parameters,
+# so one run can safely be shared between scans that target the same host.
+COALESCIBLE_TOOLS = {"nmap_scan", "ssl_scan"}
+
+# Deletes the lock only if it is still ours: once it has expired, another scan may hold it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class ToolRunCoalescer:
+    """
+    Deduplicates identical tool invocations across scans and workers.
+
+    The first scan to request a given (tool, params) pair becomes the leader and
+    runs the tool while holding a Redis lock. Any other scan asking for the same
+    invocation while it is running waits for and reuses the leader's findings
+    instead of running the tool again. Scans arriving after the run finished
+    only reuse it within `result_ttl` seconds (off by default).
+    """
+    def __init__(self, client: redis.Redis, result_ttl: int, lock_ttl: int, poll_interval: float):
+        self.redis = client
+        self.result_ttl = result_ttl
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self._release_lock = client.register_script(RELEASE_LOCK_SCRIPT)
+        # Invocations running in this process, so local followers don't need Redis at all
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def make_key(tool_name: str, params: Dict[str, Any]) -> str:
+        """
+        Builds a stable key from the tool name and its (scan independent) parameters.
+        """
+        canonical = json.dumps(
+            {"tool": tool_name, "params": {k: v for k, v in params.items() if k != "scan_id"}},
+            sort_keys=True, separators=(",", ":"), default=str,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    async def run(
+        self,
+        tool_name: str,
+        params: Dict[str, Any],
+        scan_id: str,
+        runner: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Runs the tool once per identical invocation.
+
+        Returns the findings and the scan ID of the leader whose run produced them,
+        or None if this scan ran the tool itself.
+        """
+        key = self.make_key(tool_name, params)
+
+        local = self._inflight.get(key)
+        if local is not None:
+            started = time.monotonic()
+            try:
+                findings, leader = await asyncio.shield(local)
+            finally:
+                record_wait(time.monotonic() - started)
+            # Each scan gets its own copy so later mutation can't leak between scans
+            return json.loads(json.dumps(findings, default=str)), leader
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            findings, leader = await self._run_distributed(key, tool_name, scan_id, runner)
+            future.set_result((findings, leader or scan_id))
+            return findings, leader
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved if nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _run_distributed(
+        self,
+        key: str,
+        tool_name: str,
+        scan_id: str,
+        runner: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Tuple[Dict[str, Any], Optional[str]]:
+        result_key = f"tool_run:result:{key}"
+        lock_key = f"tool_run:lock:{key}"
+
+        # Identifies this run as the lock owner
+        token = f"{scan_id}:{uuid.uuid4().hex}"
+        started = time.monotonic()
+        # Runs that finished after this scan asked are always reused; older ones within result_ttl
+        arrived = time.time()
+        try:
+            while True:
+                cached = await self.redis.get(result_key)
+                if cached:
+                    entry = json.loads(cached)
+                    finished_at = entry.get("finished_at", 0)
+                    age = time.time() - finished_at
+                    if finished_at >= arrived or age <= self.result_ttl:
+                        record_wait(time.monotonic() - started)
+                        logger.info(f"Reusing {tool_name} results from scan {entry['leader']} ({age:.0f}s old).", extra={"scan_id": scan_id})
+                        return entry["findings"], entry["leader"]
+
+                if await self.redis.set(lock_key, token, nx=True, ex=self.lock_ttl):
+                    break
+
+                await asyncio.sleep(self.poll_interval)
+        except redis.RedisError as e:
+            record_wait(time.monotonic() - started)
+            logger.warning(f"Tool run coalescing unavailable, running {tool_name} directly: {e}", extra={"scan_id": scan_id})
+            return await runner(), None
+        record_wait(time.monotonic() - started)
+
+        try:
+            findings = await runner()
+        except BaseException:
+            await self._release(lock_key, token, tool_name, scan_id)
+            raise
+
+        try:
+            # Failed runs are not shared, so followers retry the tool themselves
+            if not findings.get("error"):
+                entry = json.dumps({"leader": scan_id, "findings": findings, "finished_at": time.time()}, default=str)
+                # Kept for a few polls at least, so scans waiting on this run find it
+                await self.redis.set(result_key, entry, ex=max(self.result_ttl, int(self.poll_interval * 5) + 1))
+        except redis.RedisError as e:
+            logger.warning(f"Failed to share {tool_name} results: {e}", extra={"scan_id": scan_id})
+        await self._release(lock_key, token, tool_name, scan_id)
+        return findings, None
+
+    async def _release(self, lock_key: str, token: str, tool_name: str, scan_id: str):
+        try:
+            await self._release_lock(keys=[lock_key], args=[token])
+        except redis.RedisError as e:
+            logger.warning(f"Failed to release coalescing lock for {tool_name}: {e}", extra={"scan_id": scan_id})
+
+
+# Singleton instance
+_coalescer: Optional[ToolRunCoalescer] = None
+
+def get_tool_run_coalescer() -> ToolRunCoalescer:
+    """
+    Returns a singleton instance of the ToolRunCoalescer.
+    """
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = ToolRunCoalescer(
+            redis.Redis.from_url(settings.REDIS_URL, decode_responses=True),
+            result_ttl=settings.TOOL_COALESCE_RESULT_TTL,
+            lock_ttl=settings.TOOL_COALESCE_LOCK_TTL,
+            poll_interval=settings.TOOL_COALESCE_POLL_INTERVAL,
+        )
+    return _coalescer
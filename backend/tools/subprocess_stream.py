@@ -2,6 +2,7 @@ import asyncio
 from typing import AsyncGenerator, List
 
 from utils.logger import logger
+from monitoring.tool_usage import record_output_bytes
 
 class SubprocessStreamer:
     """
@@ -54,6 +55,7 @@ class SubprocessStreamer:
                 stream = tasks.pop(task)
                 
                 if line_bytes:
+                    record_output_bytes(len(line_bytes))
                     yield line_bytes.decode('utf-8', errors='replace').strip()
                     # Re-schedule the read task for the same stream
                     tasks[asyncio.create_task(stream.readline())] = stream
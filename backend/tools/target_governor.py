@@ -0,0 +1,316 @@
+import asyncio
+import ipaddress
+import random
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import redis.asyncio as redis
+
+from config import settings
+from utils.logger import logger
+from monitoring.tool_usage import record_wait
+
+# Takes a concurrency slot and a request token for a host, if both are free.
+# Returns "0" when acquired, "-1" when all slots are taken, or the seconds to wait
+# for the next token (or for a server-requested pause to end).
+ACQUIRE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'limit', 'rate', 'tokens', 'last_refill', 'paused_until')
+local limit = tonumber(state[1]) or tonumber(ARGV[3])
+local rate = tonumber(state[2]) or tonumber(ARGV[4])
+local burst = math.max(1, rate)
+local tokens = tonumber(state[3]) or burst
+local last_refill = tonumber(state[4]) or now
+local paused_until = tonumber(state[5]) or 0
+tokens = math.min(burst, tokens + math.max(0, now - last_refill) * rate)
+
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local wait = 0
+if now < paused_until then
+    wait = paused_until - now
+elseif redis.call('ZCARD', KEYS[2]) >= math.max(1, math.floor(limit)) then
+    wait = -1
+elseif tokens < 1 then
+    wait = (1 - tokens) / rate
+else
+    tokens = tokens - 1
+    redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), ARGV[1])
+end
+
+redis.call('HSET', KEYS[1], 'limit', limit, 'rate', rate, 'tokens', tokens, 'last_refill', now)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return tostring(wait)
+"""
+
+# Frees a slot and adapts the host's limits to the outcome (AIMD): each success
+# adds about one slot and RATE_STEP requests/s per round, congestion signals
+# (429/503, 5xx, timeouts, slow responses) multiply both by DECREASE_FACTOR, at
+# most once per DECREASE_INTERVAL so one bad burst only counts once.
+RELEASE_SCRIPT = """
+redis.call('ZREM', KEYS[2], ARGV[1])
+local outcome = ARGV[2]
+if outcome == 'none' then
+    return 0
+end
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'limit', 'rate', 'last_decrease')
+local limit = tonumber(state[1])
+local rate = tonumber(state[2])
+if not limit or not rate then
+    return 0
+end
+local last_decrease = tonumber(state[3]) or 0
+
+if outcome == 'ok' then
+    limit = math.min(tonumber(ARGV[5]), limit + 1 / limit)
+    rate = math.min(tonumber(ARGV[7]), rate + tonumber(ARGV[8]) / rate)
+elseif now - last_decrease >= tonumber(ARGV[10]) then
+    limit = math.max(tonumber(ARGV[4]), limit * tonumber(ARGV[9]))
+    rate = math.max(tonumber(ARGV[6]), rate * tonumber(ARGV[9]))
+    last_decrease = now
+end
+redis.call('HSET', KEYS[1], 'limit', limit, 'rate', rate, 'last_decrease', last_decrease)
+local retry_after = tonumber(ARGV[3])
+if retry_after > 0 then
+    redis.call('HSET', KEYS[1], 'paused_until', now + retry_after)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[11])
+return 1
+"""
+
+# Pushes a held slot's expiry forward
+RENEW_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+return redis.call('ZADD', KEYS[1], 'XX', now + tonumber(ARGV[2]), ARGV[1])
+"""
+
+# How a response or failure counts for AIMD
+OUTCOME_OK = "ok"
+OUTCOME_THROTTLED = "throttled"  # 429 or 503
+OUTCOME_ERROR = "error"  # other 5xx, connection errors
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_SLOW = "slow"  # slower than GOVERNOR_LATENCY_TARGET
+OUTCOME_NONE = "none"  # nothing learned, just free the slot
+
+
+class GovernorTimeout(Exception):
+    """ Raised when no slot for a host frees up within GOVERNOR_ACQUIRE_TIMEOUT. """
+
+
+def target_host(target: str) -> str:
+    """
+    The host part of a URL, host:port or bare host, lowercased; the governor's key.
+    """
+    parsed = urlparse(target if "://" in target else f"//{target}")
+    return (parsed.hostname or target).lower()
+
+def classify_exit(returncode: Optional[int], timed_out: bool = False, throttled: bool = False) -> str:
+    """
+    How an external tool run counts for AIMD, from its exit status and whether
+    its output showed the target throttling it.
+    """
+    if throttled:
+        return OUTCOME_THROTTLED
+    if timed_out:
+        return OUTCOME_TIMEOUT
+    if returncode != 0:
+        return OUTCOME_ERROR
+    return OUTCOME_OK
+
+def classify_response(status_code: int, latency: float) -> str:
+    if status_code in (429, 503):
+        return OUTCOME_THROTTLED
+    if status_code >= 500:
+        return OUTCOME_ERROR
+    if latency > settings.GOVERNOR_LATENCY_TARGET:
+        return OUTCOME_SLOW
+    return OUTCOME_OK
+
+
+class GovernorSlot:
+    """
+    A slot held for a whole external tool run. Carries the host's limits when it
+    was taken, for the tool's own rate and thread options, and the outcome the
+    tool reports before the slot is released.
+    """
+    def __init__(self, concurrency: int, rate: float):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.outcome = OUTCOME_NONE
+        self.retry_after = 0.0
+
+    def delay(self, threads: int = 1) -> float:
+        """ Seconds each of `threads` connections waits between requests to keep to the rate. """
+        return threads / self.rate
+
+    def report(self, outcome: str, retry_after: float = 0.0):
+        self.outcome = outcome
+        self.retry_after = retry_after
+
+
+class TargetGovernor:
+    """
+    Limits concurrent connections and requests per second to each target host,
+    across every worker, so overlapping scans can't overwhelm a customer's host.
+
+    The state of a host lives in Redis: its current limits and token bucket in
+    `governor:<host>`, and the slots in use in `governor:<host>:slots` (a sorted
+    set of leases scored by expiry, so slots of crashed workers free up by
+    themselves). Both limits start at the configured initial values and adapt
+    with AIMD to the outcomes reported on release.
+
+    Hosts are keyed by their resolved address, so a tool given an IP and one
+    given the domain name share the same limits.
+
+    HTTP testers go through GovernedTransport (one slot per request); external
+    tools hold one slot for their whole run, are told the current limits and
+    report how the run went. If Redis is unreachable, requests go through ungoverned.
+    """
+    def __init__(self, client: redis.Redis):
+        self.redis = client
+        self._acquire = client.register_script(ACQUIRE_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+        self._renew = client.register_script(RENEW_SCRIPT)
+        # Host name -> (address, resolved at)
+        self._resolved: Dict[str, Tuple[str, float]] = {}
+
+    @staticmethod
+    def _keys(host: str):
+        return [f"governor:{host}", f"governor:{host}:slots"]
+
+    async def resolve(self, host: str) -> str:
+        """
+        The address the governor keys a host on: the host itself if it is an IP,
+        else its first IPv4 (or IPv6) address, cached for GOVERNOR_RESOLVE_TTL.
+        Falls back to the name if it does not resolve.
+        """
+        host = host.lower()
+        if not settings.GOVERNOR_ENABLED:
+            return host
+        try:
+            return ipaddress.ip_address(host).compressed
+        except ValueError:
+            pass
+        cached = self._resolved.get(host)
+        if cached is not None and time.monotonic() - cached[1] < settings.GOVERNOR_RESOLVE_TTL:
+            return cached[0]
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except OSError as e:
+            logger.debug(f"Could not resolve {host} for the target governor: {e}")
+            return host
+        # Sorted, so round-robin DNS answers don't split a host across keys
+        address = min((family != socket.AF_INET, info[0]) for family, _, _, _, info in infos)[1]
+        if len(self._resolved) >= 10000:
+            self._resolved.clear()
+        self._resolved[host] = (address, time.monotonic())
+        return address
+
+    async def acquire(self, host: str, lease_ttl: float) -> Optional[str]:
+        """
+        Waits for a slot and a request token for the host. Returns the lease to
+        pass to `release`, or None if the governor is off or unavailable.
+        """
+        if not settings.GOVERNOR_ENABLED:
+            return None
+        lease = uuid.uuid4().hex
+        started = time.monotonic()
+        deadline = started + settings.GOVERNOR_ACQUIRE_TIMEOUT
+        try:
+            while True:
+                wait = float(await self._acquire(
+                    keys=self._keys(host),
+                    args=[lease, lease_ttl, settings.GOVERNOR_INITIAL_CONCURRENCY, settings.GOVERNOR_INITIAL_RATE, settings.GOVERNOR_STATE_TTL],
+                ))
+                if wait == 0:
+                    return lease
+                if time.monotonic() >= deadline:
+                    raise GovernorTimeout(f"No request slot for {host} within {settings.GOVERNOR_ACQUIRE_TIMEOUT}s.")
+                if wait < 0:
+                    wait = settings.GOVERNOR_POLL_INTERVAL
+                # Jitter keeps waiting workers from retrying in lockstep
+                await asyncio.sleep(min(wait, settings.GOVERNOR_POLL_INTERVAL) * random.uniform(0.8, 1.2))
+        except redis.RedisError as e:
+            logger.warning(f"Target governor unavailable, not limiting requests to {host}: {e}")
+            return None
+        finally:
+            record_wait(time.monotonic() - started)
+
+    async def release(self, host: str, lease: Optional[str], outcome: str = OUTCOME_NONE, retry_after: float = 0.0):
+        """
+        Frees the slot and feeds the outcome of the request into the host's limits.
+        """
+        if lease is None:
+            return
+        try:
+            await self._release(
+                keys=self._keys(host),
+                args=[
+                    lease, outcome, retry_after,
+                    settings.GOVERNOR_MIN_CONCURRENCY, settings.GOVERNOR_MAX_CONCURRENCY,
+                    settings.GOVERNOR_MIN_RATE, settings.GOVERNOR_MAX_RATE, settings.GOVERNOR_RATE_STEP,
+                    settings.GOVERNOR_DECREASE_FACTOR, settings.GOVERNOR_DECREASE_INTERVAL, settings.GOVERNOR_STATE_TTL,
+                ],
+            )
+        except redis.RedisError as e:
+            # The lease expires on its own
+            logger.warning(f"Failed to release the governor slot for {host}: {e}")
+
+    async def _current_slot(self, host: str) -> GovernorSlot:
+        try:
+            limit, rate = await self.redis.hmget(self._keys(host)[0], "limit", "rate")
+        except redis.RedisError:
+            limit, rate = None, None
+        return GovernorSlot(
+            max(1, int(float(limit or settings.GOVERNOR_INITIAL_CONCURRENCY))),
+            float(rate or settings.GOVERNOR_INITIAL_RATE),
+        )
+
+    @asynccontextmanager
+    async def hold(self, host: str) -> AsyncIterator[Optional[GovernorSlot]]:
+        """
+        Holds one slot for the host for as long as the block runs, e.g. an external
+        tool run. Yields the slot (None when ungoverned); the outcome reported on
+        it adapts the host's limits on release.
+        """
+        host = await self.resolve(host)
+        lease_ttl = settings.GOVERNOR_LEASE_TTL
+        lease = await self.acquire(host, lease_ttl)
+        slot = await self._current_slot(host) if lease else None
+        renewer = asyncio.create_task(self._keep_alive(host, lease, lease_ttl)) if lease else None
+        try:
+            yield slot
+        finally:
+            if renewer is not None:
+                renewer.cancel()
+            if slot is not None:
+                await self.release(host, lease, slot.outcome, slot.retry_after)
+
+    async def _keep_alive(self, host: str, lease: str, lease_ttl: float):
+        while True:
+            await asyncio.sleep(lease_ttl / 3)
+            try:
+                await self._renew(keys=self._keys(host)[1:], args=[lease, lease_ttl])
+            except redis.RedisError as e:
+                logger.warning(f"Failed to renew the governor slot for {host}: {e}")
+
+
+# Singleton instance
+_target_governor: Optional[TargetGovernor] = None
+
+def get_target_governor() -> TargetGovernor:
+    """
+    Returns a singleton instance of the TargetGovernor.
+    """
+    global _target_governor
+    if _target_governor is None:
+        _target_governor = TargetGovernor(redis.Redis.from_url(settings.REDIS_URL, decode_responses=True))
+    return _target_governor
@@ -1,56 +1,94 @@
 import asyncio
+import re
 import uuid
 import shutil
 import json # Import json for message serialization
-from typing import List, Dict, Any, Set
+from typing import Callable, List, Dict, Any, Optional, Set
 
 from utils.logger import logger
-from tools.live_output import get_live_output_publisher
-from tools.subprocess_stream import SubprocessStreamer
+from tools.live_output import LiveOutputStream, get_live_output_publisher
+from tools.command_runner import run_command
+from utils.live_feed import live_feed_channel
+from tools.run_coalescer import COALESCIBLE_TOOLS, get_tool_run_coalescer
+from monitoring.tool_usage import ToolUsageTracker
+from monitoring.metrics import TOOL_DURATION, TOOLS_SKIPPED
+from tools.target_governor import GovernorSlot, classify_exit, get_target_governor, target_host
 
-# Import all scanner and offensive functions
-from scanners import nmap_scanner, ssl_scanner, header_analyzer, vuln_analyzer
-from offensive import sql_tester, dir_discovery, xss_tester, sqlmap_scanner, xss_scanner
+# Scanner and offensive modules (nmap, bs4, httpx...) are imported when a tool first runs,
+# so importing the controller stays cheap for the API process
 from config import settings
 
+# Tools backed by an external binary, by the setting holding its path
+CLI_TOOL_PATHS = {
+    "nmap_scan": "NMAP_PATH",
+    "ssl_scan": "SSLSCAN_PATH",
+    "nikto_scan": "NIKTO_PATH",
+    "sqlmap_scan": "SQLMAP_PATH",
+    "xsser_scan": "XSSER_PATH",
+}
+
+# Tools that send their own traffic to the target; each run holds one governor slot for its host,
+# is passed it (`slot`) to pace itself and reports its outcome on it.
+# The Python testers are governed per request by GovernedTransport instead.
+EXTERNAL_TOOLS: Set[str] = set(CLI_TOOL_PATHS) | {"dir_discovery"}
+
+# Every tool a pipeline step can name
+TOOL_NAMES = (
+    "nmap_scan", "ssl_scan", "header_analysis", "vulnerability_analysis", "sql_injection_test",
+    "xss_test", "dir_discovery", "nikto_scan", "sqlmap_scan", "xsser_scan",
+)
+
 AVAILABLE_TOOLS: Set[str] = set()
+_tools_checked = False
 
-def check_tool_availability():
+# Nikto reports each finding on a "+ " line; some of those are scan metadata instead
+NIKTO_ITEM_PATTERN = re.compile(r"^\+ (.+)$")
+NIKTO_INFO_PATTERN = re.compile(r"^(Target (IP|Hostname|Port)|Start Time|End Time|SSL Info|\d+ host\(s\) tested|\d+ requests?:)")
+# Nikto gives up on a host that keeps failing or refusing requests
+NIKTO_ERROR_LIMIT_PATTERN = re.compile(r"^\+ ERROR: Error limit \(\d+\) reached")
+
+def check_tool_availability() -> Set[str]:
     """Checks for the presence of required command-line tools."""
-    global AVAILABLE_TOOLS
-    tool_paths = {
-        "nmap_scan": settings.NMAP_PATH,
-        "ssl_scan": settings.SSLSCAN_PATH,
-        "nikto_scan": settings.NIKTO_PATH,
-        "sqlmap_scan": settings.SQLMAP_PATH,
-        "xsser_scan": settings.XSSER_PATH,
-    }
-    for tool_name, path in tool_paths.items():
+    global _tools_checked
+    available = set()
+    for tool_name, setting in CLI_TOOL_PATHS.items():
+        path = getattr(settings, setting)
         if shutil.which(path):
-            AVAILABLE_TOOLS.add(tool_name)
+            available.add(tool_name)
         else:
             logger.warning(f"Tool '{tool_name}' not found at path: {path}. This tool will be unavailable.")
+    AVAILABLE_TOOLS.clear()
+    AVAILABLE_TOOLS.update(available)
+    _tools_checked = True
+    return AVAILABLE_TOOLS
 
-# Run check on startup
-check_tool_availability()
+def get_available_tools() -> Set[str]:
+    """
+    Returns the CLI tools found on this host. The PATH is searched once, on first
+    use or at process startup, and cached for the life of the process.
+    """
+    if not _tools_checked:
+        check_tool_availability()
+    return AVAILABLE_TOOLS
 
 
 class ToolController:
     def __init__(self, scan_id: str):
         self.scan_id = scan_id
-        # Change channel name to match LiveFeedHandler
-        self.output_channel = f"scan_live_feed:{self.scan_id}" 
+        self.output_channel = live_feed_channel(self.scan_id)
         self.publisher = get_live_output_publisher()
+        self.output_stream = LiveOutputStream(self.publisher, self.output_channel)
         self.results: List[Dict[str, Any]] = []
+        self.coalescer = get_tool_run_coalescer()
 
         # Mapping of tool names to their functions
         self.tool_functions = {
             "nmap_scan": self._run_nmap,
             "ssl_scan": self._run_sslscan,
-            "header_analysis": header_analyzer.run_header_analysis,
+            "header_analysis": self._run_header_analysis,
             "vulnerability_analysis": self._run_vuln_analysis,
-            "sql_injection_test": sql_tester.run_sql_test,
-            "xss_test": xss_tester.run_xss_test,
+            "sql_injection_test": self._run_sql_test,
+            "xss_test": self._run_xss_test,
             "dir_discovery": self._run_dir_discovery,
             "nikto_scan": self._run_nikto,
             "sqlmap_scan": self._run_sqlmap,
@@ -70,26 +108,36 @@ class ToolController:
                     if tool_name not in self.tool_functions:
                         logger.warning(f"[{self.scan_id}] Tool '{tool_name}' not recognized. Skipping.", extra={"scan_id": self.scan_id})
                         await self.publisher.publish(self.output_channel, json.dumps({"level": "WARNING", "message": f"Tool '{tool_name}' not recognized. Skipping."}))
+                        TOOLS_SKIPPED.labels(tool_name, "unknown").inc()
                         continue
                     
-                    if tool_name in ["nmap_scan", "ssl_scan", "nikto_scan", "sqlmap_scan", "xsser_scan"] and tool_name not in AVAILABLE_TOOLS:
+                    if tool_name in CLI_TOOL_PATHS and tool_name not in get_available_tools():
                         logger.warning(f"[{self.scan_id}] Tool '{tool_name}' is not available. Skipping.", extra={"scan_id": self.scan_id})
                         await self.publisher.publish(self.output_channel, json.dumps({"level": "WARNING", "message": f"SKIPPED: Tool '{tool_name}' is not installed or configured correctly."}))
+                        TOOLS_SKIPPED.labels(tool_name, "unavailable").inc()
                         continue
 
                     await self.publisher.publish(self.output_channel, json.dumps({"level": "INFO", "message": f"\n--- Running {tool_name} ---"}))
                     logger.info(f"[{self.scan_id}] Running tool: {tool_name} with params: {params}", extra={"scan_id": self.scan_id})
 
+                    usage_tracker = ToolUsageTracker()
                     try:
-                        if tool_name == "vulnerability_analysis":
-                            # Pass scan_id to vuln_analyzer
-                            result_data = await self.tool_functions[tool_name](self.results, self.scan_id)
-                        else:
-                            # Pass scan_id to individual tool functions
-                            params_with_scan_id = {**params, "scan_id": self.scan_id}
-                            result_data = await self.tool_functions[tool_name](**params_with_scan_id)
-                        
-                        result = {"tool_name": tool_name, "findings": result_data}
+                        async with usage_tracker:
+                            if tool_name == "vulnerability_analysis":
+                                # Pass scan_id to vuln_analyzer
+                                result_data = await self.tool_functions[tool_name](self.results, self.scan_id)
+                                leader_scan_id = None
+                            else:
+                                # Pass scan_id to individual tool functions
+                                params_with_scan_id = {**params, "scan_id": self.scan_id}
+                                result_data, leader_scan_id = await self._run_tool(tool_name, params, params_with_scan_id)
+
+                        result = {"tool_name": tool_name, "findings": result_data, "usage": usage_tracker.usage.to_dict()}
+                        outcome = "coalesced" if leader_scan_id else "error" if result_data.get("error") else "success"
+                        TOOL_DURATION.labels(tool_name, outcome).observe(usage_tracker.usage.wall_time)
+                        if leader_scan_id:
+                            result["coalesced_from"] = leader_scan_id
+                            await self.publisher.publish(self.output_channel, json.dumps({"level": "INFO", "message": f"{tool_name}: reusing results of an identical run from scan {leader_scan_id}."}))
                         self.results.append(result)
 
                         summary = result_data.get("summary", f"Completed. Found {len(result_data.get('vulnerabilities', []))} issues.")
@@ -99,57 +147,122 @@ class ToolController:
                         error_msg = f"Tool '{tool_name}' timed out."
                         logger.warning(f"[{self.scan_id}] {error_msg}", extra={"scan_id": self.scan_id})
                         await self.publisher.publish(self.output_channel, json.dumps({"level": "ERROR", "message": f"ERROR: {error_msg}"}))
-                        self.results.append({"tool_name": tool_name, "error": "Timeout"})
+                        self.results.append({"tool_name": tool_name, "error": "Timeout", "usage": usage_tracker.usage.to_dict()})
+                        TOOL_DURATION.labels(tool_name, "timeout").observe(usage_tracker.usage.wall_time)
                     except Exception as e:
                         error_msg = f"Error running tool '{tool_name}': {e}"
                         logger.error(f"[{self.scan_id}] {error_msg}", exc_info=True, extra={"scan_id": self.scan_id})
                         await self.publisher.publish(self.output_channel, json.dumps({"level": "ERROR", "message": f"ERROR: {error_msg}"}))
-                        self.results.append({"tool_name": tool_name, "error": str(e)})
+                        self.results.append({"tool_name": tool_name, "error": str(e), "usage": usage_tracker.usage.to_dict()})
+                        TOOL_DURATION.labels(tool_name, "error").observe(usage_tracker.usage.wall_time)
 
         except asyncio.TimeoutError:
             logger.warning(f"[{self.scan_id}] The entire scan pipeline timed out after {timeout} seconds.", extra={"scan_id": self.scan_id})
             await self.publisher.publish(self.output_channel, json.dumps({"level": "WARNING", "message": f"--- SCAN TIMEOUT: The scan exceeded the maximum duration of {timeout} seconds. ---"}))
 
+        await self.output_stream.close()
         await self.publisher.publish(self.output_channel, json.dumps({"level": "INFO", "message": f"--- Scan {self.scan_id} finished ---"}))
         logger.info(f"[{self.scan_id}] Tool pipeline execution finished.", extra={"scan_id": self.scan_id})
         return self.results
         
-    async def _stream_cli_tool(self, command: List[str], tool_name: str, scan_id: str):
-        """ Helper to stream CLI tool output and return a placeholder result. """
-        streamer = SubprocessStreamer(command)
-        async for line in streamer.start():
-            # Only publish specific output lines from cli tools, not all raw output
-            # Need to refine filtering here, for now pass all but in real implementation, filter
-            # Also, wrap in JSON as expected by frontend
-            await self.publisher.publish(self.output_channel, json.dumps({"level": "DEBUG", "message": line}))
-        return {"summary": f"{tool_name} scan completed. Check logs for details."}
-
-    async def _run_nmap(self, target: str, options: str, scan_id: str):
+    async def _run_tool(self, tool_name: str, params: Dict[str, Any], params_with_scan_id: Dict[str, Any]):
+        """ Runs a tool, sharing the run with other scans when the invocation is identical. """
+        tool_function = self.tool_functions[tool_name]
+        target = params.get("target") or params.get("url")
+
+        async def run():
+            if tool_name in EXTERNAL_TOOLS and target:
+                # Inside the shared run, so scans following a coalesced run don't hold a slot
+                async with get_target_governor().hold(target_host(target)) as slot:
+                    return await tool_function(**params_with_scan_id, slot=slot)
+            return await tool_function(**params_with_scan_id)
+
+        if tool_name in COALESCIBLE_TOOLS and settings.TOOL_COALESCE_ENABLED:
+            return await self.coalescer.run(tool_name, params, self.scan_id, run)
+        return await run(), None
+
+    async def _stream_cli_tool(self, command: List[str], tool_name: str, scan_id: str, on_line: Optional[Callable[[str], None]] = None,
+                               timeout: Optional[float] = None):
+        """
+        Helper to run a CLI tool, streaming its output to the live feed (and with it
+        the scan's output log) while the full output is kept as an artifact.
+        """
+        def handle_line(line: str):
+            # Lines are batched into frames and rate limited by the output stream
+            self.output_stream.feed(line)
+            if on_line is not None:
+                on_line(line)
+
+        outcome = await run_command(command, scan_id=scan_id, tool_name=tool_name, on_stdout=handle_line, on_stderr=self.output_stream.feed, timeout=timeout)
+        await self.output_stream.flush()
+        return outcome
+
+    async def _run_nmap(self, target: str, options: str, scan_id: str, slot: Optional[GovernorSlot] = None):
+        from scanners import nmap_scanner
         # nmap_scanner has its own streaming logic, so we don't use _stream_cli_tool
-        return await nmap_scanner.run_nmap_scan(target, options, scan_id)
+        return await nmap_scanner.run_nmap_scan(target, options, scan_id, slot)
 
-    async def _run_sslscan(self, target: str, scan_id: str):
+    async def _run_sslscan(self, target: str, scan_id: str, slot: Optional[GovernorSlot] = None):
+        from scanners import ssl_scanner
         # ssl_scanner has its own streaming, but we'll wrap it for consistency
-        return await ssl_scanner.run_ssl_scan(target, scan_id)
+        return await ssl_scanner.run_ssl_scan(target, scan_id, slot)
+
+    async def _run_header_analysis(self, url: str, scan_id: Optional[str] = None):
+        from scanners import header_analyzer
+        return await header_analyzer.run_header_analysis(url, scan_id)
+
+    async def _run_sql_test(self, url: str, scan_id: Optional[str] = None):
+        from offensive import sql_tester
+        return await sql_tester.run_sql_test(url, scan_id)
 
-    async def _run_dir_discovery(self, target: str, scan_id: str):
+    async def _run_xss_test(self, url: str, scan_id: Optional[str] = None):
+        from offensive import xss_tester
+        return await xss_tester.run_xss_test(url, scan_id)
+
+    async def _run_dir_discovery(self, target: str, scan_id: str, slot: Optional[GovernorSlot] = None):
+        from offensive import dir_discovery
         # This one has its own logic for directory discovery
-        return await dir_discovery.run_dir_discovery(target, scan_id)
+        return await dir_discovery.run_dir_discovery(target, scan_id, slot)
 
-    async def _run_nikto(self, target: str, scan_id: str):
+    async def _run_nikto(self, target: str, scan_id: str, slot: Optional[GovernorSlot] = None):
         command = [settings.NIKTO_PATH, "-h", target]
-        # Pass scan_id to _stream_cli_tool
-        return await self._stream_cli_tool(command, "nikto_scan", scan_id)
+        if slot is not None:
+            command += ["-Pause", f"{slot.delay():.3f}"]
+        items: List[str] = []
+        gave_up = False
+
+        def collect_item(line: str):
+            nonlocal gave_up
+            if NIKTO_ERROR_LIMIT_PATTERN.match(line):
+                gave_up = True
+            match = NIKTO_ITEM_PATTERN.match(line)
+            if match and not NIKTO_INFO_PATTERN.match(match.group(1)) and len(items) < settings.NIKTO_MAX_ITEMS:
+                items.append(match.group(1))
+
+        outcome = await self._stream_cli_tool(command, "nikto_scan", scan_id, on_line=collect_item, timeout=settings.NIKTO_TIMEOUT)
+        findings: Dict[str, Any] = {
+            "summary": f"nikto_scan completed. Reported {len(items)} items; the raw output is stored with the scan.",
+            "items": items,
+        }
+        if outcome.timed_out or outcome.truncated:
+            findings["error"] = "Nikto output was cut short (deadline or output cap reached)."
+        if slot is not None:
+            # Nikto's exit status says little; its error limit is the sign the host struggled
+            slot.report(classify_exit(1 if gave_up else 0, outcome.timed_out))
+        return findings
 
 
 
-    async def _run_sqlmap(self, target: str, scan_id: str, aggressive: bool = False):
-        return await sqlmap_scanner.run_sqlmap_scan(target, scan_id, aggressive)
+    async def _run_sqlmap(self, target: str, scan_id: str, aggressive: bool = False, slot: Optional[GovernorSlot] = None):
+        from offensive import sqlmap_scanner
+        return await sqlmap_scanner.run_sqlmap_scan(target, aggressive=aggressive, scan_id=scan_id, slot=slot)
 
-    async def _run_xsser(self, target: str, scan_id: str, aggressive: bool = False):
-        return await xss_scanner.run_xsser_scan(target, scan_id, aggressive)
+    async def _run_xsser(self, target: str, scan_id: str, aggressive: bool = False, slot: Optional[GovernorSlot] = None):
+        from offensive import xss_scanner
+        return await xss_scanner.run_xsser_scan(target, aggressive=aggressive, scan_id=scan_id, slot=slot)
         
     async def _run_vuln_analysis(self, full_results: List[Dict[str, Any]], scan_id: str):
+        from scanners import vuln_analyzer
         return await vuln_analyzer.run_vulnerability_analysis(full_results, scan_id)
 
 
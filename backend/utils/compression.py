@@ -0,0 +1,81 @@
+"""
+Streaming compression for stored report artifacts.
+
+Supported content encodings are "gzip" (standard library) and "zstd" (the
+`zstandard` package, in requirements.txt). The names match HTTP `Content-Encoding` values,
+so stored bytes can be sent to clients as they are.
+"""
+import zlib
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # Listed in requirements.txt; without it only gzip is offered
+    zstandard = None
+
+GZIP_WBITS = 31  # zlib container format with a gzip header and trailer
+
+
+def supported_encodings() -> set:
+    return {"gzip", "zstd"} if zstandard is not None else {"gzip"}
+
+def _compressor(encoding: str):
+    if encoding == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package.")
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+def _decompressor(encoding: str):
+    if encoding == "gzip":
+        return zlib.decompressobj(GZIP_WBITS)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd decompression requires the 'zstandard' package.")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+def compress_chunks(chunks: Iterable[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    """
+    Compresses a stream of chunks. Passes them through unchanged if encoding is None.
+    """
+    if encoding is None:
+        yield from chunks
+        return
+    compressor = _compressor(encoding)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+async def decompress_chunks(chunks: AsyncIterator[bytes], encoding: Optional[str]) -> AsyncIterator[bytes]:
+    """
+    Decompresses a stream of chunks. Passes them through unchanged if encoding is None.
+    """
+    if encoding is None:
+        async for chunk in chunks:
+            yield chunk
+        return
+    decompressor = _decompressor(encoding)
+    async for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    if encoding == "gzip":
+        remaining = decompressor.flush()
+        if remaining:
+            yield remaining
+
+def decompress(data: bytes, encoding: Optional[str]) -> bytes:
+    """
+    Decompresses a complete artifact.
+    """
+    if encoding is None:
+        return data
+    if encoding == "zstd":
+        decompressor = _decompressor(encoding)
+        return decompressor.decompress(data)
+    return zlib.decompress(data, GZIP_WBITS)
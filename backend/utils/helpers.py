@@ -1,28 +1,12 @@
-import asyncio
 import json
 from datetime import datetime
 import uuid
 import os
 import shutil
+import orjson
+from typing import Any
 from utils.logger import logger
 
-async def run_command(command: str) -> tuple[str, str]:
-    """
-    Asynchronously runs a shell command and returns stdout and stderr.
-    
-    Args:
-        command: The command to execute.
-        
-    Returns:
-        A tuple containing stdout and stderr as strings.
-    """
-    process = await asyncio.create_subprocess_shell(
-        command,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate()
-    return stdout.decode().strip(), stderr.decode().strip()
 from utils.logger import logger
 
 import shutil
@@ -62,6 +46,13 @@ def to_json(data: dict) -> str:
     """
     return json.dumps(data, indent=4, sort_keys=True, cls=CustomJsonEncoder)
 
+def to_compact_json(data: Any) -> str:
+    """
+    Serializes data to a compact JSON string for storage (no indentation, keys in insertion order).
+    Datetimes and UUIDs are handled natively by orjson.
+    """
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
 def get_timestamp() -> str:
     """
     Returns the current timestamp in a standardized format.
@@ -0,0 +1,70 @@
+"""
+Names and wire format shared by everything that writes to or reads from a
+scan's live feed.
+
+Every live feed message is a JSON object. It is appended to the scan's output
+log (a capped Redis Stream) and published on the scan's channel in one atomic
+script call, so live subscribers and replaying readers see the same entry ID
+(`"id"`) for the same message. This module has no project imports so the
+logging setup can use it as well.
+"""
+import json
+import re
+from typing import Tuple
+
+LIVE_FEED_CHANNEL_PREFIX = "scan_live_feed:"
+OUTPUT_LOG_PREFIX = "scan_output_log:"
+
+# Stream entry IDs, the cursors clients pass back
+ENTRY_ID_PATTERN = re.compile(r"\d+-\d+")
+
+# `event` of the worker's final message for a scan; viewers are closed after it
+SCAN_FINISHED_EVENT = "scan_finished"
+
+# KEYS[1]: output log stream, KEYS[2]: live channel
+# ARGV[1]: JSON object message, ARGV[2]: approximate max entries,
+# ARGV[3]: retention in seconds, ARGV[4]: '1' to also publish live
+APPEND_AND_PUBLISH_SCRIPT = """
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[2], '*', 'm', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+if ARGV[4] == '1' then
+    redis.call('PUBLISH', KEYS[2], '{"id": "' .. id .. '", ' .. string.sub(ARGV[1], 2))
+end
+return id
+"""
+
+def live_feed_channel(scan_id: str) -> str:
+    return f"{LIVE_FEED_CHANNEL_PREFIX}{scan_id}"
+
+def output_log_key(scan_id: str) -> str:
+    return f"{OUTPUT_LOG_PREFIX}{scan_id}"
+
+def scan_id_from_channel(channel: str) -> str:
+    return channel[len(LIVE_FEED_CHANNEL_PREFIX):]
+
+def viewers_key(channel: str) -> str:
+    """ Redis key that the API refreshes while anyone is watching the channel. """
+    return f"{channel}:viewers"
+
+def with_entry_id(entry_id: str, message: str) -> str:
+    """ Adds the log entry ID to a stored message, exactly as the script does for live ones. """
+    return f'{{"id": "{entry_id}", {message[1:]}'
+
+def is_entry_id(value: str) -> bool:
+    return ENTRY_ID_PATTERN.fullmatch(value) is not None
+
+def parse_entry_id(entry_id: str) -> Tuple[int, int]:
+    """ Turns a stream entry ID ("<ms>-<seq>") into a comparable tuple. """
+    millis, _, sequence = entry_id.partition("-")
+    return int(millis), int(sequence or 0)
+
+def is_scan_finished(message: str) -> bool:
+    """ Whether a live feed message is the scan-finished event. """
+    # Only messages mentioning the event are parsed, so ordinary output stays cheap
+    if SCAN_FINISHED_EVENT not in message:
+        return False
+    try:
+        payload = json.loads(message)
+    except ValueError:
+        return False
+    return isinstance(payload, dict) and payload.get("event") == SCAN_FINISHED_EVENT
@@ -1,112 +1,219 @@
+import atexit
+import copy
+import json # Import json for message serialization
 import logging
+import queue
+import re
 import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional, Tuple
+
 import redis
-import json # Import json for message serialization
 
 from config import settings
+from monitoring.metrics import REDIS_PUBLISH_ERRORS, REDIS_PUBLISHES
+from utils.live_feed import APPEND_AND_PUBLISH_SCRIPT, live_feed_channel, output_log_key
 
-# Create a custom logger
+# Create a custom logger. Its handlers (and their threads and log file) are only
+# set up by `setup_logging`, which the API and worker entrypoints call.
 logger = logging.getLogger(settings.PROJECT_NAME)
 logger.setLevel(settings.LOG_LEVEL)
+logger.propagate = False
+
+# Keywords that make a record worth showing in the live feed even at unusual levels.
+# Compiled once; the old per-call lowercase-and-scan over the list was measurable.
+USER_RELEVANT_PATTERN = re.compile(
+    "|".join(re.escape(keyword) for keyword in [
+        "Target resolved", "Scan Started", "Scan Finished", "Nmap", "SSL Scan",
+        "Header Analysis", "Directory Discovery", "SQLMap", "XSS",
+        "Vulnerability Detected", "Risk assessment", "Reports generated",
+        "WARNING", "ERROR", "COMPLETE", "SUCCESS", "Open Ports Found", "Reflected XSS Detected",
+        "SQL injection vulnerability detected", "Wordlist Not Found",
+    ]),
+    re.IGNORECASE,
+)
+# Internal messages that should never reach the live feed
+EXCLUDED_PATTERN = re.compile(r"Tool pipeline built")
+LIVE_FEED_LEVELS = {logging.INFO, logging.WARNING, logging.ERROR}
 
-# Initialize Redis client for LiveFeedHandler
-# This should ideally be handled more robustly (e.g., connection pooling, error handling)
-# but for now, a direct client is sufficient for demonstration.
-try:
-    redis_client = redis.StrictRedis.from_url(settings.REDIS_URL, decode_responses=True)
-    redis_client.ping() # Test connection
-except redis.exceptions.ConnectionError as e:
-    logger.error(f"Could not connect to Redis for LiveFeedHandler: {e}")
-    redis_client = None
 
 class LiveFeedHandler(logging.Handler):
     """
-    A custom logging handler that publishes user-relevant log messages to a Redis channel
-    for real-time frontend display.
+    A logging handler that publishes user-relevant, scan-tagged records to the
+    scan's live feed for real-time frontend display.
+
+    It runs on the queue listener's thread, never on the event loop. Records are
+    buffered and sent in batches as one pipelined round trip, either when the
+    batch is full or every LOG_LIVE_FEED_FLUSH_INTERVAL seconds, once `start`
+    has started the flusher thread. The Redis connection is opened lazily on
+    the first flush.
     """
-    def emit(self, record):
-        if redis_client is None:
-            return # Don't try to publish if Redis is not connected
-
-        try:
-            # Only process records that have a 'scan_id' extra field
-            if not hasattr(record, 'scan_id'):
+    def __init__(self, batch_size: int = settings.LOG_LIVE_FEED_BATCH_SIZE, flush_interval: float = settings.LOG_LIVE_FEED_FLUSH_INTERVAL):
+        super().__init__()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[Tuple[str, str]] = []
+        self._buffer_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._client: Optional[redis.Redis] = None
+        self._script = None
+        self._retry_at = 0.0
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name="live-feed-flusher", daemon=True)
+
+    def start(self):
+        self._flusher.start()
+
+    def emit(self, record: logging.LogRecord):
+        scan_id = getattr(record, "scan_id", None)
+        if not scan_id:
+            return
+
+        message = record.getMessage()
+        if EXCLUDED_PATTERN.search(message):
+            return
+        if record.levelno not in LIVE_FEED_LEVELS and not USER_RELEVANT_PATTERN.search(message):
+            return
+
+        # Format the message for the frontend
+        payload = json.dumps({
+            "level": record.levelname,
+            "message": message,
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+        })
+        with self._buffer_lock:
+            self._buffer.append((scan_id, payload))
+            batch_full = len(self._buffer) >= self.batch_size
+        if batch_full:
+            self.flush()
+
+    def flush(self):
+        """
+        Sends everything buffered so far in one pipelined round trip.
+        """
+        with self._send_lock:
+            with self._buffer_lock:
+                batch, self._buffer = self._buffer, []
+            if not batch or not self._connect():
                 return
+            try:
+                pipe = self._client.pipeline(transaction=False)
+                for scan_id, payload in batch:
+                    # Logged to the scan's output log as well, so late viewers can replay it
+                    self._script(
+                        keys=[output_log_key(scan_id), live_feed_channel(scan_id)],
+                        args=[payload, settings.LIVE_OUTPUT_LOG_MAXLEN, settings.LIVE_OUTPUT_LOG_RETENTION, "1"],
+                        client=pipe,
+                    )
+                pipe.execute()
+                REDIS_PUBLISHES.labels("log_feed", "true").inc(len(batch))
+            except redis.RedisError as e:
+                # We don't want the live feed handler to crash the main logging process
+                REDIS_PUBLISH_ERRORS.labels("log_feed").inc(len(batch))
+                self._disconnect()
+                sys.stderr.write(f"LiveFeedHandler dropped {len(batch)} records: {e}\n")
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+        super().close()
+
+    def _connect(self) -> bool:
+        if self._client is not None:
+            return True
+        if time.monotonic() < self._retry_at:
+            return False
+        try:
+            self._client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True, socket_timeout=2)
+            self._script = self._client.register_script(APPEND_AND_PUBLISH_SCRIPT)
+            return True
+        except redis.RedisError as e:
+            self._disconnect()
+            sys.stderr.write(f"LiveFeedHandler could not connect to Redis: {e}\n")
+            return False
 
-            # Filter out internal/technical messages that should not go to the live feed
-            # This is a basic filter; it will be refined as needed.
-            # We want to exclude debug, internal system messages, stack traces, etc.
-            # Also, filter out messages that are clearly internal or already formatted for console
-            if record.levelname == 'DEBUG':
-                return
-            
-            # Further filter based on message content for user relevance
-            # This list of keywords will need to be expanded and refined.
-            user_relevant_keywords = [
-                "Target resolved", "Scan Started", "Scan Finished", "Nmap", "SSL Scan",
-                "Header Analysis", "Directory Discovery", "SQLMap", "XSS",
-                "Vulnerability Detected", "Risk assessment", "Reports generated",
-                "WARNING", "ERROR", "COMPLETE", "SUCCESS", "Open Ports Found", "Reflected XSS Detected",
-                "SQL injection vulnerability detected", "Wordlist Not Found"
-            ]
-            
-            message_content = record.getMessage()
-            
-            # Allow all INFO, WARNING, ERROR messages if they contain user-relevant keywords
-            # Or if they are INFO, WARNING, ERROR and don't match specific internal patterns
-            is_user_relevant = any(keyword.lower() in message_content.lower() for keyword in user_relevant_keywords)
-            
-            # Explicitly exclude some internal messages that might contain keywords
-            if "Tool pipeline built" in message_content:
-                return
+    def _disconnect(self):
+        self._client = None
+        self._script = None
+        self._retry_at = time.monotonic() + settings.LOG_LIVE_FEED_RETRY_INTERVAL
 
-            if not is_user_relevant and record.levelname not in ['INFO', 'WARNING', 'ERROR']:
-                return # Only allow user_relevant or specific levels
-
-            # Format the message for the frontend
-            formatted_message = {
-                "level": record.levelname.upper(),
-                "message": message_content,
-                "timestamp": record.asctime
-            }
-            
-            channel = f"scan_live_feed:{record.scan_id}"
-            redis_client.publish(channel, json.dumps(formatted_message))
-
-        except Exception as e:
-            # Log any errors occurring within the handler itself
-            # We don't want the live feed handler to crash the main logging process
-            logger.error(f"Error in LiveFeedHandler: {e}")
-
-
-# Create handlers
-c_handler = logging.StreamHandler(sys.stdout)
-f_handler = logging.FileHandler(f'{settings.PROJECT_NAME.lower()}.log')
-live_feed_handler = LiveFeedHandler() # Instantiate the custom handler
-
-c_handler.setLevel(settings.LOG_LEVEL)
-f_handler.setLevel(settings.LOG_LEVEL)
-live_feed_handler.setLevel(logging.INFO) # Live feed should generally be INFO level or above
-
-# Create formatters and add it to handlers
-log_format = logging.Formatter(
-    '%(asctime)s - [%(levelname)s] - %(name)s - (%(filename)s:%(lineno)d) - %(message)s'
-)
-# A simpler format for the live feed, as we're reformatting in the handler
-# The LiveFeedHandler creates its own dictionary format, so this formatter isn't strictly used for it
-# but good practice to assign one.
-live_feed_format = logging.Formatter(
-    '[%(levelname)s] %(message)s'
-)
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
 
-c_handler.setFormatter(log_format)
-f_handler.setFormatter(log_format)
-live_feed_handler.setFormatter(live_feed_format) # Assign formatter to live feed handler
 
-# Add handlers to the logger
-if not logger.handlers:
-    logger.addHandler(c_handler)
-    logger.addHandler(f_handler)
-    logger.addHandler(live_feed_handler) # Add the new live feed handler
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line for log shipping.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "file": record.filename,
+            "line": record.lineno,
+        }
+        scan_id = getattr(record, "scan_id", None)
+        if scan_id:
+            entry["scan_id"] = scan_id
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _ScanQueueHandler(QueueHandler):
+    """
+    Enqueues records for the listener thread. Only the message interpolation and
+    the traceback text are computed on the caller's thread.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
 
-logger.propagate = False
+
+_queue_listener: Optional[QueueListener] = None
+
+def setup_logging():
+    """
+    Attaches the console, JSON-lines file and live feed handlers to the logger
+    and starts the listener and live feed flusher threads. Idempotent; called by
+    the API lifespan, the worker and the CLI, never on import.
+    """
+    global _queue_listener
+    if _queue_listener is not None:
+        return
+
+    c_handler = logging.StreamHandler(sys.stdout)
+    f_handler = logging.FileHandler(f'{settings.PROJECT_NAME.lower()}.log')
+    live_feed_handler = LiveFeedHandler()
+
+    c_handler.setLevel(settings.LOG_LEVEL)
+    f_handler.setLevel(settings.LOG_LEVEL)
+    live_feed_handler.setLevel(logging.INFO) # Live feed should generally be INFO level or above
+
+    log_format = logging.Formatter(
+        '%(asctime)s - [%(levelname)s] - %(name)s - (%(filename)s:%(lineno)d) - %(message)s'
+    )
+    json_format = JsonFormatter()
+    c_handler.setFormatter(json_format if settings.LOG_FORMAT == "json" else log_format)
+    f_handler.setFormatter(json_format)
+
+    # All handlers run on the listener thread; callers only pay for enqueueing the record
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _queue_listener = QueueListener(log_queue, c_handler, f_handler, live_feed_handler, respect_handler_level=True)
+    logger.addHandler(_ScanQueueHandler(log_queue))
+    live_feed_handler.start()
+    _queue_listener.start()
+    # Drain the queue and flush the live feed batch on interpreter exit
+    atexit.register(_queue_listener.stop)
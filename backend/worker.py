@@ -1,16 +1,26 @@
 import asyncio
+import time
+from typing import Optional, Set
+from sqlalchemy import or_, update
 from sqlmodel import select
-from datetime import datetime
 
 from core.queue_manager import get_queue
 from tools.tool_controller import ToolController
 from core.risk_engine import get_risk_assessment
+from core.risk_rules import CURRENT_RISK_RULES_VERSION, get_risk_rules
+from core.finding_extractor import extract_findings
+from core.scan_stats import set_scan_status, record_scan_risk, rebuild_scan_stats
+from core.worker_registry import detect_capabilities, get_worker_registry
 from database.db_connect import AsyncSessionLocal
-from database.models import Scan, ScanResult, Report
+from database.bulk import bulk_insert
+from database.models import Scan, ScanResult, Finding, Report
+from monitoring.metrics import REPORT_RENDER, SCANS_IN_PROGRESS, WorkerMetricsExporter, observe_queue_wait
 from reports.json_exporter import generate_json_report
-from reports.pdf_generator import generate_pdf_report
-from utils.logger import logger
-from utils.helpers import to_json
+from reports.artifact_store import store_report_content, store_report_stream
+from reports.pdf_renderer import get_pdf_renderer
+from utils.logger import logger, setup_logging
+from config import settings
+from tools.live_output import publish_scan_finished
 
 async def process_task(task: dict):
     """
@@ -34,8 +44,7 @@ async def process_task(task: dict):
             logger.error(f"[{scan_id}] Scan record not found in database for db_id: {db_id}.", extra={"scan_id": scan_id})
             return
         logger.info(f"[{scan_id}] Scan record found. Current status: {scan_record.status}", extra={"scan_id": scan_id})
-        scan_record.status = "in_progress"
-        session.add(scan_record)
+        await set_scan_status(session, scan_record, "in_progress")
         await session.commit()
         await session.refresh(scan_record) # Refresh to ensure we have the latest state if needed
 
@@ -47,8 +56,7 @@ async def process_task(task: dict):
             logger.info(f"[{scan_id}] Tool pipeline completed. Results count: {len(results)}", extra={"scan_id": scan_id})
         except Exception as e:
             logger.error(f"[{scan_id}] Failed to run tool pipeline: {type(e).__name__}: {e}", exc_info=True, extra={"scan_id": scan_id})
-            scan_record.status = "failed"
-            scan_record.finished_at = datetime.utcnow()
+            await set_scan_status(session, scan_record, "failed")
             scan_record.error_message = f"Tool pipeline failed: {str(e)}"
             session.add(scan_record)
             await session.commit()
@@ -62,71 +70,100 @@ async def process_task(task: dict):
                 "total_risk_score": total_score,
                 "severity": severity,
                 "breakdown": breakdown,
+                "rules_version": CURRENT_RISK_RULES_VERSION,
             }
             logger.info(f"[{scan_id}] Risk assessment complete. Score: {total_score} ({severity})", extra={"scan_id": scan_id})
         except Exception as e:
             logger.error(f"[{scan_id}] Failed to perform risk assessment: {type(e).__name__}: {e}", exc_info=True, extra={"scan_id": scan_id})
-            scan_record.status = "failed"
-            scan_record.finished_at = datetime.utcnow()
+            await set_scan_status(session, scan_record, "failed")
             scan_record.error_message = f"Risk assessment failed: {str(e)}"
             session.add(scan_record)
             await session.commit()
             return # Exit early if risk assessment fails
 
         try:
-            # 4. Save results to the database
+            # 4. Save results to the database. Written in bulk rather than through the
+            # unit of work, in the same transaction as the status change and reports.
+            result_rows, finding_rows = [], []
             for result in results:
-                findings_data = result.get("findings", result.get("error", {}))
+                findings_data = result["findings"] if "findings" in result else {"error": result.get("error", "")}
                 new_result = ScanResult(
                     scan_id=scan_id,
                     tool_name=result.get("tool_name", "unknown"),
-                    findings_json=to_json(findings_data)
+                    findings=findings_data,
+                    coalesced_from=result.get("coalesced_from"),
+                    **result.get("usage", {})
                 )
-                session.add(new_result)
-            logger.info(f"[{scan_id}] Scan results saved to database.", extra={"scan_id": scan_id})
+                result_rows.append(new_result)
+                # Typed rows for cross-scan queries, next to the raw findings
+                finding_rows.extend(extract_findings(scan_id, target, new_result.tool_name, findings_data))
+            await bulk_insert(session, ScanResult, result_rows)
+            await bulk_insert(session, Finding, finding_rows)
+            logger.info(f"[{scan_id}] Saved {len(result_rows)} results and {len(finding_rows)} findings to the database.", extra={"scan_id": scan_id})
         except Exception as e:
             logger.error(f"[{scan_id}] Failed to save scan results: {type(e).__name__}: {e}", exc_info=True, extra={"scan_id": scan_id})
-            scan_record.status = "failed"
-            scan_record.finished_at = datetime.utcnow()
+            # Nothing of the failed batch is kept
+            await session.rollback()
+            await session.refresh(scan_record)
+            await set_scan_status(session, scan_record, "failed")
             scan_record.error_message = f"Saving results failed: {str(e)}"
             session.add(scan_record)
             await session.commit()
             return # Exit early if saving results fails
 
-        # 5. Update scan status to 'completed'
-        scan_record.status = "completed"
-        scan_record.finished_at = datetime.utcnow()
-        session.add(scan_record)
-
+        pdf_report = None
         try:
-            # 6. Generate and save reports
-            json_content_str = generate_json_report(scan_id, target, results, risk_assessment)
-            pdf_content_bytes = await generate_pdf_report(scan_id, target, results, risk_assessment)
+            # 5. Generate and save reports. The PDF is only rendered when first
+            # downloaded (or pre-rendered below), from the JSON report.
+            # JSON is always written since the PDF is rendered from it
+            encoding = None if settings.REPORT_COMPRESSION == "none" else settings.REPORT_COMPRESSION
+            for report_format in dict.fromkeys(["json", *settings.REPORT_EXPORT_FORMATS]):
+                data_report = Report(scan_id=scan_id, report_type=report_format, risk_score=total_score, severity=severity)
+                started = time.perf_counter()
+                chunks = generate_json_report(scan_id, target, results, risk_assessment, report_format)
+                await store_report_stream(data_report, chunks, encoding)
+                REPORT_RENDER.labels(report_format).observe(time.perf_counter() - started)
+                session.add(data_report)
 
-            json_report = Report(scan_id=scan_id, report_type='json', risk_score=total_score, severity=severity, content_blob=json_content_str.encode('utf-8'))
-            pdf_report = Report(scan_id=scan_id, report_type='pdf', risk_score=total_score, severity=severity, content_blob=pdf_content_bytes)
-            session.add(json_report)
+            pdf_report = Report(scan_id=scan_id, report_type='pdf', risk_score=total_score, severity=severity)
             session.add(pdf_report)
             logger.info(f"[{scan_id}] Reports generated and saved.", extra={"scan_id": scan_id})
         except Exception as e:
             logger.error(f"[{scan_id}] Failed to generate or save reports: {type(e).__name__}: {e}", exc_info=True, extra={"scan_id": scan_id})
             # Do not return here, as results might still be useful even without reports
             scan_record.error_message = f"Report generation failed: {str(e)}"
-        
+            pdf_report = None
+
+        # 6. Update scan status to 'completed', along with the dashboard rollups. Done last,
+        # so the shared counter rows are only locked for the commit, not while reports are written
+        await set_scan_status(session, scan_record, "completed")
+        await record_scan_risk(session, scan_record, total_score, severity)
+        scan_record.risk_rules_version = CURRENT_RISK_RULES_VERSION
         await session.commit()
         logger.info(f"[{scan_id}] Scan processing finished and results saved.", extra={"scan_id": scan_id})
 
+        if pdf_report is not None and task.get("prerender_pdf", settings.REPORT_PDF_PRERENDER):
+            try:
+                await session.refresh(pdf_report)
+                await get_pdf_renderer().ensure_rendered(pdf_report.id)
+            except Exception as e:
+                # The PDF will still be rendered on first download
+                logger.warning(f"[{scan_id}] Failed to pre-render the PDF report: {type(e).__name__}: {e}", extra={"scan_id": scan_id})
 
-async def worker_loop():
+
+async def worker_loop(tools: Optional[Set[str]] = None):
     """
-    The main loop for the worker process.
+    The main loop for the worker process. With `tools`, only tasks routed to
+    workers with (a subset of) those tools are taken.
     """
     queue = get_queue()
     logger.info("Worker loop started. Waiting for tasks...")
     while True:
-        task_data = await queue.dequeue_task()
+        task_data = await queue.dequeue_task(tools)
         if task_data:
             current_scan_id = task_data.get("scan_id", "unknown")
+            observe_queue_wait(task_data)
+            SCANS_IN_PROGRESS.inc()
             try:
                 # The task is already a dict because of `decode_responses=True` in the queue's Redis client
                 await process_task(task_data)
@@ -134,6 +171,10 @@ async def worker_loop():
                 # If process_task fails before scan_id is extracted, this needs to handle it.
                 # If scan_id is available in task_data, use it. Otherwise, log without.
                 logger.error(f"An unexpected error occurred while processing a task for scan_id: {current_scan_id}: {e}", exc_info=True, extra={"scan_id": current_scan_id})
+            finally:
+                SCANS_IN_PROGRESS.dec()
+                # Let live output viewers know nothing more is coming for this scan
+                await publish_scan_finished(current_scan_id)
         else:
             # If queue is empty, wait a bit before checking again
             await asyncio.sleep(5)
@@ -143,11 +184,126 @@ async def run_worker_async():
     # Initialize the queue before starting the loop
     from core.queue_manager import initialize_queue
     await initialize_queue()
+
+    # Advertise what this worker can run, so scans are routed to capable workers
+    capabilities = await detect_capabilities()
+    registry = get_worker_registry()
+    registry.start(capabilities)
+    metrics = WorkerMetricsExporter(capabilities["worker_id"])
+    metrics.start()
     
     try:
-        await worker_loop()
+        await worker_loop(set(capabilities["tools"]))
     except KeyboardInterrupt:
         logger.info("Worker process stopped by user.")
+    finally:
+        await registry.stop(capabilities["worker_id"])
+        await metrics.stop()
+        get_pdf_renderer().shutdown()
 
 def run_worker():
+    setup_logging()
     asyncio.run(run_worker_async())
+
+
+async def backfill_findings(batch_size: int = 100) -> int:
+    """
+    Extracts Finding rows for completed scans saved before the findings table existed.
+    Returns the number of scans backfilled.
+    """
+    backfilled, last_id = 0, 0
+    async with AsyncSessionLocal() as session:
+        while True:
+            scans = (await session.execute(
+                select(Scan)
+                .where(Scan.id > last_id)
+                .where(Scan.status == "completed")
+                .where(~select(Finding.id).where(Finding.scan_id == Scan.scan_id).exists())
+                .where(select(ScanResult.id).where(ScanResult.scan_id == Scan.scan_id).exists())
+                .order_by(Scan.id)
+                .limit(batch_size)
+            )).scalars().all()
+            if not scans:
+                break
+
+            rows = []
+            for scan in scans:
+                results = (await session.execute(select(ScanResult).where(ScanResult.scan_id == scan.scan_id))).scalars().all()
+                for result in results:
+                    rows.extend(extract_findings(scan.scan_id, scan.target, result.tool_name, result.findings))
+            extracted = await bulk_insert(session, Finding, rows)
+            # Read before committing; the commit expires the loaded scans
+            last_id = scans[-1].id
+            await session.commit()
+            backfilled += len(scans)
+            logger.info(f"Backfilled {extracted} findings for {len(scans)} scans ({backfilled} so far).")
+    return backfilled
+
+
+async def rescore_scans(batch_size: int = 2000, rules_version: Optional[int] = None) -> int:
+    """
+    Recomputes the risk of completed scans scored with other risk rules than
+    `rules_version` (the current rules by default), a batch of scans at a time,
+    then rebuilds the dashboard rollups. Resumable: scans already on the
+    version are skipped. Returns the number of scans re-scored.
+    """
+    rules = get_risk_rules(rules_version)
+    rescored, last_id = 0, 0
+    async with AsyncSessionLocal() as session:
+        while True:
+            scans = (await session.execute(
+                select(Scan.id, Scan.scan_id)
+                .where(Scan.id > last_id)
+                .where(Scan.status == "completed")
+                .where(or_(Scan.risk_rules_version.is_(None), Scan.risk_rules_version != rules.version))
+                .order_by(Scan.id)
+                .limit(batch_size)
+            )).all()
+            if not scans:
+                break
+
+            scan_ids = [scan.scan_id for scan in scans]
+            results = (await session.execute(
+                select(ScanResult.scan_id, ScanResult.tool_name, ScanResult.findings).where(ScanResult.scan_id.in_(scan_ids))
+            )).all()
+            scores, severities = rules.score_scans(scan_ids, results)
+            # Bulk UPDATE by primary key, one executemany per batch
+            await session.execute(update(Scan), [
+                {"id": scan.id, "risk_score": score, "severity": severity, "risk_rules_version": rules.version}
+                for scan, score, severity in zip(scans, scores.tolist(), severities.tolist())
+            ])
+            await session.commit()
+            last_id = scans[-1].id
+            rescored += len(scans)
+            logger.info(f"Re-scored {len(scans)} scans with risk rules v{rules.version} ({rescored} so far).")
+
+        if rescored:
+            # Severity counters and target risk from the new scores, in one pass
+            await rebuild_scan_stats(session)
+    return rescored
+
+
+async def migrate_report_blobs(batch_size: int = 20) -> int:
+    """
+    Moves report bytes still stored inline in Postgres into the artifact store.
+    Returns the number of reports moved.
+    """
+    moved = 0
+    async with AsyncSessionLocal() as session:
+        while True:
+            reports = (await session.execute(
+                select(Report)
+                .where(Report.content_path.is_(None))
+                .where(Report.content_blob.is_not(None))
+                .order_by(Report.id)
+                .limit(batch_size)
+            )).scalars().all()
+            if not reports:
+                break
+            for report in reports:
+                await store_report_content(report, report.content_blob)
+                session.add(report)
+            await session.commit()
+            moved += len(reports)
+            logger.info(f"Moved {moved} report blobs to the artifact store so far.")
+    return moved